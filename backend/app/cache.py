@@ -0,0 +1,184 @@
+"""
+Caché de respuestas HTTP con ETag/304 e invalidación por versión de datos.
+
+Es un middleware ASGI que se coloca por fuera de GZipMiddleware, así guarda
+los bytes ya comprimidos y un acierto no toca ni MongoDB ni gzip. La clave
+incluye la versión de los datos: cuando load_data.py la incrementa, todas las
+entradas anteriores dejan de ser alcanzables y la caché se vacía.
+
+Configuración (entorno):
+- CACHE_HABILITADA: "0" para desactivarla.
+- CACHE_MAX_MB: memoria máxima total (LRU).
+- CACHE_TTL_S: vida máxima de cada entrada.
+- CACHE_MAX_ENTRADA_MB: tamaño máximo de una respuesta cacheable.
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.datastructures import Headers
+
+CACHE_HABILITADA = os.getenv("CACHE_HABILITADA", "1") != "0"
+CACHE_MAX_BYTES = int(float(os.getenv("CACHE_MAX_MB", "64")) * 1024 * 1024)
+CACHE_TTL_S = float(os.getenv("CACHE_TTL_S", "300"))
+CACHE_MAX_ENTRADA_BYTES = int(float(os.getenv("CACHE_MAX_ENTRADA_MB", "4")) * 1024 * 1024)
+
+
+class CacheLRU:
+    ''' Diccionario LRU acotado por bytes totales y con expiración por entrada '''
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self._entradas = OrderedDict()
+
+    def obtener(self, clave):
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            return None
+        if time.monotonic() - entrada["creada"] > self.ttl:
+            self._quitar(clave)
+            return None
+        self._entradas.move_to_end(clave)
+        return entrada
+
+    def guardar(self, clave, entrada):
+        if clave in self._entradas:
+            self._quitar(clave)
+        entrada["creada"] = time.monotonic()
+        self._entradas[clave] = entrada
+        self.bytes += len(entrada["cuerpo"])
+        while self.bytes > self.max_bytes and self._entradas:
+            self._quitar(next(iter(self._entradas)))
+
+    def vaciar(self):
+        self._entradas.clear()
+        self.bytes = 0
+
+    def _quitar(self, clave):
+        entrada = self._entradas.pop(clave)
+        self.bytes -= len(entrada["cuerpo"])
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+def _etag(version, cuerpo: bytes) -> str:
+    return f'W/"{version}-{hashlib.sha1(cuerpo).hexdigest()[:20]}"'
+
+
+def _coincide(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    etiquetas = [e.strip() for e in if_none_match.split(",")]
+    return "*" in etiquetas or etag in etiquetas
+
+
+async def _enviar_304(send, etag: str):
+    await send({
+        "type": "http.response.start",
+        "status": 304,
+        "headers": [(b"etag", etag.encode()), (b"x-cache", b"HIT")],
+    })
+    await send({"type": "http.response.body", "body": b""})
+
+
+class CacheRespuestas:
+    """
+    Middleware ASGI de caché para peticiones GET bajo los prefijos indicados.
+    - obtener_version: corrutina sin argumentos que devuelve la versión actual de los datos.
+    - Solo se guardan respuestas 200 enviadas en un único fragmento (no streaming) y sin
+      Cache-Control: no-store.
+    - La clave incluye ruta, query normalizada, soporte gzip, Origin y Accept.
+    """
+
+    def __init__(self, app, obtener_version, prefijos=("/api/",), max_bytes: int = CACHE_MAX_BYTES,
+                 ttl: float = CACHE_TTL_S, max_entrada: int = CACHE_MAX_ENTRADA_BYTES,
+                 habilitada: bool = CACHE_HABILITADA):
+        self.app = app
+        self.obtener_version = obtener_version
+        self.prefijos = tuple(prefijos)
+        self.max_entrada = max_entrada
+        self.habilitada = habilitada
+        self.cache = CacheLRU(max_bytes, ttl)
+        self._version = None
+
+    def _clave(self, scope, headers, version):
+        query = urlencode(sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)))
+        return (
+            version,
+            scope["path"],
+            query,
+            "gzip" in headers.get("accept-encoding", ""),
+            headers.get("origin", ""),
+            headers.get("accept", ""),
+        )
+
+    async def __call__(self, scope, receive, send):
+        if (not self.habilitada or scope["type"] != "http" or scope["method"] != "GET"
+                or not scope["path"].startswith(self.prefijos)):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        query_string = scope.get("query_string", b"")
+        if b"stream=" in query_string or "ndjson" in headers.get("accept", ""):
+            await self.app(scope, receive, send)
+            return
+
+        version = await self.obtener_version()
+        if version != self._version:
+            self.cache.vaciar()
+            self._version = version
+
+        clave = self._clave(scope, headers, version)
+        if_none_match = headers.get("if-none-match", "")
+        entrada = self.cache.obtener(clave)
+        if entrada is not None:
+            if _coincide(if_none_match, entrada["etag"]):
+                await _enviar_304(send, entrada["etag"])
+                return
+            await send({
+                "type": "http.response.start",
+                "status": entrada["status"],
+                "headers": entrada["headers"] + [(b"x-cache", b"HIT")],
+            })
+            await send({"type": "http.response.body", "body": entrada["cuerpo"]})
+            return
+
+        inicio = {}
+        pasar_directo = False
+
+        async def enviar(mensaje):
+            nonlocal pasar_directo
+            if pasar_directo:
+                await send(mensaje)
+                return
+            if mensaje["type"] == "http.response.start":
+                inicio.update(mensaje)
+                return
+            cuerpo = mensaje.get("body", b"")
+            no_store = any(k.lower() == b"cache-control" and b"no-store" in v.lower() for k, v in inicio.get("headers", []))
+            if (inicio.get("status") != 200 or mensaje.get("more_body", False) or len(cuerpo) > self.max_entrada
+                    or no_store):
+                # Respuestas de error, en streaming, demasiado grandes o marcadas no-store: no se cachean
+                pasar_directo = True
+                await send(inicio)
+                await send(mensaje)
+                return
+            etag = _etag(version, cuerpo)
+            cabeceras = [(k, v) for k, v in inicio.get("headers", []) if k.lower() != b"etag"]
+            cabeceras.append((b"etag", etag.encode()))
+            if not any(k.lower() == b"cache-control" for k, _ in cabeceras):
+                cabeceras.append((b"cache-control", b"no-cache"))
+            self.cache.guardar(clave, {"status": 200, "headers": cabeceras, "cuerpo": cuerpo, "etag": etag})
+            if _coincide(if_none_match, etag):
+                await _enviar_304(send, etag)
+                return
+            await send({**inicio, "headers": cabeceras + [(b"x-cache", b"MISS")]})
+            await send(mensaje)
+
+        await self.app(scope, receive, enviar)
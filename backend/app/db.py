@@ -0,0 +1,76 @@
+"""
+Acceso asíncrono a MongoDB para la API.
+
+El cliente usa la API asíncrona de pymongo (AsyncMongoClient) para que cada
+worker atienda muchas consultas concurrentes sin bloquear un hilo por
+consulta. El pool y los tiempos límite se configuran desde el entorno:
+
+- MONGO_URI / MONGO_DB: conexión y base de datos.
+- MONGO_MAX_POOL_SIZE / MONGO_MIN_POOL_SIZE: tamaño del pool de conexiones.
+- MONGO_MAX_TIME_MS: tiempo máximo de ejecución en el servidor por consulta (0 = sin límite).
+- MONGO_CONNECT_TIMEOUT_MS, MONGO_SOCKET_TIMEOUT_MS, MONGO_SERVER_SELECTION_TIMEOUT_MS,
+  MONGO_WAIT_QUEUE_TIMEOUT_MS: tiempos de espera del driver.
+
+Los comandos se registran con el listener de app/metricas.py (duración,
+documentos devueltos y explain muestreado de las consultas lentas).
+La base de datos usa las opciones de decodificación de app/serializacion.py.
+"""
+import asyncio
+import os
+
+from pymongo import AsyncMongoClient
+
+from .metricas import METRICAS_HABILITADAS, monitor_comandos
+from .serializacion import CODEC_API
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB = os.getenv("MONGO_DB", "biogeovis")
+
+MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MAX_TIME_MS = int(os.getenv("MONGO_MAX_TIME_MS", "15000"))
+CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000"))
+SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "10000"))
+
+client = AsyncMongoClient(
+    MONGO_URI,
+    maxPoolSize=MAX_POOL_SIZE,
+    minPoolSize=MIN_POOL_SIZE,
+    connectTimeoutMS=CONNECT_TIMEOUT_MS,
+    socketTimeoutMS=SOCKET_TIMEOUT_MS,
+    serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+    waitQueueTimeoutMS=WAIT_QUEUE_TIMEOUT_MS,
+    event_listeners=[monitor_comandos] if METRICAS_HABILITADAS else [],
+)
+monitor_comandos.cliente = client
+# Los ObjectId se decodifican como texto: los documentos salen listos para serializar
+db = client.get_database(MONGO_DB, codec_options=CODEC_API)
+
+
+def consultar(coleccion, query: dict, *args, **kwargs):
+    ''' Cursor de find con el tiempo límite configurado aplicado '''
+    consulta = coleccion.find(query, *args, **kwargs)
+    if MAX_TIME_MS:
+        consulta = consulta.max_time_ms(MAX_TIME_MS)
+    return consulta
+
+
+async def agregar(coleccion, pipeline: list, **kwargs):
+    ''' Ejecutar un pipeline de agregación y devolver todos sus documentos '''
+    if MAX_TIME_MS:
+        kwargs.setdefault("maxTimeMS", MAX_TIME_MS)
+    cursor = await coleccion.aggregate(pipeline, **kwargs)
+    return await cursor.to_list(None)
+
+
+async def contar(coleccion, query: dict):
+    ''' Contar los documentos de una consulta con el tiempo límite configurado '''
+    kwargs = {"maxTimeMS": MAX_TIME_MS} if MAX_TIME_MS else {}
+    return await coleccion.count_documents(query, **kwargs)
+
+
+async def en_paralelo(*consultas):
+    ''' Ejecutar varias corrutinas de consulta independientes a la vez y devolver sus resultados en orden '''
+    return await asyncio.gather(*consultas)
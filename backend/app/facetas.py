@@ -0,0 +1,68 @@
+"""
+Conteos por faceta (cada nivel taxonómico, país y año) bajo los filtros actuales.
+
+Sustituye las llamadas separadas a /agrupados/<nivel>, que ignoran los
+filtros y recorren toda la colección, por una sola agregación con $facet:
+
+- Si el filtro solo usa taxonomía y país y los rollups existen, se agrupa el
+  cubo mensual (rollup_cubo): el coste depende del número de combinaciones
+  del cubo, no del número de avistamientos.
+- En otro caso, un $match sobre los índices compuestos selecciona los
+  documentos una sola vez y cada faceta se calcula sobre ese resultado.
+
+Cada faceta devuelve los top valores por conteo; la de años devuelve todos
+los años en orden cronológico.
+"""
+from .filtros import NIVELES_TAXONOMIA
+
+DIMENSIONES_FACETA = NIVELES_TAXONOMIA + ["Pais", "Anio"]
+TOP_MAXIMO = 200
+
+# Campo de cada faceta en avistamientos y en el _id del cubo
+_CAMPOS = {nivel: (f"$Taxonomia.{nivel}", f"$_id.{nivel}") for nivel in NIVELES_TAXONOMIA}
+_CAMPOS["Pais"] = ("$Ubicacion.Pais", "$_id.Pais")
+
+
+def _top(campo: str, conteo, top: int):
+    return [
+        {"$group": {"_id": campo, "count": {"$sum": conteo}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": top},
+    ]
+
+
+def pipeline_facetas(query: dict, top: int):
+    ''' Todas las facetas en un solo recorrido de los avistamientos que cumplen el filtro '''
+    facetas = {dim: _top(campos[0], 1, top) for dim, campos in _CAMPOS.items()}
+    facetas["Anio"] = [
+        {"$match": {"FechaEvento": {"$type": "date"}}},
+        {"$group": {"_id": {"$year": "$FechaEvento"}, "count": {"$sum": 1}}},
+        {"$sort": {"_id": 1}},
+    ]
+    facetas["total"] = [{"$count": "n"}]
+    return [{"$match": query}, {"$facet": facetas}]
+
+
+def pipeline_facetas_cubo(match: dict, top: int):
+    ''' Las mismas facetas sumando los conteos del cubo mensual (match de histograma.filtro_cubo) '''
+    facetas = {dim: _top(campos[1], "$count", top) for dim, campos in _CAMPOS.items()}
+    facetas["Anio"] = [
+        {"$match": {"_id.Mes": {"$ne": None}}},
+        {"$group": {"_id": {"$year": "$_id.Mes"}, "count": {"$sum": "$count"}}},
+        {"$sort": {"_id": 1}},
+    ]
+    facetas["total"] = [{"$group": {"_id": None, "n": {"$sum": "$count"}}}]
+    return [{"$match": match}, {"$facet": facetas}]
+
+
+def formatear_facetas(resultado: list) -> dict:
+    ''' {"total": n, "facetas": {dim: [{"valor", "count"}]}} a partir del documento que devuelve $facet '''
+    doc = resultado[0] if resultado else {}
+    total = doc.get("total") or [{}]
+    return {
+        "total": total[0].get("n", 0),
+        "facetas": {
+            dim: [{"valor": fila["_id"], "count": fila["count"]} for fila in doc.get(dim, [])]
+            for dim in DIMENSIONES_FACETA
+        },
+    }
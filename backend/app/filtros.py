@@ -0,0 +1,151 @@
+"""
+Construcción de filtros compuestos para las consultas de avistamientos.
+
+Todas las rutas que combinan fecha, taxonomía, país, nombre científico y
+caja geográfica comparten este vocabulario para que el filtro se resuelva
+en una sola consulta a MongoDB respaldada por índices compuestos.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+from .geo import CAMPO_PUNTO, geometria_bbox
+
+NIVELES_TAXONOMIA = ["Reino", "Filo", "Clase", "Orden", "Familia", "Genero", "Especie"]
+
+# Copia de Taxonomia en minúsculas y sin espacios en los extremos, escrita al cargar los datos.
+# Los filtros taxonómicos comparan contra ella: insensibles a mayúsculas y por igualdad de índice.
+CAMPO_TAXONOMIA_NORM = "TaxonomiaNorm"
+
+# Índices compuestos para las combinaciones que envía el frontend.
+# Siguen la regla igualdad -> rango: primero el campo exacto y después FechaEvento;
+# _id al final desempata el orden de la paginación por cursor.
+INDICES_COMPUESTOS = [
+    *[[(f"{CAMPO_TAXONOMIA_NORM}.{nivel}", 1), ("FechaEvento", 1), ("_id", 1)] for nivel in NIVELES_TAXONOMIA],
+    [("Ubicacion.Pais", 1), ("FechaEvento", 1), ("_id", 1)],
+    [("NombreCientifico", 1), ("FechaEvento", 1), ("_id", 1)],
+]
+
+FORMATOS_FECHA = [
+    "%Y-%m-%d",
+    "%d/%m/%Y",
+    "%Y/%m/%d",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S.%f",
+]
+
+
+def normalizar_texto(valor):
+    ''' Forma normalizada de un valor taxonómico: sin espacios en los extremos y en minúsculas '''
+    if not isinstance(valor, str):
+        return valor
+    return valor.strip().lower()
+
+
+def taxonomia_normalizada(taxonomia: dict):
+    ''' Valor de TaxonomiaNorm para la Taxonomia de un documento '''
+    return {nivel: normalizar_texto(taxonomia.get(nivel)) for nivel in NIVELES_TAXONOMIA if nivel in taxonomia}
+
+
+def filtro_taxonomia(nivel: str, valor: str):
+    ''' Igualdad insensible a mayúsculas sobre un nivel taxonómico (usa el índice de TaxonomiaNorm) '''
+    return {f"{CAMPO_TAXONOMIA_NORM}.{nivel}": normalizar_texto(valor)}
+
+
+def parse_fecha(s: Optional[str]):
+    ''' Convertir una fecha en formatos comunes (YYYY-MM-DD, DD/MM/YYYY, ISO-8601) a datetime '''
+    s = (s or "").strip()
+    for fmt in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(s, fmt)
+        except ValueError:
+            pass
+    try:
+        iso = s.replace("Z", "+00:00")
+        fecha = datetime.fromisoformat(iso)
+    except Exception:
+        return None
+    # MongoDB guarda las fechas en UTC: convertir antes de quitar la zona horaria
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
+def parse_bbox(bbox: str):
+    ''' Convertir "minLng,minLat,maxLng,maxLat" en una tupla de floats validada '''
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise ValueError("bbox debe tener el formato minLng,minLat,maxLng,maxLat")
+    if not (-90 <= min_lat <= max_lat <= 90):
+        raise ValueError("Latitudes de bbox fuera de rango o invertidas")
+    if not (-180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+        raise ValueError("Longitudes de bbox fuera de rango")
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def _valor(v: Optional[str]):
+    ''' Normalizar un parámetro de filtro: None para vacíos y comodines '''
+    if v is None:
+        return None
+    v = v.strip()
+    if not v or v in ("-", "*"):
+        return None
+    return v
+
+
+def construir_filtro(
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    reino: Optional[str] = None,
+    filo: Optional[str] = None,
+    clase: Optional[str] = None,
+    orden: Optional[str] = None,
+    familia: Optional[str] = None,
+    genero: Optional[str] = None,
+    especie: Optional[str] = None,
+    pais: Optional[str] = None,
+    nombre_cientifico: Optional[str] = None,
+    bbox: Optional[str] = None,
+):
+    """
+    Construir una única consulta de MongoDB a partir de cualquier combinación de filtros.
+    - Los niveles taxonómicos se comparan por igualdad sobre TaxonomiaNorm (sin distinguir
+      mayúsculas ni espacios en los extremos); país y nombre científico, por igualdad exacta.
+    - desde/hasta forman un rango sobre FechaEvento (se permite uno solo de los extremos).
+    - bbox se expresa como "minLng,minLat,maxLng,maxLat".
+    Lanza ValueError si algún parámetro tiene un formato inválido.
+    """
+    query = {}
+
+    niveles = [reino, filo, clase, orden, familia, genero, especie]
+    for nivel, valor in zip(NIVELES_TAXONOMIA, niveles):
+        valor = _valor(valor)
+        if valor is not None:
+            query.update(filtro_taxonomia(nivel, valor))
+
+    if _valor(pais) is not None:
+        query["Ubicacion.Pais"] = _valor(pais)
+    if _valor(nombre_cientifico) is not None:
+        query["NombreCientifico"] = _valor(nombre_cientifico)
+
+    d1 = parse_fecha(desde) if _valor(desde) else None
+    d2 = parse_fecha(hasta) if _valor(hasta) else None
+    if (_valor(desde) and not d1) or (_valor(hasta) and not d2):
+        raise ValueError("Formato de fecha no válido. Use YYYY-MM-DD o DD/MM/YYYY.")
+    if d1 and d2 and d1 > d2:
+        d1, d2 = d2, d1
+    rango = {}
+    if d1:
+        rango["$gte"] = d1
+    if d2:
+        rango["$lte"] = d2
+    if rango:
+        query["FechaEvento"] = rango
+
+    if _valor(bbox) is not None:
+        min_lng, min_lat, max_lng, max_lat = parse_bbox(bbox)
+        geometria = geometria_bbox(min_lng, min_lat, max_lng, max_lat)
+        if geometria is not None:
+            query[CAMPO_PUNTO] = {"$geoWithin": {"$geometry": geometria}}
+
+    return query
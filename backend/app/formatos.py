@@ -0,0 +1,174 @@
+"""
+Proyección de campos (fields=) y formato columnar (format=columns) para los
+endpoints de listado.
+
+El formato columnar devuelve un arreglo por campo en lugar de un objeto por
+documento; las columnas de texto muy repetido (taxonomía, país, nombre
+científico) se codifican con diccionario: una lista de valores distintos y
+un arreglo de códigos enteros. Las columnas se llenan directamente desde el
+cursor, sin construir la lista de documentos.
+"""
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from .filtros import CAMPO_TAXONOMIA_NORM, NIVELES_TAXONOMIA
+from .muestreo import MUESTRA_MAXIMA
+from .registros import CAMPO_CLAVE
+
+# Campos hoja que puede devolver el formato columnar, en orden
+HOJAS = [
+    "_id",
+    "NombreCientifico",
+    "FechaEvento",
+    *[f"Taxonomia.{nivel}" for nivel in NIVELES_TAXONOMIA],
+    "Ubicacion.Pais",
+    "Ubicacion.Geolocalizacion.Latitud",
+    "Ubicacion.Geolocalizacion.Longitud",
+    "Ubicacion.Geohash",
+]
+
+# Campos que se pueden pedir en fields= y las hojas que cubren
+CAMPOS = {hoja: [hoja] for hoja in HOJAS}
+CAMPOS["Taxonomia"] = [f"Taxonomia.{nivel}" for nivel in NIVELES_TAXONOMIA]
+CAMPOS["Ubicacion.Geolocalizacion"] = ["Ubicacion.Geolocalizacion.Latitud", "Ubicacion.Geolocalizacion.Longitud"]
+CAMPOS["Ubicacion"] = ["Ubicacion.Pais", *CAMPOS["Ubicacion.Geolocalizacion"], "Ubicacion.Geohash"]
+CAMPOS["Ubicacion.Punto"] = []
+
+# Campos internos que no se devuelven al cliente
+PROYECCION_SIN_INTERNOS = {CAMPO_TAXONOMIA_NORM: 0, CAMPO_CLAVE: 0}
+
+# Columnas codificadas con diccionario
+COLUMNAS_DICCIONARIO = {"NombreCientifico", "Ubicacion.Pais", *CAMPOS["Taxonomia"]}
+
+FORMATOS = ("rows", "columns")
+
+
+def parse_fields(fields: Optional[str]):
+    """
+    Convertir "campo1,campo2,..." en una proyección de MongoDB (_id siempre se incluye).
+    Devuelve None si no se pidió proyección; lanza ValueError con campos desconocidos.
+    """
+    if not fields or not fields.strip():
+        return None
+    pedidos = [f.strip() for f in fields.split(",") if f.strip()]
+    desconocidos = [f for f in pedidos if f not in CAMPOS]
+    if desconocidos:
+        raise ValueError(f"Campos no válidos en fields: {', '.join(desconocidos)}")
+    return _sin_colisiones({campo: 1 for campo in pedidos})
+
+
+def _sin_colisiones(proyeccion: dict):
+    # Quitar rutas cubiertas por un campo padre ya proyectado (MongoDB rechaza colisiones de rutas)
+    for campo in list(proyeccion):
+        if any(campo.startswith(otro + ".") for otro in proyeccion if otro != campo):
+            del proyeccion[campo]
+    return proyeccion
+
+
+def proyeccion_con_orden(proyeccion: Optional[dict], ordenar_por: str = "_id"):
+    """
+    Proyección efectiva de un listado.
+    - Sin fields= se devuelve el documento completo salvo los campos internos (TaxonomiaNorm, ClaveRegistro).
+    - Con fields= se añade la clave de orden: el cursor de la página siguiente la necesita.
+    """
+    if not proyeccion:
+        return dict(PROYECCION_SIN_INTERNOS)
+    if ordenar_por == "_id":
+        return proyeccion
+    return _sin_colisiones({**proyeccion, ordenar_por: 1})
+
+
+def opciones_salida(fields: Optional[str] = None, format: str = "rows", sample: Optional[int] = None):
+    """
+    Dependencia de formato de salida de los listados.
+    - fields: lista de campos separados por comas (p.ej. _id,NombreCientifico,Ubicacion.Geolocalizacion).
+    - format: "rows" (lista de documentos, por defecto) o "columns" (arreglos paralelos).
+    - sample: en lugar de una página, una muestra de N documentos repartidos por celdas (app/muestreo.py).
+    """
+    if format not in FORMATOS:
+        raise HTTPException(status_code=400, detail=f"format debe ser uno de: {', '.join(FORMATOS)}")
+    if sample is not None and not 1 <= sample <= MUESTRA_MAXIMA:
+        raise HTTPException(status_code=400, detail=f"sample debe estar entre 1 y {MUESTRA_MAXIMA}")
+    try:
+        proyeccion = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"proyeccion": proyeccion, "columnas": format == "columns", "muestra": sample}
+
+
+def hojas_de(proyeccion: Optional[dict]):
+    ''' Columnas (campos hoja) que produce una proyección; todas si no hay proyección '''
+    if not proyeccion:
+        return list(HOJAS)
+    incluidas = {"_id"}
+    for campo in proyeccion:
+        incluidas.update(CAMPOS.get(campo, [campo]))
+    return [hoja for hoja in HOJAS if hoja in incluidas]
+
+
+def _leer(doc, ruta):
+    valor = doc
+    for parte in ruta.split("."):
+        if not isinstance(valor, dict):
+            return None
+        valor = valor.get(parte)
+    return valor
+
+
+def _valor_columna(valor):
+    if isinstance(valor, ObjectId):
+        return str(valor)
+    if isinstance(valor, datetime):
+        # Milisegundos desde epoch: más compacto que ISO-8601 y directo para Date en JS
+        return int(valor.timestamp() * 1000) if valor.tzinfo else int((valor - datetime(1970, 1, 1)).total_seconds() * 1000)
+    return valor
+
+
+class ConstructorColumnas:
+    ''' Acumula documentos en columnas paralelas; las columnas de COLUMNAS_DICCIONARIO se codifican con diccionario '''
+
+    def __init__(self, hojas):
+        self.hojas = hojas
+        self.n = 0
+        self.columnas = {hoja: [] for hoja in hojas}
+        self.diccionarios = {hoja: {} for hoja in hojas if hoja in COLUMNAS_DICCIONARIO}
+
+    def agregar(self, doc):
+        self.n += 1
+        for hoja in self.hojas:
+            valor = _valor_columna(_leer(doc, hoja))
+            diccionario = self.diccionarios.get(hoja)
+            if diccionario is not None:
+                codigo = diccionario.get(valor)
+                if codigo is None:
+                    codigo = diccionario[valor] = len(diccionario)
+                self.columnas[hoja].append(codigo)
+            else:
+                self.columnas[hoja].append(valor)
+
+    def resultado(self):
+        columnas = {}
+        for hoja in self.hojas:
+            if hoja in self.diccionarios:
+                columnas[hoja] = {"valores": list(self.diccionarios[hoja]), "codigos": self.columnas[hoja]}
+            else:
+                columnas[hoja] = self.columnas[hoja]
+        return {"formato": "columns", "n": self.n, "columnas": columnas}
+
+
+async def llenar_columnas(cursor, hojas, limit: int):
+    """
+    Llenar las columnas directamente desde un cursor asíncrono que pide limit + 1 documentos.
+    Devuelve (resultado, ultimo): ultimo es el último documento entregado si hay otra página, o None.
+    """
+    constructor = ConstructorColumnas(hojas)
+    ultimo = None
+    async for doc in cursor:
+        if constructor.n == limit:
+            return constructor.resultado(), ultimo
+        constructor.agregar(doc)
+        ultimo = doc
+    return constructor.resultado(), None
@@ -0,0 +1,209 @@
+"""
+Utilidades geográficas para avistamientos: punto GeoJSON y geohash de cada
+documento, geometrías de consulta para el índice 2dsphere y correspondencia
+entre nivel de zoom del mapa y precisión de celda.
+"""
+from pymongo import UpdateOne
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Precisión con la que se guarda el geohash en cada documento (~4.8m x 4.8m)
+PRECISION_GEOHASH = 9
+CAMPO_GEOHASH = "Ubicacion.Geohash"
+# Punto GeoJSON respaldado por un índice 2dsphere
+CAMPO_PUNTO = "Ubicacion.Punto"
+
+RADIO_TIERRA_KM = 6378.1
+# Separación máxima (en grados de longitud) entre vértices de los bordes de una caja
+PASO_BORDE_GRADOS = 1.0
+# Ancho máximo de cada polígono de una caja; GeoJSON no admite anillos mayores a un hemisferio
+ANCHO_MAX_POLIGONO = 90.0
+LAT_MAX = 89.999999
+
+# Precisión de celda por nivel de zoom (índice = zoom). A partir del último se usa el máximo.
+PRECISION_POR_ZOOM = [1, 1, 2, 2, 3, 3, 3, 4, 4, 5, 5, 5, 6, 6, 7, 7, 8]
+
+
+def geohash(lat: float, lng: float, precision: int = PRECISION_GEOHASH) -> str:
+    ''' Codificar una coordenada como geohash de la precisión indicada '''
+    lat_rango = [-90.0, 90.0]
+    lng_rango = [-180.0, 180.0]
+    resultado = []
+    bits = 0
+    n_bits = 0
+    par = True
+    while len(resultado) < precision:
+        rango, valor = (lng_rango, lng) if par else (lat_rango, lat)
+        medio = (rango[0] + rango[1]) / 2
+        if valor >= medio:
+            bits = (bits << 1) | 1
+            rango[0] = medio
+        else:
+            bits <<= 1
+            rango[1] = medio
+        par = not par
+        n_bits += 1
+        if n_bits == 5:
+            resultado.append(BASE32[bits])
+            bits = 0
+            n_bits = 0
+    return "".join(resultado)
+
+
+def precision_para_zoom(zoom: int) -> int:
+    ''' Precisión de geohash adecuada para agrupar puntos en un nivel de zoom '''
+    zoom = max(0, int(zoom))
+    if zoom >= len(PRECISION_POR_ZOOM):
+        return PRECISION_POR_ZOOM[-1]
+    return PRECISION_POR_ZOOM[zoom]
+
+
+def coordenadas(doc):
+    ''' Extraer (lat, lng) numéricos de un documento o None si no son válidos '''
+    geo = (doc.get("Ubicacion") or {}).get("Geolocalizacion") or {}
+    try:
+        lat = float(geo["Latitud"])
+        lng = float(geo["Longitud"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def coordenadas_punto(doc):
+    ''' (lat, lng) desde el Punto GeoJSON o, si todavía no existe, desde Geolocalizacion '''
+    try:
+        lng, lat = doc["Ubicacion"]["Punto"]["coordinates"]
+        return float(lat), float(lng)
+    except (KeyError, TypeError, ValueError):
+        return coordenadas(doc)
+
+
+def punto(lat: float, lng: float):
+    ''' Punto GeoJSON (el orden de GeoJSON es [longitud, latitud]) '''
+    return {"type": "Point", "coordinates": [lng, lat]}
+
+
+def campos_geo(lat: float, lng: float):
+    ''' Campos derivados de la coordenada que se guardan dentro de Ubicacion '''
+    return {"Punto": punto(lat, lng), "Geohash": geohash(lat, lng)}
+
+
+def completar_campos_geo(collection, batch_size=1000):
+    ''' Migración: calcular Punto y Geohash en los documentos existentes que no los tienen '''
+    pendientes = collection.find(
+        {"$or": [{CAMPO_PUNTO: {"$exists": False}}, {CAMPO_GEOHASH: {"$exists": False}}]},
+        {"Ubicacion.Geolocalizacion": 1},
+    )
+    operaciones = []
+    actualizados = 0
+    for doc in pendientes:
+        coords = coordenadas(doc)
+        if coords is None:
+            continue
+        campos = {f"Ubicacion.{k}": v for k, v in campos_geo(*coords).items()}
+        operaciones.append(UpdateOne({"_id": doc["_id"]}, {"$set": campos}))
+        if len(operaciones) >= batch_size:
+            actualizados += collection.bulk_write(operaciones, ordered=False).modified_count
+            operaciones = []
+    if operaciones:
+        actualizados += collection.bulk_write(operaciones, ordered=False).modified_count
+    return actualizados
+
+
+def _anillo_caja(min_lng, min_lat, max_lng, max_lat):
+    ''' Anillo cerrado de una caja con bordes horizontales densificados '''
+    pasos = max(1, int((max_lng - min_lng) / PASO_BORDE_GRADOS + 0.999999))
+    ancho = (max_lng - min_lng) / pasos
+    inferior = [[min_lng + i * ancho, min_lat] for i in range(pasos + 1)]
+    superior = [[max_lng - i * ancho, max_lat] for i in range(pasos + 1)]
+    return inferior + superior + [inferior[0]]
+
+
+def geometria_bbox(min_lng: float, min_lat: float, max_lng: float, max_lat: float):
+    """
+    Geometría GeoJSON equivalente a una caja lat/lng para $geoWithin sobre 2dsphere.
+    - Los bordes de GeoJSON son geodésicas, por eso los bordes horizontales se densifican
+      para que sigan los paralelos.
+    - Las cajas que cruzan el antimeridiano o superan ANCHO_MAX_POLIGONO se dividen en
+      varios polígonos (MultiPolygon).
+    - Devuelve None si la caja cubre todo el globo (no hace falta filtrar).
+    """
+    min_lat = max(min_lat, -LAT_MAX)
+    max_lat = min(max_lat, LAT_MAX)
+    if min_lng > max_lng:
+        tramos = [(min_lng, 180.0), (-180.0, max_lng)]
+    else:
+        tramos = [(min_lng, max_lng)]
+    if min_lat <= -LAT_MAX and max_lat >= LAT_MAX and sum(b - a for a, b in tramos) >= 360:
+        return None
+
+    poligonos = []
+    for a, b in tramos:
+        while b - a > ANCHO_MAX_POLIGONO:
+            poligonos.append([_anillo_caja(a, min_lat, a + ANCHO_MAX_POLIGONO, max_lat)])
+            a += ANCHO_MAX_POLIGONO
+        if b > a:
+            poligonos.append([_anillo_caja(a, min_lat, b, max_lat)])
+    if len(poligonos) == 1:
+        return {"type": "Polygon", "coordinates": poligonos[0]}
+    return {"type": "MultiPolygon", "coordinates": poligonos}
+
+
+def filtro_radio(lat: float, lng: float, radio_km: float):
+    ''' Condición $geoWithin para un círculo de radio_km alrededor de la coordenada '''
+    return {CAMPO_PUNTO: {"$geoWithin": {"$centerSphere": [[lng, lat], radio_km / RADIO_TIERRA_KM]}}}
+
+
+def pipeline_cercanos(lat: float, lng: float, query: dict, k: int = 10, max_km: float = None):
+    ''' Pipeline $geoNear con los k avistamientos más cercanos y su distancia en metros '''
+    geo_near = {
+        "near": punto(lat, lng),
+        "key": CAMPO_PUNTO,
+        "distanceField": "distancia_m",
+        "spherical": True,
+        "query": query,
+    }
+    if max_km is not None:
+        geo_near["maxDistance"] = max_km * 1000
+    return [{"$geoNear": geo_near}, {"$limit": k}]
+
+
+def pipeline_clusters(query: dict, precision: int, top_especies: int = 3, max_celdas: int = 5000):
+    """
+    Pipeline de agregación que agrupa los documentos filtrados en celdas de geohash.
+    Cada celda devuelve su clave, el total de avistamientos, el centroide y las especies más frecuentes.
+    """
+    match = dict(query)
+    match[CAMPO_GEOHASH] = {"$exists": True}
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "celda": {"$substrBytes": [f"${CAMPO_GEOHASH}", 0, precision]},
+                "especie": "$NombreCientifico",
+            },
+            "count": {"$sum": 1},
+            "lat": {"$sum": "$Ubicacion.Geolocalizacion.Latitud"},
+            "lng": {"$sum": "$Ubicacion.Geolocalizacion.Longitud"},
+        }},
+        {"$sort": {"count": -1}},
+        {"$group": {
+            "_id": "$_id.celda",
+            "count": {"$sum": "$count"},
+            "lat": {"$sum": "$lat"},
+            "lng": {"$sum": "$lng"},
+            "especies": {"$push": {"nombre": "$_id.especie", "count": "$count"}},
+        }},
+        {"$sort": {"count": -1}},
+        {"$limit": max_celdas},
+        {"$project": {
+            "_id": 0,
+            "celda": "$_id",
+            "count": 1,
+            "lat": {"$divide": ["$lat", "$count"]},
+            "lng": {"$divide": ["$lng", "$count"]},
+            "top_especies": {"$slice": ["$especies", top_especies]},
+        }},
+    ]
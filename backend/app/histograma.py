@@ -0,0 +1,65 @@
+"""
+Histograma temporal de avistamientos por día, semana, mes o año.
+
+- Para mes y año, si el filtro solo usa taxonomía y país, se responde desde el
+  cubo mensual de rollups (rollup_cubo): el coste depende del número de
+  combinaciones del cubo, no del tamaño de la colección.
+- En otro caso se agrupa en vivo con $dateTrunc sobre los documentos que
+  cumplen el filtro, que se resuelve con los índices compuestos (…, FechaEvento).
+"""
+from collections import Counter
+from datetime import datetime
+
+from .filtros import CAMPO_TAXONOMIA_NORM, NIVELES_TAXONOMIA
+
+UNIDADES = ("day", "week", "month", "year")
+# Unidades que se pueden responder desde el cubo mensual
+UNIDADES_CUBO = ("month", "year")
+
+# Campos de filtro que existen en el cubo (clave del filtro -> campo del _id del cubo)
+# (la taxonomía se filtra por su forma normalizada, guardada en el _id igual que en avistamientos)
+_CAMPOS_CUBO = {f"{CAMPO_TAXONOMIA_NORM}.{nivel}": f"_id.{CAMPO_TAXONOMIA_NORM}.{nivel}" for nivel in NIVELES_TAXONOMIA}
+_CAMPOS_CUBO["Ubicacion.Pais"] = "_id.Pais"
+
+
+def filtro_cubo(query: dict):
+    ''' Traducir un filtro de avistamientos al cubo; None si usa campos que el cubo no tiene '''
+    match = {}
+    for campo, valor in query.items():
+        if campo not in _CAMPOS_CUBO or isinstance(valor, dict):
+            return None
+        match[_CAMPOS_CUBO[campo]] = valor
+    return match
+
+
+def pipeline_histograma(query: dict, unidad: str):
+    ''' Agrupación en vivo por $dateTrunc de FechaEvento (semanas desde el lunes) '''
+    truncar = {"date": "$FechaEvento", "unit": unidad}
+    if unidad == "week":
+        truncar["startOfWeek"] = "monday"
+    return [
+        {"$match": {**query, "FechaEvento": {"$type": "date", **query.get("FechaEvento", {})}}},
+        {"$group": {"_id": {"$dateTrunc": truncar}, "count": {"$sum": 1}}},
+        {"$sort": {"_id": 1}},
+    ]
+
+
+def pipeline_histograma_cubo(match: dict):
+    ''' Conteos por mes desde el cubo (los meses sin fecha se excluyen) '''
+    return [
+        {"$match": {**match, "_id.Mes": {"$ne": None}}},
+        {"$group": {"_id": "$_id.Mes", "count": {"$sum": "$count"}}},
+        {"$sort": {"_id": 1}},
+    ]
+
+
+def acumular_por_anio(meses):
+    ''' Sumar los conteos mensuales por año '''
+    anios = Counter()
+    for fila in meses:
+        anios[datetime(fila["_id"].year, 1, 1)] += fila["count"]
+    return [{"_id": anio, "count": anios[anio]} for anio in sorted(anios)]
+
+
+def buckets(filas):
+    return [{"fecha": fila["_id"].isoformat(), "count": fila["count"]} for fila in filas if fila["_id"] is not None]
@@ -0,0 +1,490 @@
+"""
+Instantánea columnar de avistamientos en memoria (opcional, MOTOR_MEMORIA=1).
+
+Al arrancar y cuando la versión de los datos (version_datos.py) cambia y se
+mantiene estable MOTOR_MEMORIA_ESTABLE_S segundos, se lee la colección una sola
+vez y se guarda en arreglos de NumPy (la conversión se hace en un hilo):
+
+- lat/lng: float32 (NaN si el documento no tiene coordenadas).
+- FechaEvento: int64 en milisegundos UTC (NAT_MS si falta o no es Date).
+- Geohash: int64 con los 9 caracteres en base 32 (-1 si falta); el prefijo
+  de precisión p es un desplazamiento de bits.
+- Cada nivel de Taxonomia, Ubicacion.Pais y NombreCientifico: códigos int32
+  sobre un diccionario de valores (None incluido).
+
+Los filtros de construir_filtro se traducen a máscaras vectorizadas y las
+facetas, el histograma, los agrupados, los clusters, la exportación de
+coordenadas y el conteo total se calculan sobre ellas. Cualquier filtro que
+la instantánea no sabe evaluar, o una instantánea de otra versión, devuelve
+None y la ruta se resuelve en MongoDB como siempre. Los listados siguen en
+MongoDB: la instantánea no guarda los documentos completos.
+
+El uso de memoria (bytes por columna y por diccionario) se publica en
+/metrics/instantanea y se imprime al terminar cada carga.
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .binario import ColumnasCoordenadas
+from .filtros import CAMPO_TAXONOMIA_NORM, NIVELES_TAXONOMIA, normalizar_texto
+from .geo import BASE32, CAMPO_GEOHASH, CAMPO_PUNTO, PRECISION_GEOHASH, coordenadas_punto
+
+MOTOR_MEMORIA = os.getenv("MOTOR_MEMORIA", "0") == "1"
+# Segundos antes de reintentar una carga fallida de la misma versión
+REINTENTO_CARGA_S = float(os.getenv("MOTOR_MEMORIA_REINTENTO_S", "60"))
+# Segundos que la versión debe quedar quieta antes de recargar: varias cargas o migraciones
+# seguidas la incrementan una tras otra y cada cambio no debe disparar un recorrido completo
+ESTABLE_S = float(os.getenv("MOTOR_MEMORIA_ESTABLE_S", "30"))
+TAM_LOTE_INSTANTANEA = 20000
+
+# Dimensiones codificadas por diccionario: niveles taxonómicos, país y nombre científico
+DIMENSIONES_INSTANTANEA = NIVELES_TAXONOMIA + ["Pais", "NombreCientifico"]
+_CAMPOS_IGUALDAD = {"Ubicacion.Pais": "Pais", "NombreCientifico": "NombreCientifico"}
+_CAMPOS_NORM = {f"{CAMPO_TAXONOMIA_NORM}.{nivel}": nivel for nivel in NIVELES_TAXONOMIA}
+
+PROYECCION_INSTANTANEA = {
+    "_id": 0, "Taxonomia": 1, "Ubicacion.Pais": 1, f"{CAMPO_PUNTO}.coordinates": 1,
+    "Ubicacion.Geolocalizacion": 1, CAMPO_GEOHASH: 1, "NombreCientifico": 1, "FechaEvento": 1,
+}
+
+EPOCA = datetime(1970, 1, 1)
+NAT_MS = np.iinfo(np.int64).min
+MS_DIA = 86400000
+# Geohash -> dígitos de int(..., 32)
+_A_BASE32 = str.maketrans(BASE32, "0123456789abcdefghijklmnopqrstuv")
+
+
+def _ms(fecha: datetime) -> int:
+    ''' Milisegundos desde la época (BSON guarda las fechas con precisión de milisegundo) '''
+    return (fecha - EPOCA) // timedelta(milliseconds=1)
+
+
+def _fecha(ms) -> datetime:
+    return EPOCA + timedelta(milliseconds=int(ms))
+
+
+def _geohash_entero(texto) -> int:
+    ''' Geohash como entero de PRECISION_GEOHASH caracteres (-1 si no es válido) '''
+    if not isinstance(texto, str) or not texto:
+        return -1
+    texto = texto[:PRECISION_GEOHASH]
+    try:
+        return int(texto.translate(_A_BASE32), 32) << 5 * (PRECISION_GEOHASH - len(texto))
+    except ValueError:
+        return -1
+
+
+def _geohash_texto(valor: int, precision: int) -> str:
+    caracteres = []
+    for _ in range(precision):
+        caracteres.append(BASE32[valor & 31])
+        valor >>= 5
+    return "".join(reversed(caracteres))
+
+
+def _clave_orden(valor):
+    ''' Orden de MongoDB entre tipos: null, números, cadenas y el resto '''
+    if valor is None:
+        return (0, 0)
+    if isinstance(valor, (int, float)):
+        return (1, valor)
+    if isinstance(valor, str):
+        return (2, valor)
+    return (3, str(valor))
+
+
+class Diccionario:
+    ''' Valores distintos de una dimensión en orden de aparición, con su código '''
+    __slots__ = ("codigos", "valores")
+
+    def __init__(self):
+        self.codigos = {}
+        self.valores = []
+
+    def codigo(self, valor) -> int:
+        codigo = self.codigos.get(valor)
+        if codigo is None:
+            codigo = self.codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+        return codigo
+
+    def nbytes(self) -> int:
+        ''' Tamaño aproximado en memoria (lista, dict y los objetos de texto) '''
+        return sys.getsizeof(self.valores) + sys.getsizeof(self.codigos) + sum(sys.getsizeof(v) for v in self.valores)
+
+
+class ConstructorInstantanea:
+    ''' Acumula los documentos de un cursor por lotes y los vuelca a columnas de NumPy '''
+
+    def __init__(self):
+        self.diccionarios = {dim: Diccionario() for dim in DIMENSIONES_INSTANTANEA}
+        self.fechas_irregulares = 0
+        self._lotes = []
+        self._nuevo_lote()
+
+    def _nuevo_lote(self):
+        self._lat, self._lng, self._fechas, self._geohash = [], [], [], []
+        self._codigos = {dim: [] for dim in DIMENSIONES_INSTANTANEA}
+
+    def agregar(self, doc):
+        coords = coordenadas_punto(doc)
+        lat, lng = coords if coords is not None else (np.nan, np.nan)
+        self._lat.append(lat)
+        self._lng.append(lng)
+        fecha = doc.get("FechaEvento")
+        if isinstance(fecha, datetime):
+            self._fechas.append(_ms(fecha.replace(tzinfo=None)))
+        else:
+            if fecha not in (None, ""):
+                self.fechas_irregulares += 1
+            self._fechas.append(NAT_MS)
+        ubicacion = doc.get("Ubicacion") if isinstance(doc.get("Ubicacion"), dict) else {}
+        self._geohash.append(_geohash_entero(ubicacion.get("Geohash")))
+        taxonomia = doc.get("Taxonomia") if isinstance(doc.get("Taxonomia"), dict) else {}
+        valores = {nivel: taxonomia.get(nivel) for nivel in NIVELES_TAXONOMIA}
+        valores["Pais"] = ubicacion.get("Pais")
+        valores["NombreCientifico"] = doc.get("NombreCientifico")
+        for dim, valor in valores.items():
+            try:
+                codigo = self.diccionarios[dim].codigo(valor)
+            except TypeError:  # valores no hashables (listas, subdocumentos)
+                codigo = self.diccionarios[dim].codigo(str(valor))
+            self._codigos[dim].append(codigo)
+        if len(self._lat) >= TAM_LOTE_INSTANTANEA:
+            self._volcar()
+
+    def agregar_lote(self, docs):
+        for doc in docs:
+            self.agregar(doc)
+
+    def _volcar(self):
+        if self._lat:
+            self._lotes.append({
+                "lat": np.asarray(self._lat, dtype=np.float32),
+                "lng": np.asarray(self._lng, dtype=np.float32),
+                "fechas": np.asarray(self._fechas, dtype=np.int64),
+                "geohash": np.asarray(self._geohash, dtype=np.int64),
+                **{dim: np.asarray(codigos, dtype=np.int32) for dim, codigos in self._codigos.items()},
+            })
+            self._nuevo_lote()
+
+    def terminar(self, version, segundos: float):
+        self._volcar()
+        columnas = {}
+        for nombre, tipo in (("lat", np.float32), ("lng", np.float32), ("fechas", np.int64), ("geohash", np.int64),
+                             *((dim, np.int32) for dim in DIMENSIONES_INSTANTANEA)):
+            partes = [lote[nombre] for lote in self._lotes]
+            columnas[nombre] = np.concatenate(partes) if partes else np.empty(0, tipo)
+        self._lotes = []
+        return Instantanea(columnas, self.diccionarios, version, segundos, self.fechas_irregulares)
+
+
+async def construir_instantanea(coleccion, version):
+    """
+    Leer la colección completa (proyección mínima) y construir la instantánea.
+    El bucle de eventos solo recibe los lotes del cursor; la conversión de cada lote a
+    columnas y el ensamblado final se hacen en un hilo para no frenar las peticiones.
+    """
+    inicio = time.perf_counter()
+    constructor = ConstructorInstantanea()
+    lote = []
+    async for doc in coleccion.find({}, PROYECCION_INSTANTANEA).batch_size(TAM_LOTE_INSTANTANEA):
+        lote.append(doc)
+        if len(lote) >= TAM_LOTE_INSTANTANEA:
+            await asyncio.to_thread(constructor.agregar_lote, lote)
+            lote = []
+    if lote:
+        await asyncio.to_thread(constructor.agregar_lote, lote)
+    return await asyncio.to_thread(constructor.terminar, version, time.perf_counter() - inicio)
+
+
+def _cajas(geometria):
+    """
+    Cajas (min_lng, min_lat, max_lng, max_lat) de una geometría de geometria_bbox.
+    Cada anillo debe tener solo dos latitudes y los mismos extremos de longitud en ambas;
+    cualquier otra forma devuelve None (se resuelve en MongoDB).
+    """
+    tipo = geometria.get("type") if isinstance(geometria, dict) else None
+    if tipo == "Polygon":
+        poligonos = [geometria.get("coordinates")]
+    elif tipo == "MultiPolygon":
+        poligonos = geometria.get("coordinates")
+    else:
+        return None
+    cajas = []
+    try:
+        for poligono in poligonos:
+            if len(poligono) != 1:
+                return None
+            filas = {}
+            for lng, lat in poligono[0]:
+                filas.setdefault(lat, []).append(lng)
+            if len(filas) != 2:
+                return None
+            (min_lat, inferior), (max_lat, superior) = sorted(filas.items())
+            if (min(inferior), max(inferior)) != (min(superior), max(superior)):
+                return None
+            cajas.append((min(inferior), min_lat, max(inferior), max_lat))
+    except (TypeError, ValueError):
+        return None
+    return cajas
+
+
+class Instantanea:
+    ''' Columnas de una versión de los datos y las consultas vectorizadas sobre ellas '''
+
+    def __init__(self, columnas: dict, diccionarios: dict, version, segundos: float, fechas_irregulares: int = 0):
+        self.lat = columnas.pop("lat")
+        self.lng = columnas.pop("lng")
+        self.fechas = columnas.pop("fechas")
+        self.geohash = columnas.pop("geohash")
+        self.codigos = columnas
+        self.diccionarios = diccionarios
+        self.version = version
+        self.segundos_carga = segundos
+        self.cargada = datetime.utcnow()
+        self.fechas_irregulares = fechas_irregulares
+        self.documentos = len(self.lat)
+        self.con_fecha = self.fechas != NAT_MS
+        # Valor normalizado (TaxonomiaNorm) -> códigos de los valores originales que lo producen;
+        # se asume TaxonomiaNorm completa (load_data.py la escribe y la migración la completa)
+        self._normalizados = {}
+        for nivel in NIVELES_TAXONOMIA:
+            grupos = {}
+            for codigo, valor in enumerate(diccionarios[nivel].valores):
+                grupos.setdefault(normalizar_texto(valor), []).append(codigo)
+            self._normalizados[nivel] = {v: np.asarray(c, dtype=np.int32) for v, c in grupos.items()}
+
+    ##########################Filtros###############################
+    def _tabla(self, dim: str, codigos) -> np.ndarray:
+        ''' Máscara de los documentos cuyo código de dim está en codigos (tabla de búsqueda) '''
+        tabla = np.zeros(len(self.diccionarios[dim].valores), dtype=bool)
+        tabla[codigos] = True
+        return tabla[self.codigos[dim]]
+
+    def mascara(self, query: dict):
+        ''' Máscara booleana de un filtro de construir_filtro; None si usa algo que no se puede evaluar aquí '''
+        mascara = np.ones(self.documentos, dtype=bool)
+        for campo, valor in query.items():
+            if campo in _CAMPOS_NORM and not isinstance(valor, dict):
+                codigos = self._normalizados[_CAMPOS_NORM[campo]].get(valor)
+                if codigos is None:
+                    return np.zeros(self.documentos, dtype=bool)
+                mascara &= self._tabla(_CAMPOS_NORM[campo], codigos)
+            elif campo in _CAMPOS_IGUALDAD and not isinstance(valor, dict):
+                dim = _CAMPOS_IGUALDAD[campo]
+                codigo = self.diccionarios[dim].codigos.get(valor)
+                if codigo is None:
+                    return np.zeros(self.documentos, dtype=bool)
+                mascara &= self.codigos[dim] == codigo
+            elif campo == "FechaEvento" and isinstance(valor, dict) and valor and set(valor) <= {"$gte", "$lte"}:
+                if not all(isinstance(v, datetime) for v in valor.values()):
+                    return None
+                mascara &= self.con_fecha
+                if "$gte" in valor:
+                    mascara &= self.fechas >= _ms(valor["$gte"])
+                if "$lte" in valor:
+                    mascara &= self.fechas <= _ms(valor["$lte"])
+            elif campo == CAMPO_PUNTO and isinstance(valor, dict) and list(valor) == ["$geoWithin"]:
+                geometria = valor["$geoWithin"].get("$geometry") if isinstance(valor["$geoWithin"], dict) else None
+                cajas = _cajas(geometria)
+                if cajas is None:
+                    return None
+                dentro = np.zeros(self.documentos, dtype=bool)
+                for min_lng, min_lat, max_lng, max_lat in cajas:
+                    dentro |= (self.lat >= min_lat) & (self.lat <= max_lat) & (self.lng >= min_lng) & (self.lng <= max_lng)
+                mascara &= dentro
+            else:
+                return None
+        return mascara
+
+    ##########################Consultas###############################
+    def _top(self, dim: str, mascara: np.ndarray, top: int):
+        ''' Los top valores de dim por conteo (desempate por valor, como $sort {count: -1, _id: 1}) '''
+        conteos = np.bincount(self.codigos[dim][mascara], minlength=len(self.diccionarios[dim].valores))
+        presentes = np.flatnonzero(conteos)
+        if len(presentes) > top:
+            corte = np.partition(conteos[presentes], len(presentes) - top)[len(presentes) - top]
+            presentes = presentes[conteos[presentes] >= corte]
+        valores = self.diccionarios[dim].valores
+        filas = sorted(((valores[i], int(conteos[i])) for i in presentes), key=lambda f: (-f[1], _clave_orden(f[0])))
+        return [{"valor": valor, "count": conteo} for valor, conteo in filas[:top]]
+
+    def _anios(self, mascara: np.ndarray) -> np.ndarray:
+        fechas = self.fechas[mascara & self.con_fecha]
+        return fechas.view("datetime64[ms]").astype("datetime64[Y]").astype(np.int64) + 1970
+
+    def facetas(self, mascara: np.ndarray, top: int) -> dict:
+        ''' Mismo resultado que formatear_facetas(pipeline_facetas(...)) '''
+        facetas = {dim: self._top(dim, mascara, top) for dim in NIVELES_TAXONOMIA + ["Pais"]}
+        anios, conteos = np.unique(self._anios(mascara), return_counts=True)
+        facetas["Anio"] = [{"valor": int(a), "count": int(c)} for a, c in zip(anios, conteos)]
+        return {"total": int(mascara.sum()), "facetas": facetas}
+
+    def histograma(self, mascara: np.ndarray, unidad: str):
+        ''' Filas {"_id": inicio de la cubeta, "count"} como pipeline_histograma (semanas desde el lunes) '''
+        fechas = self.fechas[mascara & self.con_fecha]
+        if unidad in ("day", "week"):
+            dias = np.floor_divide(fechas, MS_DIA)
+            if unidad == "week":
+                # 1970-01-01 fue jueves: (dias + 3) % 7 son los días transcurridos desde el lunes
+                dias -= (dias + 3) % 7
+            claves = dias * MS_DIA
+        else:
+            trunc = "datetime64[M]" if unidad == "month" else "datetime64[Y]"
+            claves = fechas.view("datetime64[ms]").astype(trunc).astype("datetime64[ms]").view(np.int64)
+        inicios, conteos = np.unique(claves, return_counts=True)
+        return [{"_id": _fecha(inicio), "count": int(conteo)} for inicio, conteo in zip(inicios, conteos)]
+
+    def agrupado(self, dim: str, por_valor: bool = False, limit: int = 0):
+        ''' Filas {"_id", "count"} como pipeline_agrupado; None si la dimensión no está en memoria '''
+        if dim == "FechaEvento":
+            if self.fechas_irregulares:
+                return None
+            fechas, conteos = np.unique(self.fechas[self.con_fecha], return_counts=True)
+            filas = [(_fecha(f), int(c)) for f, c in zip(fechas, conteos)]
+        elif dim in self.codigos:
+            conteos = np.bincount(self.codigos[dim], minlength=len(self.diccionarios[dim].valores))
+            valores = self.diccionarios[dim].valores
+            filas = [(valores[i], int(conteos[i])) for i in np.flatnonzero(conteos)
+                     if dim == "Pais" or valores[i] not in (None, "")]
+        else:
+            return None
+        filas.sort(key=(lambda f: _clave_orden(f[0])) if por_valor else (lambda f: (-f[1], _clave_orden(f[0]))))
+        if limit:
+            filas = filas[:limit]
+        return [{"_id": valor, "count": conteo} for valor, conteo in filas]
+
+    def clusters(self, mascara: np.ndarray, precision: int, top_especies: int = 3, max_celdas: int = 5000):
+        ''' Celdas como pipeline_clusters: celda, count, centroide y especies más frecuentes '''
+        seleccion = mascara & (self.geohash >= 0)
+        celdas_doc = self.geohash[seleccion] >> (5 * (PRECISION_GEOHASH - precision))
+        if not len(celdas_doc):
+            return []
+        celdas, inversa, conteos = np.unique(celdas_doc, return_inverse=True, return_counts=True)
+        suma_lat = np.bincount(inversa, weights=self.lat[seleccion])
+        suma_lng = np.bincount(inversa, weights=self.lng[seleccion])
+        orden = np.argsort(-conteos, kind="stable")[:max_celdas]
+        rango = np.full(len(celdas), -1, dtype=np.int64)
+        rango[orden] = np.arange(len(orden))
+
+        # Pares (rango de la celda, especie) con su conteo, ordenados por celda y conteo descendente
+        n_especies = max(len(self.diccionarios["NombreCientifico"].valores), 1)
+        rango_doc = rango[inversa]
+        elegidos = rango_doc >= 0
+        pares, conteo_pares = np.unique(rango_doc[elegidos] * n_especies + self.codigos["NombreCientifico"][seleccion][elegidos],
+                                        return_counts=True)
+        celda_par, especie_par = np.divmod(pares, n_especies)
+        posiciones = np.lexsort((especie_par, -conteo_pares, celda_par))
+        celda_par, especie_par, conteo_pares = celda_par[posiciones], especie_par[posiciones], conteo_pares[posiciones]
+        puesto = np.arange(len(celda_par)) - np.searchsorted(celda_par, celda_par)
+        nombres = self.diccionarios["NombreCientifico"].valores
+        especies = [[] for _ in orden]
+        for celda, especie, conteo in zip(celda_par[puesto < top_especies], especie_par[puesto < top_especies],
+                                          conteo_pares[puesto < top_especies]):
+            especies[celda].append({"nombre": nombres[especie], "count": int(conteo)})
+        return [
+            {
+                "celda": _geohash_texto(int(celdas[i]), precision),
+                "count": int(conteos[i]),
+                "lat": float(suma_lat[i] / conteos[i]),
+                "lng": float(suma_lng[i] / conteos[i]),
+                "top_especies": especies[r],
+            }
+            for r, i in enumerate(orden)
+        ]
+
+    def coordenadas(self, mascara: np.ndarray, limit: int = 0) -> ColumnasCoordenadas:
+        ''' Columnas para codificar_f32/codificar_arrow, en el orden natural de la colección '''
+        indices = np.flatnonzero(mascara & ~np.isnan(self.lat))
+        if limit > 0:
+            indices = indices[:limit]
+        codigos, especie = np.unique(self.codigos["NombreCientifico"][indices], return_inverse=True)
+        valores = self.diccionarios["NombreCientifico"].valores
+        nombres = [valores[c] or "" for c in codigos]
+        return ColumnasCoordenadas.desde_arreglos(self.lat[indices], self.lng[indices], especie, nombres)
+
+    ##########################Memoria###############################
+    def memoria(self) -> dict:
+        ''' Bytes por columna y por diccionario, más los datos de la carga '''
+        columnas = {"lat": self.lat.nbytes, "lng": self.lng.nbytes, "fechas": self.fechas.nbytes,
+                    "geohash": self.geohash.nbytes, "con_fecha": self.con_fecha.nbytes}
+        columnas.update({f"codigos.{dim}": codigos.nbytes for dim, codigos in self.codigos.items()})
+        diccionarios = {dim: d.nbytes() for dim, d in self.diccionarios.items()}
+        indices = sum(c.nbytes for grupos in self._normalizados.values() for c in grupos.values())
+        total = sum(columnas.values()) + sum(diccionarios.values()) + indices
+        return {
+            "version": self.version,
+            "documentos": self.documentos,
+            "cargada": self.cargada.isoformat(),
+            "segundos_carga": round(self.segundos_carga, 3),
+            "valores_distintos": {dim: len(d.valores) for dim, d in self.diccionarios.items()},
+            "bytes_columnas": columnas,
+            "bytes_diccionarios": diccionarios,
+            "bytes_indices_normalizados": indices,
+            "bytes_total": total,
+            "mb_total": round(total / (1024 * 1024), 2),
+        }
+
+
+class MotorInstantanea:
+    """
+    Instantánea vigente y su recarga en segundo plano.
+    - actual() devuelve la instantánea solo si es de la versión pedida; si no, devuelve None
+      para que la ruta use MongoDB y programa una carga (una a la vez).
+    - La primera carga empieza enseguida; las recargas esperan a que la versión lleve
+      ESTABLE_S segundos sin cambiar (cargas y migraciones seguidas la cambian una tras otra).
+    - Una carga fallida no se reintenta para la misma versión antes de REINTENTO_CARGA_S.
+    """
+
+    def __init__(self, habilitado: bool = MOTOR_MEMORIA, estable: float = ESTABLE_S):
+        self.habilitado = habilitado
+        self.estable = estable
+        self.instantanea = None
+        self.error = None
+        self._tarea = None
+        self._fallo = (None, 0.0)
+        self._vista = (None, 0.0)
+
+    def actual(self, db, version):
+        if not self.habilitado:
+            return None
+        instantanea = self.instantanea
+        if instantanea is not None and instantanea.version == version:
+            return instantanea
+        ahora = time.monotonic()
+        if self._vista[0] != version:
+            self._vista = (version, ahora)
+        estable = instantanea is None or ahora - self._vista[1] >= self.estable
+        version_fallida, momento = self._fallo
+        reintentar = version_fallida != version or ahora - momento >= REINTENTO_CARGA_S
+        if (self._tarea is None or self._tarea.done()) and estable and reintentar:
+            self._tarea = asyncio.create_task(self._cargar(db, version))
+        return None
+
+    async def _cargar(self, db, version):
+        try:
+            self.instantanea = await construir_instantanea(db.avistamientos, version)
+            self.error = None
+            memoria = self.instantanea.memoria()
+            print(f"Instantánea en memoria v{version}: {memoria['documentos']} documentos, "
+                  f"{memoria['mb_total']} MB, {memoria['segundos_carga']} s")
+        except Exception as e:
+            self.error = str(e)
+            self._fallo = (version, time.monotonic())
+            print(f"Aviso: no se pudo cargar la instantánea en memoria: {e}")
+
+    def memoria(self) -> dict:
+        estado = {
+            "habilitado": self.habilitado,
+            "cargando": self._tarea is not None and not self._tarea.done(),
+            "error": self.error,
+        }
+        if self.instantanea is not None:
+            estado.update(self.instantanea.memoria())
+        return estado
@@ -0,0 +1,204 @@
+"""
+Consultas en lote: varias rutas GET de la API en una sola petición.
+
+El cuerpo es una lista de subconsultas con nombre, cada una con la ruta y los
+parámetros que aceptaría la ruta GET equivalente (el mismo vocabulario de
+filtros). Cada subconsulta se despacha por el router de la app, con la misma
+validación y los mismos errores que la petición individual, y todas se
+ejecutan a la vez contra MongoDB:
+
+- Las subconsultas idénticas (misma ruta y parámetros) se ejecutan una sola vez.
+- La respuesta combinada trae, por nombre, el código, el tiempo en ms, las
+  cabeceras de paginación/rollup y los datos o el error de cada subconsulta;
+  un fallo en una subconsulta no afecta a las demás.
+- Los cuerpos JSON de las subconsultas se insertan tal cual en la respuesta,
+  sin volver a decodificarlos. Las rutas que no responden JSON (exportaciones
+  binarias) y el modo streaming se rechazan al validar el lote, y el cuerpo de
+  cada subconsulta tiene un tamaño máximo.
+"""
+import asyncio
+import os
+import time
+from urllib.parse import urlencode
+
+import orjson
+from starlette.routing import Match
+
+from .serializacion import a_json
+
+MAX_CONSULTAS_LOTE = int(os.getenv("MAX_CONSULTAS_LOTE", "25"))
+# Subconsultas de un mismo lote en ejecución simultánea (el resto espera turno)
+CONCURRENCIA_LOTE = int(os.getenv("CONCURRENCIA_LOTE", "8"))
+PREFIJO_LOTE = "/api/"
+# Bytes máximos del cuerpo de una subconsulta (se acumula en memoria hasta armar la respuesta)
+MAX_BYTES_SUBCONSULTA = int(os.getenv("MAX_BYTES_SUBCONSULTA", str(8 << 20)))
+# Rutas con respuesta binaria (f32/arrow/png): no caben en la respuesta JSON combinada
+RUTAS_NO_JSON = ("/api/avistamientos/coordenadas", "/api/avistamientos/densidad")
+
+
+class SubconsultaDemasiadoGrande(Exception):
+    ''' El cuerpo de una subconsulta supera MAX_BYTES_SUBCONSULTA '''
+
+
+def _texto(valor) -> str:
+    ''' Valor de un parámetro tal como llegaría en la query string '''
+    if isinstance(valor, bool):
+        return "true" if valor else "false"
+    return valor if isinstance(valor, str) else str(valor)
+
+
+def leer_lote(cuerpo: dict) -> list:
+    """
+    Validar el cuerpo {"consultas": [{"nombre", "ruta", "params"}]} y normalizar cada subconsulta.
+    La ruta puede ser absoluta (/api/avistamientos/buscar) o relativa a /api/ (avistamientos/buscar).
+    Lanza ValueError si el cuerpo no es válido.
+    """
+    consultas = cuerpo.get("consultas") if isinstance(cuerpo, dict) else None
+    if not isinstance(consultas, list) or not consultas:
+        raise ValueError("El cuerpo debe incluir una lista no vacía en 'consultas'")
+    if len(consultas) > MAX_CONSULTAS_LOTE:
+        raise ValueError(f"Máximo {MAX_CONSULTAS_LOTE} subconsultas por lote")
+    normalizadas, nombres = [], set()
+    for i, consulta in enumerate(consultas):
+        if not isinstance(consulta, dict) or not isinstance(consulta.get("ruta"), str):
+            raise ValueError(f"La subconsulta {i} debe tener 'ruta'")
+        nombre = str(consulta.get("nombre") or i)
+        if nombre in nombres:
+            raise ValueError(f"Nombre de subconsulta repetido: {nombre}")
+        nombres.add(nombre)
+        params = consulta.get("params") or {}
+        if not isinstance(params, dict):
+            raise ValueError(f"'params' de {nombre} debe ser un objeto")
+        ruta = consulta["ruta"].split("?", 1)[0]
+        if not ruta.startswith("/"):
+            ruta = PREFIJO_LOTE + ruta
+        if not ruta.startswith(PREFIJO_LOTE):
+            raise ValueError(f"La ruta de {nombre} debe estar bajo {PREFIJO_LOTE}")
+        if ruta.rstrip("/") in RUTAS_NO_JSON:
+            raise ValueError(f"La ruta de {nombre} no devuelve JSON; no se admite en lotes")
+        if "stream" in params:
+            raise ValueError(f"'stream' no se admite en lotes ({nombre})")
+        # Listas -> parámetro repetido; el orden de las claves no distingue subconsultas
+        pares = sorted(
+            (str(k), _texto(v))
+            for k, valores in params.items()
+            for v in (valores if isinstance(valores, list) else [valores])
+        )
+        normalizadas.append((nombre, ruta, urlencode(pares)))
+    return normalizadas
+
+
+def _buscar_ruta(app, scope):
+    for ruta in app.router.routes:
+        coincide, hijo = ruta.matches(scope)
+        if coincide == Match.FULL:
+            return ruta, hijo
+    return None, None
+
+
+async def _despachar(app, base: dict, ruta: str, consulta: str):
+    ''' Ejecutar una petición GET interna por el router; devuelve (código, cabeceras, cuerpo, tipo) '''
+    scope = {
+        **base,
+        "method": "GET",
+        "path": ruta,
+        "raw_path": ruta.encode("utf-8"),
+        "query_string": consulta.encode("latin-1"),
+        "headers": [(b"accept", b"application/json")],
+    }
+    scope.pop("route", None)
+    scope.pop("endpoint", None)
+    destino, hijo = _buscar_ruta(app, scope)
+    if destino is None:
+        return 404, {}, a_json({"detail": f"Ruta no encontrada: {ruta}"}), "application/json"
+    scope.update(hijo)
+
+    recibido = False
+
+    async def recibir():
+        nonlocal recibido
+        if recibido:
+            return {"type": "http.disconnect"}
+        recibido = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    inicio, partes = {}, []
+    tamano = 0
+
+    async def enviar(mensaje):
+        nonlocal tamano
+        if mensaje["type"] == "http.response.start":
+            inicio.update(mensaje)
+        elif mensaje["type"] == "http.response.body":
+            cuerpo = mensaje.get("body", b"")
+            tamano += len(cuerpo)
+            if tamano > MAX_BYTES_SUBCONSULTA:
+                # Cortar la respuesta en lugar de seguir acumulándola
+                raise SubconsultaDemasiadoGrande()
+            partes.append(cuerpo)
+
+    try:
+        await destino.handle(scope, recibir, enviar)
+    except SubconsultaDemasiadoGrande:
+        detalle = f"La respuesta supera {MAX_BYTES_SUBCONSULTA} bytes; reduzca limit o use la ruta individual"
+        return 413, {}, a_json({"detail": detalle}), "application/json"
+    cabeceras = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in inicio.get("headers", [])}
+    return inicio.get("status", 500), cabeceras, b"".join(partes), cabeceras.get("content-type", "")
+
+
+def _error(cuerpo: bytes, tipo: str):
+    if tipo.startswith("application/json"):
+        try:
+            contenido = orjson.loads(cuerpo)
+            return contenido.get("detail", contenido) if isinstance(contenido, dict) else contenido
+        except orjson.JSONDecodeError:
+            pass
+    return cuerpo.decode("utf-8", "replace")
+
+
+async def ejecutar_lote(app, base: dict, consultas: list, cabeceras_expuestas=()) -> bytes:
+    """
+    Ejecutar las subconsultas normalizadas por leer_lote a la vez y armar la respuesta JSON combinada:
+    {"ms": total, "resultados": {nombre: {"estado", "ms", "cabeceras", "datos" | "error", "igual_a"?}}}
+    """
+    inicio_lote = time.perf_counter()
+    semaforo = asyncio.Semaphore(max(1, CONCURRENCIA_LOTE))
+    unicas = {}
+    for nombre, ruta, consulta in consultas:
+        unicas.setdefault((ruta, consulta), nombre)
+
+    async def ejecutar(ruta, consulta):
+        async with semaforo:
+            t0 = time.perf_counter()
+            try:
+                estado, cabeceras, cuerpo, tipo = await _despachar(app, base, ruta, consulta)
+            except Exception as e:
+                estado, cabeceras, cuerpo, tipo = 500, {}, a_json({"detail": str(e)}), "application/json"
+            return estado, cabeceras, cuerpo, tipo, (time.perf_counter() - t0) * 1000
+
+    claves = list(unicas)
+    resultados = dict(zip(claves, await asyncio.gather(*(ejecutar(r, c) for r, c in claves))))
+
+    entradas = []
+    for nombre, ruta, consulta in consultas:
+        estado, cabeceras, cuerpo, tipo, ms = resultados[(ruta, consulta)]
+        meta = {
+            "estado": estado,
+            "ms": round(ms, 2),
+            "cabeceras": {c: cabeceras[c.lower()] for c in cabeceras_expuestas if c.lower() in cabeceras},
+        }
+        if unicas[(ruta, consulta)] != nombre:
+            meta["igual_a"] = unicas[(ruta, consulta)]
+        if estado < 400 and tipo.startswith("application/json"):
+            # Insertar el JSON de la subconsulta sin decodificarlo
+            entrada = a_json(meta)[:-1] + b',"datos":' + cuerpo + b"}"
+        else:
+            if estado < 400:
+                meta["estado"] = 400
+                meta["error"] = f"La subconsulta no devuelve JSON ({tipo or 'sin tipo'}); no se admite en lotes"
+            else:
+                meta["error"] = _error(cuerpo, tipo)
+            entrada = a_json(meta)
+        entradas.append(a_json(nombre) + b":" + entrada)
+    total = a_json(round((time.perf_counter() - inicio_lote) * 1000, 2))
+    return b'{"ms":' + total + b',"resultados":{' + b",".join(entradas) + b"}}"
@@ -1,31 +1,67 @@
-from fastapi import FastAPI, HTTPException
-from pymongo import MongoClient
+from fastapi import FastAPI, HTTPException, Depends, Body, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
 from .models import Avistamiento
-import os
-from datetime import datetime
+from .db import db, agregar, consultar, contar, en_paralelo
+from .filtros import (
+    NIVELES_TAXONOMIA, construir_filtro, filtro_taxonomia, parse_bbox, parse_fecha,
+)
+from .streaming import limite_stream, respuesta_ndjson
+from .paginacion import (
+    CABECERA_CURSOR, CABECERA_TOTAL, ORDENES, aplicar_cursor, codificar_cursor, cortar_pagina,
+)
+from .binario import (
+    FORMATOS_BINARIOS, MEDIA_ARROW, MEDIA_F32, PROYECCION_COORDENADAS, codificar_arrow, codificar_f32, leer_coordenadas, pa,
+)
+from .formatos import PROYECCION_SIN_INTERNOS, ConstructorColumnas, hojas_de, llenar_columnas, opciones_salida, proyeccion_con_orden
+from .indices import avisos, sincronizar_async
+from .cache import CacheRespuestas
+from .serializacion import RespuestaJSON, respuesta_json
+from .lote import ejecutar_lote, leer_lote
+from .muestreo import CABECERA_CELDAS, agrupar_celdas, pipeline_conteo_celdas, pipeline_muestra, umbral_cuota
+from .metricas import MEDIA_PROMETHEUS, MetricasHTTP, monitor_comandos, registro
+from .version_datos import VigilanteVersion
+from .fechas import fechas_normalizadas_async
+from .histograma import (
+    UNIDADES, UNIDADES_CUBO, acumular_por_anio, buckets, filtro_cubo,
+    pipeline_histograma, pipeline_histograma_cubo,
+)
+from .densidad import (
+    CABECERA_BBOX_DENSIDAD, FORMATOS_DENSIDAD, MEDIA_PNG, MapasEnMemoria, codificar_png, codificar_u32, dimension_mapa, recortar,
+)
+from .facetas import TOP_MAXIMO, formatear_facetas, pipeline_facetas, pipeline_facetas_cubo
+from .instantanea import MotorInstantanea
+from .taxonomia import NIVELES_SUGERENCIA, ServicioTaxonomia
+from .rollups import (
+    CABECERA_ROLLUP, COLECCION_CUBO, COLECCION_META, COLECCION_NIVELES, FILTRO_META_CUBO, ID_META,
+    consulta_nivel, orden_nivel, pipeline_agrupado,
+)
+from .geo import (
+    CAMPO_PUNTO, filtro_radio, geometria_bbox,
+    pipeline_cercanos, pipeline_clusters, precision_para_zoom,
+)
+from typing import Optional
+
+# orjson para todas las respuestas JSON; los listados la devuelven directamente (respuesta_json)
+app = FastAPI(default_response_class=RespuestaJSON)
 
-app = FastAPI()
+# Índices declarados en app/indices.py: se crean los que faltan y se informa cualquier fallo
+# o diferencia sin bloquear el arranque (el informe completo: python app/indices.py)
+@app.on_event("startup")
+async def _asegurar_indices():
+    try:
+        for aviso in avisos(await sincronizar_async(db)):
+            print(f"Aviso: {aviso}")
+    except Exception as e:
+        print(f"Aviso: no se pudieron revisar los índices: {e}")
 
-# Índices para acelerar las consultas. Se crean en startup.
+# Las consultas por fecha asumen FechaEvento como Date; avisar si falta la migración
 @app.on_event("startup")
-def _ensure_indexes():
+async def _verificar_fechas():
     try:
-        db.avistamientos.create_index("FechaEvento")
-        db.avistamientos.create_index("NombreCientifico")
-        db.avistamientos.create_index("Ubicacion.Pais")
-        db.avistamientos.create_index("Ubicacion.Latitud")
-        db.avistamientos.create_index("Ubicacion.Longitud")
-        db.avistamientos.create_index("Taxonomia.Reino")
-        db.avistamientos.create_index("Taxonomia.Filo")
-        db.avistamientos.create_index("Taxonomia.Clase")
-        db.avistamientos.create_index("Taxonomia.Orden")
-        db.avistamientos.create_index("Taxonomia.Familia")
-        db.avistamientos.create_index("Taxonomia.Genero")
-        db.avistamientos.create_index("Taxonomia.Especie")
+        if not await fechas_normalizadas_async(db):
+            print("Aviso: FechaEvento no está normalizada; ejecute python app/fechas.py")
     except Exception:
-        # No bloquear el arranque si falla
         pass
 
 app.add_middleware(
@@ -38,435 +74,649 @@ app.add_middleware(
     ],
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    expose_headers=[CABECERA_CURSOR, CABECERA_TOTAL, CABECERA_ROLLUP, CABECERA_CELDAS, CABECERA_BBOX_DENSIDAD]
 )
 
 # Comprimir respuestas grandes para acelerar transferencia
 app.add_middleware(GZipMiddleware, minimum_size=500)
 
-mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-client = MongoClient(mongo_uri)
-db = client[os.getenv("MONGO_DB", "biogeovis")]
+# Versión de los datos (la incrementa load_data.py); invalida la caché de respuestas
+vigilante_version = VigilanteVersion()
+
+async def version_datos():
+    return await vigilante_version.actual(db)
+
+# Instantánea columnar opcional (MOTOR_MEMORIA=1): se recarga en segundo plano al cambiar la versión
+motor_memoria = MotorInstantanea()
+
+@app.on_event("startup")
+async def _cargar_instantanea():
+    if motor_memoria.habilitado:
+        motor_memoria.actual(db, await version_datos())
+
+async def en_memoria(query: dict):
+    """
+    (instantánea, máscara) para resolver un filtro en memoria (app/instantanea.py).
+    Devuelve (None, None) si el motor está apagado, la instantánea no es de la versión
+    actual o el filtro usa algo que no se puede evaluar en memoria: la ruta usa MongoDB.
+    """
+    if not motor_memoria.habilitado:
+        return None, None
+    instantanea = motor_memoria.actual(db, await version_datos())
+    mascara = instantanea.mascara(query) if instantanea is not None else None
+    return (instantanea, mascara) if mascara is not None else (None, None)
+
+# Caché de respuestas por fuera de GZip: guarda los bytes ya comprimidos y responde 304 con ETag
+app.add_middleware(CacheRespuestas, obtener_version=version_datos)
+
+# Métricas por ruta por fuera de todo lo anterior: miden también los aciertos de la caché
+app.add_middleware(MetricasHTTP)
+
 # Tomar en cuenta que los datos de salida se estan limitando a 1000 registros para evitar sobrecarga
 @app.get("/")
-def read_root():
+async def read_root():
     return {"Hello": "World"}
 ################################ Avistamientos #####################################
+async def listar_pagina(response: Response, query: dict, limit: int, cursor: Optional[str] = None,
+                        ordenar_por: str = "_id", error: str = "Error obteniendo avistamientos", skip: int = 0,
+                        stream: Optional[int] = None, total: bool = False, salida: Optional[dict] = None):
+    """
+    Ejecutar una consulta de listado paginada por cursor (keyset).
+    - Ordena por ordenar_por + _id y pide limit + 1 documentos para saber si hay otra página.
+    - Si la hay, el token de la página siguiente se envía en la cabecera X-Next-Cursor;
+      el cuerpo sigue siendo la lista de documentos.
+    - En modo streaming (stream no es None) los documentos se envían como NDJSON directamente
+      desde el cursor, sin tope de página salvo el limit explícito (0 = sin límite); no se
+      combina con format=columns.
+    - Con total=True el conteo de la consulta completa se calcula a la vez que la página
+      y se envía en la cabecera X-Total-Count (desde la instantánea en memoria si está activa).
+    - salida (dependencia opciones_salida): proyección fields= y formato columnar; en
+      format=columns la respuesta se arma columna a columna directamente desde el cursor.
+      Con sample=N se devuelve una muestra estratificada en lugar de una página (listar_muestra).
+    """
+    salida = salida or {"proyeccion": None, "columnas": False}
+    proyeccion = proyeccion_con_orden(salida["proyeccion"], ordenar_por)
+    if salida.get("muestra"):
+        if cursor or stream is not None:
+            raise HTTPException(status_code=400, detail="sample no admite cursor ni streaming")
+        return await listar_muestra(response, query, salida, proyeccion_con_orden(salida["proyeccion"]), error)
+    try:
+        query_pagina = aplicar_cursor(query, cursor, ordenar_por)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if stream is not None:
+        if salida["columnas"]:
+            raise HTTPException(status_code=400, detail="format=columns no admite streaming")
+        consulta = consultar(db.avistamientos, query_pagina, proyeccion).sort(ORDENES[ordenar_por]).skip(skip)
+        return respuesta_ndjson(consulta.limit(stream))
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit debe ser mayor que 0")
+    consulta = consultar(db.avistamientos, query_pagina, proyeccion).sort(ORDENES[ordenar_por])
+    if skip:
+        consulta = consulta.skip(skip)
+    if salida["columnas"]:
+        leer_pagina = llenar_columnas(consulta.limit(limit + 1), hojas_de(salida["proyeccion"]), limit)
+    else:
+        leer_pagina = consulta.limit(limit + 1).to_list(None)
+    try:
+        if total:
+            instantanea, mascara = await en_memoria(query)
+            if instantanea is not None:
+                docs, conteo = await leer_pagina, int(mascara.sum())
+            else:
+                docs, conteo = await en_paralelo(leer_pagina, contar(db.avistamientos, query))
+            response.headers[CABECERA_TOTAL] = str(conteo)
+        else:
+            docs = await leer_pagina
+        if salida["columnas"]:
+            pagina, ultimo = docs
+            siguiente = codificar_cursor(ultimo, ordenar_por) if ultimo else None
+        else:
+            pagina, siguiente = cortar_pagina(docs, limit, ordenar_por)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"{error}: {e}")
+    if siguiente:
+        response.headers[CABECERA_CURSOR] = siguiente
+    return respuesta_json(pagina, response)
+
+async def listar_muestra(response: Response, query: dict, salida: dict, proyeccion: dict, error: str):
+    """
+    Muestra de salida["muestra"] documentos repartidos por celdas de geohash y por fecha (app/muestreo.py).
+    - El total real de la consulta va en X-Total-Count y el número de celdas en X-Sample-Cells.
+    - Si el total cabe en la muestra se devuelven todos los documentos, sin muestrear.
+    """
+    n = salida["muestra"]
+    try:
+        conteos = {d["_id"]: d["n"] for d in await agregar(db.avistamientos, pipeline_conteo_celdas(query))}
+        total = sum(conteos.values())
+        precision, conteos = agrupar_celdas(conteos, n)
+        if total <= n:
+            docs = await consultar(db.avistamientos, query, proyeccion).sort(ORDENES["_id"]).to_list(None)
+        else:
+            pipeline = pipeline_muestra(query, precision, umbral_cuota(conteos.values(), n), n, proyeccion)
+            docs = await agregar(db.avistamientos, pipeline, allowDiskUse=True)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"{error}: {e}")
+    response.headers[CABECERA_TOTAL] = str(total)
+    response.headers[CABECERA_CELDAS] = str(len(conteos))
+    if salida["columnas"]:
+        constructor = ConstructorColumnas(hojas_de(salida["proyeccion"]))
+        for doc in docs:
+            constructor.agregar(doc)
+        return respuesta_json(constructor.resultado(), response)
+    return respuesta_json(docs, response)
+
 @app.get("/api/avistamientos")
-def get_all_avistamientos(skip: int = 0, limit: int = 100):
-    ''' Obtener todos los avistamientos con paginación '''
-    avistamientos = list(db.avistamientos.find().skip(skip).limit(limit))
-    # Convertir ObjectId a string
-    for avistamiento in avistamientos:
-        avistamiento["_id"] = str(avistamiento["_id"])
-    return avistamientos
+async def get_all_avistamientos(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, ordenar_por: str = "_id",
+                                stream: Optional[int] = Depends(limite_stream),
+                                salida: dict = Depends(opciones_salida)):
+    """
+    Obtener todos los avistamientos con paginación.
+    - Usar el cursor de la cabecera X-Next-Cursor para pedir la página siguiente en tiempo constante.
+    - skip se mantiene por compatibilidad, pero es lineal en la profundidad de la página.
+    """
+    return await listar_pagina(response, {}, limit, cursor, ordenar_por, skip=skip, stream=stream, salida=salida)
+
+def filtro_busqueda(
+    desde: Optional[str] = None,
+    hasta: Optional[str] = None,
+    reino: Optional[str] = None,
+    filo: Optional[str] = None,
+    clase: Optional[str] = None,
+    orden: Optional[str] = None,
+    familia: Optional[str] = None,
+    genero: Optional[str] = None,
+    especie: Optional[str] = None,
+    pais: Optional[str] = None,
+    nombre_cientifico: Optional[str] = None,
+    bbox: Optional[str] = None,
+):
+    ''' Dependencia con el vocabulario común de filtros; devuelve la consulta de MongoDB '''
+    try:
+        return construir_filtro(
+            desde=desde, hasta=hasta,
+            reino=reino, filo=filo, clase=clase, orden=orden,
+            familia=familia, genero=genero, especie=especie,
+            pais=pais, nombre_cientifico=nombre_cientifico, bbox=bbox,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/avistamientos/buscar")
+async def buscar_avistamientos(response: Response, query: dict = Depends(filtro_busqueda), limit: int = 1000,
+                               cursor: Optional[str] = None, ordenar_por: str = "_id", total: bool = False,
+                               stream: Optional[int] = Depends(limite_stream),
+                               salida: dict = Depends(opciones_salida)):
+    """
+    Búsqueda compuesta de avistamientos en una sola consulta.
+    - Combina cualquier subconjunto de: rango de fechas (desde/hasta), los siete niveles
+      taxonómicos, país, nombre científico y caja geográfica (bbox=minLng,minLat,maxLng,maxLat).
+    - Todos los filtros se resuelven en MongoDB con índices compuestos; no hay filtrado en cliente.
+    - Paginación por cursor (cabecera X-Next-Cursor); ordenar_por admite _id o FechaEvento.
+    - total=true añade el conteo completo en X-Total-Count (consultado en paralelo con la página).
+    - fields= limita los campos devueltos; format=columns devuelve arreglos paralelos con las
+      cadenas taxonómicas codificadas por diccionario (válido en todos los listados).
+    """
+    return await listar_pagina(response, query, limit, cursor, ordenar_por, error="Error en búsqueda compuesta",
+                               stream=stream, total=total, salida=salida)
+
+@app.get("/api/avistamientos/clusters")
+async def get_clusters(query: dict = Depends(filtro_busqueda), zoom: int = 2, top: int = 3):
+    """
+    Agrupar avistamientos en celdas según el nivel de zoom del mapa.
+    - Acepta los mismos filtros que /api/avistamientos/buscar (normalmente con bbox del viewport).
+    - Cada celda incluye su geohash, el total, el centroide y las especies más frecuentes.
+    - El tamaño de la respuesta depende del número de celdas visibles, no del tamaño de la colección.
+    """
+    try:
+        precision = precision_para_zoom(zoom)
+        instantanea, mascara = await en_memoria(query)
+        if instantanea is not None:
+            return {"zoom": zoom, "precision": precision, "celdas": instantanea.clusters(mascara, precision, top_especies=top)}
+        celdas = await agregar(db.avistamientos, pipeline_clusters(query, precision, top_especies=top))
+        return {"zoom": zoom, "precision": precision, "celdas": celdas}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error agrupando clusters: {e}")
+
+@app.get("/api/avistamientos/histograma")
+async def get_histograma(response: Response, query: dict = Depends(filtro_busqueda), unidad: str = "month"):
+    """
+    Histograma temporal de avistamientos con cubetas de day, week, month o year.
+    - Acepta los mismos filtros que /api/avistamientos/buscar.
+    - month/year filtrados solo por taxonomía y país se leen del cubo mensual de rollups
+      (cabecera X-Rollup-Actualizado); el resto se agrupa con $dateTrunc sobre los índices de fecha.
+    - Con la instantánea en memoria activa (MOTOR_MEMORIA=1) se cuenta sobre sus columnas (origen "memoria").
+    """
+    if unidad not in UNIDADES:
+        raise HTTPException(status_code=400, detail=f"unidad debe ser una de: {', '.join(UNIDADES)}")
+    try:
+        instantanea, mascara = await en_memoria(query)
+        if instantanea is not None:
+            return {"unidad": unidad, "origen": "memoria", "buckets": buckets(instantanea.histograma(mascara, unidad))}
+        match = filtro_cubo(query) if unidad in UNIDADES_CUBO else None
+        meta = await db[COLECCION_META].find_one(FILTRO_META_CUBO) if match is not None else None
+        if meta is not None:
+            filas = await agregar(db[COLECCION_CUBO], pipeline_histograma_cubo(match))
+            if unidad == "year":
+                filas = acumular_por_anio(filas)
+            response.headers[CABECERA_ROLLUP] = meta["actualizado"].isoformat()
+            origen = "rollup"
+        else:
+            filas = await agregar(db.avistamientos, pipeline_histograma(query, unidad))
+            origen = "avistamientos"
+        return {"unidad": unidad, "origen": origen, "buckets": buckets(filas)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error calculando el histograma: {e}")
+
+@app.get("/api/avistamientos/facetas")
+async def get_facetas(response: Response, query: dict = Depends(filtro_busqueda), top: int = 10):
+    """
+    Conteos de cada nivel taxonómico, país y año bajo los filtros actuales, con el total.
+    - Acepta los mismos filtros que /api/avistamientos/buscar; una sola agregación $facet.
+    - Filtrado solo por taxonomía y país se lee del cubo de rollups (cabecera X-Rollup-Actualizado).
+    - top: valores por faceta, ordenados por conteo (los años se devuelven todos, en orden).
+    - Con la instantánea en memoria activa (MOTOR_MEMORIA=1) se cuenta sobre sus columnas (origen "memoria").
+    """
+    if not 1 <= top <= TOP_MAXIMO:
+        raise HTTPException(status_code=400, detail=f"top debe estar entre 1 y {TOP_MAXIMO}")
+    try:
+        instantanea, mascara = await en_memoria(query)
+        if instantanea is not None:
+            return {"origen": "memoria", **instantanea.facetas(mascara, top)}
+        match = filtro_cubo(query)
+        meta = await db[COLECCION_META].find_one(FILTRO_META_CUBO) if match is not None else None
+        if meta is not None:
+            resultado = await agregar(db[COLECCION_CUBO], pipeline_facetas_cubo(match, top))
+            response.headers[CABECERA_ROLLUP] = meta["actualizado"].isoformat()
+            origen = "rollup"
+        else:
+            resultado = await agregar(db.avistamientos, pipeline_facetas(query, top))
+            origen = "avistamientos"
+        return {"origen": origen, **formatear_facetas(resultado)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error calculando las facetas: {e}")
+
+# Rejillas de densidad descomprimidas (se renuevan cuando load_data.py regenera los mapas)
+mapas_densidad = MapasEnMemoria()
+
+@app.get("/api/avistamientos/densidad")
+async def get_densidad(reino: Optional[str] = None, filo: Optional[str] = None, clase: Optional[str] = None,
+                       orden: Optional[str] = None, familia: Optional[str] = None, pais: Optional[str] = None,
+                       bbox: Optional[str] = None, zoom: int = 2, format: str = "u32"):
+    """
+    Mapa de densidad precalculado (app/densidad.py) para todos los avistamientos o para un solo
+    reino, filo, clase, orden, familia o país, recortado a bbox y agregado según el zoom.
+    - format=u32: buffer "BGD1" con los conteos uint32 (comprimido por GZip en el transporte).
+    - format=png: imagen RGBA en escala logarítmica, equirectangular.
+    - La caja efectiva (alineada a la rejilla) va en la cabecera X-Densidad-Bbox; una bbox que cruza
+      el antimeridiano (minLng > maxLng) se une por los bordes y su caja efectiva también cruza.
+    """
+    if format not in FORMATOS_DENSIDAD:
+        raise HTTPException(status_code=400, detail=f"format debe ser uno de: {', '.join(FORMATOS_DENSIDAD)}")
+    try:
+        dim, valor = dimension_mapa(reino, filo, clase, orden, familia, pais)
+        caja = parse_bbox(bbox) if bbox else (-180.0, -90.0, 180.0, 90.0)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        rejilla, meta = await mapas_densidad.obtener(db, dim, valor)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error leyendo el mapa de densidad: {e}")
+    if rejilla is None:
+        raise HTTPException(status_code=404, detail="Los mapas de densidad no se han generado; ejecute python app/densidad.py")
+    conteos, efectivo = recortar(rejilla, caja, zoom, meta["resolucion"])
+    cabeceras = {CABECERA_BBOX_DENSIDAD: ",".join(f"{v:g}" for v in efectivo)}
+    if format == "png":
+        return Response(content=codificar_png(conteos), media_type=MEDIA_PNG, headers=cabeceras)
+    return Response(content=codificar_u32(conteos, efectivo), media_type=MEDIA_F32, headers=cabeceras)
+
+@app.get("/api/avistamientos/coordenadas")
+async def exportar_coordenadas(query: dict = Depends(filtro_busqueda), format: str = "f32", limit: int = 0):
+    """
+    Exportar las coordenadas del conjunto filtrado en binario, para capas de mapa de 100k+ puntos.
+    - Acepta los mismos filtros que /api/avistamientos/buscar.
+    - format=f32: lat/lng float32 little-endian, índice de especie uint32 y diccionario de nombres
+      (formato "BGV1", ver app/binario.py). format=arrow: stream IPC de Apache Arrow (requiere pyarrow).
+    - limit=0 (por defecto) devuelve todo el conjunto; no se aplican los topes de 1000/2000.
+    """
+    if format not in FORMATOS_BINARIOS:
+        raise HTTPException(status_code=400, detail=f"format debe ser uno de: {', '.join(FORMATOS_BINARIOS)}")
+    if format == "arrow" and pa is None:
+        raise HTTPException(status_code=501, detail="format=arrow no disponible: pyarrow no está instalado")
+    try:
+        instantanea, mascara = await en_memoria(query)
+        if instantanea is not None:
+            columnas = instantanea.coordenadas(mascara, max(0, limit))
+        else:
+            cursor = consultar(db.avistamientos, query, PROYECCION_COORDENADAS).limit(max(0, limit))
+            columnas = await leer_coordenadas(cursor)
+        if format == "arrow":
+            return Response(content=codificar_arrow(columnas), media_type=MEDIA_ARROW)
+        return Response(content=codificar_f32(columnas), media_type=MEDIA_F32)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error exportando coordenadas: {e}")
 ###############################Filtro especificos#####################################
 @app.get("/api/avistamientos/nombre_cientifico/{nombre_cientifico}")
-def get_avistamientos_by_nombre_cientifico(nombre_cientifico: str):
+async def get_avistamientos_by_nombre_cientifico(nombre_cientifico: str, response: Response, limit: int = 1000, cursor: Optional[str] = None,
+                                                 stream: Optional[int] = Depends(limite_stream),
+                                                 salida: dict = Depends(opciones_salida)):
     ''' Obtener avistamientos por nombre científico '''
-    avistamientos = list(db.avistamientos.find({"NombreCientifico": nombre_cientifico}))
-    for avistamiento in avistamientos:
-        avistamiento["_id"] = str(avistamiento["_id"])
-    return avistamientos
+    return await listar_pagina(response, {"NombreCientifico": nombre_cientifico}, limit, cursor, "FechaEvento", stream=stream, salida=salida)
 
 @app.get("/api/avistamientos/fecha/{desde}/{hasta}")
-def get_avistamientos_by_fecha(desde: str, hasta: str, limit: int = 1000):
+async def get_avistamientos_by_fecha(desde: str, hasta: str, response: Response, limit: int = 1000,
+                                     cursor: Optional[str] = None, ordenar_por: str = "FechaEvento",
+                                     stream: Optional[int] = Depends(limite_stream),
+                                     salida: dict = Depends(opciones_salida)):
     """
     Obtener avistamientos por rango de fecha [desde, hasta].
     - Acepta fechas en formatos comunes (p.ej. YYYY-MM-DD, DD/MM/YYYY e ISO-8601).
-    - Si FechaEvento está guardado como Date en MongoDB, filtra directamente.
-    - Si está como string, convierte de forma segura en el pipeline y filtra.
+    - FechaEvento se guarda siempre como Date (ver app/fechas.py), así que el filtro es
+      un rango sobre el índice de FechaEvento; un rango vacío responde sin recorrer la colección.
+    - Paginación por cursor (cabecera X-Next-Cursor), ordenado por FechaEvento por defecto.
     """
-    try:
-        def parse_dt(s: str):
-            s = (s or "").strip()
-            formatos = [
-                "%Y-%m-%d",
-                "%d/%m/%Y",
-                "%Y/%m/%d",
-                "%Y-%m-%dT%H:%M:%S",
-                "%Y-%m-%dT%H:%M:%S.%f",
-            ]
-            for fmt in formatos:
-                try:
-                    return datetime.strptime(s, fmt)
-                except ValueError:
-                    pass
-            try:
-                iso = s.replace("Z", "+00:00")
-                return datetime.fromisoformat(iso).replace(tzinfo=None)
-            except Exception:
-                return None
-
-        d1, d2 = parse_dt(desde), parse_dt(hasta)
-        if not d1 or not d2:
-            raise HTTPException(status_code=400, detail="Formato de fecha no válido. Use YYYY-MM-DD o DD/MM/YYYY.")
-        if d1 > d2:
-            d1, d2 = d2, d1
-
-        try:
-            db.avistamientos.create_index("FechaEvento")
-        except Exception:
-            pass
-
-        # 1) Intento directo 
-        resultados = list(
-            db.avistamientos.find(
-                {"FechaEvento": {"$gte": d1, "$lte": d2}}
-            ).limit(limit)
-        )
-
-        if not resultados:
-            pipeline = [
-                {"$match": {"FechaEvento": {"$exists": True, "$nin": [None, ""]}}},
-
-                # Normalizar a fecha:
-                {"$addFields": {
-                    "_fecha": {
-                        "$ifNull": [
-                            {"$dateFromString": {
-                                "dateString": "$FechaEvento",
-                                "onError": None,
-                                "onNull": None
-                            }},
-                            {"$dateFromString": {
-                                "dateString": "$FechaEvento",
-                                "format": "%d/%m/%Y",
-                                "onError": None,
-                                "onNull": None
-                            }}
-                        ]
-                    }
-                }},
-                {"$match": {"_fecha": {"$gte": d1, "$lte": d2}}},
-                {"$project": {"_fecha": 0}},
-                {"$limit": limit}
-            ]
-            resultados = list(db.avistamientos.aggregate(pipeline))
-
-        for a in resultados:
-            a["_id"] = str(a["_id"])
-        return resultados
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error filtrando por fecha: {e}")
+    d1, d2 = parse_fecha(desde), parse_fecha(hasta)
+    if not d1 or not d2:
+        raise HTTPException(status_code=400, detail="Formato de fecha no válido. Use YYYY-MM-DD o DD/MM/YYYY.")
+    if d1 > d2:
+        d1, d2 = d2, d1
+    return await listar_pagina(
+        response, {"FechaEvento": {"$gte": d1, "$lte": d2}}, limit, cursor, ordenar_por,
+        error="Error filtrando por fecha", stream=stream, salida=salida,
+    )
 
 @app.get("/api/avistamientos/pais/{nombre_pais}")
-def get_avistamientos_by_pais(nombre_pais: str):
+async def get_avistamientos_by_pais(nombre_pais: str, response: Response, limit: int = 1000, cursor: Optional[str] = None,
+                                    stream: Optional[int] = Depends(limite_stream),
+                                    salida: dict = Depends(opciones_salida)):
     ''' Obtener avistamientos por país '''
-    avistamientos = list(db.avistamientos.find({"Ubicacion.Pais": nombre_pais}).limit(1000))
-    for avistamiento in avistamientos:
-        avistamiento["_id"] = str(avistamiento["_id"])
-    return avistamientos
+    return await listar_pagina(response, {"Ubicacion.Pais": nombre_pais}, limit, cursor, "FechaEvento", stream=stream, salida=salida)
     
 
 @app.get("/api/avistamientos/taxonomia/{reino}/{filo}/{clase}/{orden}/{familia}/{genero}/{especie}")
-def get_avistamientos_by_taxonomia(reino: str, filo: str, clase: str, orden: str, familia: str, genero: str, especie: str):
+async def get_avistamientos_by_taxonomia(reino: str, filo: str, clase: str, orden: str, familia: str, genero: str, especie: str,
+                                         response: Response, limit: int = 1000, cursor: Optional[str] = None,
+                                         stream: Optional[int] = Depends(limite_stream),
+                                         salida: dict = Depends(opciones_salida)):
     """
     Obtener avistamientos por taxonomía: Reino, Filo, Clase, Orden, Familia, Género, Especie.
-    Usa '-' o '*' para ignorar un nivel (comodín); comparación case-insensitive exacta.
+    Usa '-' o '*' para ignorar un nivel (comodín); comparación exacta sin distinguir mayúsculas
+    ni espacios en los extremos, resuelta por igualdad sobre los índices de TaxonomiaNorm.
+    Paginación por cursor (cabecera X-Next-Cursor), ordenada por FechaEvento para usar los
+    índices compuestos (nivel, FechaEvento, _id).
     """
-    try:
-        raw_params = {
-            "Taxonomia.Reino": reino,
-            "Taxonomia.Filo": filo,
-            "Taxonomia.Clase": clase,
-            "Taxonomia.Orden": orden,
-            "Taxonomia.Familia": familia,
-            "Taxonomia.Genero": genero,
-            "Taxonomia.Especie": especie
-        }
-        query = {}
-        used_fields = []
-        for field, value in raw_params.items():
-            if value not in ("-", "*") and value.strip():
-                used_fields.append((field, value.strip()))
-                query[field] = {"$regex": f"^{value.strip()}$", "$options": "i"}
-
-        resultados = list(db.avistamientos.find(query).limit(1000))
-
-        # Fallback: si no hubo resultados y se usaron campos, probar pipeline con trim+lower
-        if not resultados and used_fields:
-            and_expr = []
-            for field, value in used_fields:
-                and_expr.append({
-                    "$eq": [
-                        {"$toLower": {"$trim": {"input": f"${field}"}}},
-                        value.lower()
-                    ]
-                })
-            pipeline = [
-                {"$match": {"$expr": {"$and": and_expr}}},
-                {"$limit": 1000}
-            ]
-            resultados = list(db.avistamientos.aggregate(pipeline))
-
-        for r in resultados:
-            r["_id"] = str(r["_id"])
-        return resultados
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error filtrando por taxonomía: {e}")
+    query = construir_filtro(reino=reino, filo=filo, clase=clase, orden=orden, familia=familia, genero=genero, especie=especie)
+    return await listar_pagina(response, query, limit, cursor, "FechaEvento", error="Error filtrando por taxonomía", stream=stream, salida=salida)
 
 @app.get("/api/avistamientos/ubicacion/{lat}/{lng}")
-def get_avistamientos_by_ubicacion(lat: float, lng: float, tolerancia: float = 0.0001, limit: int = 1000):
+async def get_avistamientos_by_ubicacion(lat: float, lng: float, response: Response, tolerancia: float = 0.0001,
+                                         limit: int = 1000, cursor: Optional[str] = None,
+                                         stream: Optional[int] = Depends(limite_stream),
+                                         salida: dict = Depends(opciones_salida)):
     """
-    Obtener avistamientos por ubicación (latitud y longitud) usando una tolerancia.
-    Si los valores en la base están como string se intenta también con ese formato.
+    Obtener avistamientos por ubicación (latitud y longitud) usando una tolerancia en grados.
+    La caja lat±tolerancia, lng±tolerancia se resuelve con $geoWithin sobre el índice 2dsphere.
     """
+    geometria = geometria_bbox(lng - tolerancia, max(lat - tolerancia, -90), lng + tolerancia, min(lat + tolerancia, 90))
+    query = {CAMPO_PUNTO: {"$geoWithin": {"$geometry": geometria}}} if geometria else {}
+    return await listar_pagina(response, query, limit, cursor, error="Error obteniendo avistamientos por ubicación", stream=stream, salida=salida)
+
+@app.get("/api/avistamientos/geo/radio")
+async def get_avistamientos_en_radio(lat: float, lng: float, radio_km: float, response: Response,
+                                     query: dict = Depends(filtro_busqueda), limit: int = 1000, cursor: Optional[str] = None,
+                                     stream: Optional[int] = Depends(limite_stream),
+                                     salida: dict = Depends(opciones_salida)):
+    ''' Obtener avistamientos dentro de un círculo de radio_km alrededor de (lat, lng) '''
+    if radio_km <= 0:
+        raise HTTPException(status_code=400, detail="radio_km debe ser mayor que 0")
+    query = {**query, **filtro_radio(lat, lng, radio_km)}
+    return await listar_pagina(response, query, limit, cursor, error="Error obteniendo avistamientos por radio", stream=stream, salida=salida)
+
+@app.post("/api/avistamientos/geo/poligono")
+async def get_avistamientos_en_poligono(response: Response, geometria: dict = Body(...), query: dict = Depends(filtro_busqueda),
+                                        limit: int = 1000, cursor: Optional[str] = None,
+                                        stream: Optional[int] = Depends(limite_stream),
+                                        salida: dict = Depends(opciones_salida)):
+    ''' Obtener avistamientos dentro de un Polygon/MultiPolygon GeoJSON enviado en el cuerpo '''
+    if geometria.get("type") not in ("Polygon", "MultiPolygon"):
+        raise HTTPException(status_code=400, detail="La geometría debe ser un Polygon o MultiPolygon GeoJSON")
+    query = {**query, CAMPO_PUNTO: {"$geoWithin": {"$geometry": geometria}}}
+    return await listar_pagina(response, query, limit, cursor, error="Error obteniendo avistamientos por polígono", stream=stream, salida=salida)
+
+@app.get("/api/avistamientos/geo/cercanos")
+async def get_avistamientos_cercanos(lat: float, lng: float, k: int = 10, max_km: Optional[float] = None, query: dict = Depends(filtro_busqueda)):
+    ''' Obtener los k avistamientos más cercanos a (lat, lng), con la distancia en metros (distancia_m) '''
     try:
-        # Búsqueda primaria asumiendo que los campos son numéricos
-        # Según models.py, la estructura es Ubicacion.Geolocalizacion.Latitud/Longitud
-        query_num = {
-            "Ubicacion.Geolocalizacion.Latitud": {"$gte": lat - tolerancia, "$lte": lat + tolerancia},
-            "Ubicacion.Geolocalizacion.Longitud": {"$gte": lng - tolerancia, "$lte": lng + tolerancia}
-        }
-        resultados = list(db.avistamientos.find(query_num).limit(limit))
-
-        # Si no hubo resultados, intentar con valores como string (por si están guardados así)
-        if not resultados:
-            query_str = {
-                "Ubicacion.Geolocalizacion.Latitud": {"$in": [str(lat), f"{lat}"]},
-                "Ubicacion.Geolocalizacion.Longitud": {"$in": [str(lng), f"{lng}"]}
-            }
-            resultados = list(db.avistamientos.find(query_str).limit(limit))
-
-        for avistamiento in resultados:
-            avistamiento["_id"] = str(avistamiento["_id"])
-        return resultados
+        resultados = await agregar(
+            db.avistamientos,
+            pipeline_cercanos(lat, lng, query, k=k, max_km=max_km) + [{"$project": PROYECCION_SIN_INTERNOS}],
+        )
+        return respuesta_json(resultados)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo avistamientos por ubicación: {e}")
+        raise HTTPException(status_code=500, detail=f"Error obteniendo avistamientos cercanos: {e}")
 #########################Faltantes###############################
 @app.get("/api/avistamientos/reino/{reino}")
-def get_avistamientos_por_reino(reino: str):
+async def get_avistamientos_por_reino(reino: str, response: Response, limit: int = 2000, cursor: Optional[str] = None,
+                                      stream: Optional[int] = Depends(limite_stream),
+                                      salida: dict = Depends(opciones_salida)):
     ''' Obtener avistamientos por reino '''
-    try:
-        avistamientos = list(db.avistamientos.find({"Taxonomia.Reino": reino}).limit(2000))
-        for avistamiento in avistamientos:
-            avistamiento["_id"] = str(avistamiento["_id"])
-        return avistamientos
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo avistamientos por reino: {e}")
+    return await listar_pagina(response, filtro_taxonomia("Reino", reino), limit, cursor, "FechaEvento", error="Error obteniendo avistamientos por reino", stream=stream, salida=salida)
 
 @app.get("/api/avistamientos/filo/{filo}")
-def get_avistamientos_agrupados_por_filo(filo: str):
+async def get_avistamientos_agrupados_por_filo(filo: str, response: Response, limit: int = 2000, cursor: Optional[str] = None,
+                                               stream: Optional[int] = Depends(limite_stream),
+                                               salida: dict = Depends(opciones_salida)):
     ''' Obtener avistamientos por filo '''
-    try:
-        avistamientos = list(db.avistamientos.find({"Taxonomia.Filo": filo}).limit(2000))
-        for avistamiento in avistamientos:
-            avistamiento["_id"] = str(avistamiento["_id"])
-        return avistamientos
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo avistamientos por filo: {e}")
+    return await listar_pagina(response, filtro_taxonomia("Filo", filo), limit, cursor, "FechaEvento", error="Error obteniendo avistamientos por filo", stream=stream, salida=salida)
 
 @app.get("/api/avistamientos/clase/{clase}")
-def get_avistamientos_agrupados_por_clase(clase: str):
+async def get_avistamientos_agrupados_por_clase(clase: str, response: Response, limit: int = 2000, cursor: Optional[str] = None,
+                                                stream: Optional[int] = Depends(limite_stream),
+                                                salida: dict = Depends(opciones_salida)):
     ''' Obtener avistamientos por clase '''
-    try:
-        avistamientos = list(db.avistamientos.find({"Taxonomia.Clase": clase}).limit(2000))
-        for avistamiento in avistamientos:
-            avistamiento["_id"] = str(avistamiento["_id"])
-        return avistamientos
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo avistamientos por clase: {e}")
+    return await listar_pagina(response, filtro_taxonomia("Clase", clase), limit, cursor, "FechaEvento", error="Error obteniendo avistamientos por clase", stream=stream, salida=salida)
 
 @app.get("/api/avistamientos/orden/{orden}")
-def get_avistamientos_agrupados_por_orden(orden: str):
+async def get_avistamientos_agrupados_por_orden(orden: str, response: Response, limit: int = 2000, cursor: Optional[str] = None,
+                                                stream: Optional[int] = Depends(limite_stream),
+                                                salida: dict = Depends(opciones_salida)):
     ''' Obtener avistamientos por orden '''
-    try:
-        avistamientos = list(db.avistamientos.find({"Taxonomia.Orden": orden}).limit(2000))
-        for avistamiento in avistamientos:
-            avistamiento["_id"] = str(avistamiento["_id"])
-        return avistamientos
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo avistamientos por orden: {e}")
+    return await listar_pagina(response, filtro_taxonomia("Orden", orden), limit, cursor, "FechaEvento", error="Error obteniendo avistamientos por orden", stream=stream, salida=salida)
 
 @app.get("/api/avistamientos/familia/{familia}")
-def get_avistamientos_agrupados_por_familia(familia: str):
+async def get_avistamientos_agrupados_por_familia(familia: str, response: Response, limit: int = 2000, cursor: Optional[str] = None,
+                                                  stream: Optional[int] = Depends(limite_stream),
+                                                  salida: dict = Depends(opciones_salida)):
     ''' Obtener avistamientos por familia '''
-    try:
-        avistamientos = list(db.avistamientos.find({"Taxonomia.Familia": familia}).limit(2000))
-        for avistamiento in avistamientos:
-            avistamiento["_id"] = str(avistamiento["_id"])
-        return avistamientos
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo avistamientos por familia: {e}")
+    return await listar_pagina(response, filtro_taxonomia("Familia", familia), limit, cursor, "FechaEvento", error="Error obteniendo avistamientos por familia", stream=stream, salida=salida)
 
 @app.get("/api/avistamientos/genero/{genero}")
-def get_avistamientos_agrupados_por_genero(genero: str):
+async def get_avistamientos_agrupados_por_genero(genero: str, response: Response, limit: int = 1000, cursor: Optional[str] = None,
+                                                 stream: Optional[int] = Depends(limite_stream),
+                                                 salida: dict = Depends(opciones_salida)):
     ''' Obtener avistamientos por género '''
-    try:
-        avistamientos = list(db.avistamientos.find({"Taxonomia.Genero": genero}).limit(1000))
-        for avistamiento in avistamientos:
-            avistamiento["_id"] = str(avistamiento["_id"])
-        return avistamientos
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo avistamientos por género: {e}")
+    return await listar_pagina(response, filtro_taxonomia("Genero", genero), limit, cursor, "FechaEvento", error="Error obteniendo avistamientos por género", stream=stream, salida=salida)
 
 @app.get("/api/avistamientos/especie/{especie}")
-def get_avistamientos_agrupados_por_especie(especie: str):
+async def get_avistamientos_agrupados_por_especie(especie: str, response: Response, limit: int = 1000, cursor: Optional[str] = None,
+                                                  stream: Optional[int] = Depends(limite_stream),
+                                                  salida: dict = Depends(opciones_salida)):
     ''' Obtener avistamientos por especie '''
+    return await listar_pagina(response, filtro_taxonomia("Especie", especie), limit, cursor, "FechaEvento", error="Error obteniendo avistamientos por especie", stream=stream, salida=salida)
+
+##########################Agrupamientos###############################
+async def leer_agrupado(response: Response, dim: str, por_valor: bool = False, limit: int = 1000,
+                        error: str = "Error agrupando"):
+    """
+    Conteos por valor de una dimensión leídos de los rollups precalculados (rollup_niveles).
+    - La fecha de la última actualización de los rollups va en la cabecera X-Rollup-Actualizado.
+    - Si los rollups todavía no se han construido, agrupa en vivo sobre la colección.
+    - Con la instantánea en memoria activa (MOTOR_MEMORIA=1) se cuenta sobre sus columnas.
+    """
     try:
-        avistamientos = list(db.avistamientos.find({"Taxonomia.Especie": especie}).limit(1000))
-        for avistamiento in avistamientos:
-            avistamiento["_id"] = str(avistamiento["_id"])
-        return avistamientos
+        instantanea, _ = await en_memoria({})
+        resultados = instantanea.agrupado(dim, por_valor, limit) if instantanea is not None else None
+        if resultados is None:
+            resultados = await leer_agrupado_mongo(response, dim, por_valor, limit)
+        for r in resultados:
+            r["_id"] = str(r["_id"]) if r["_id"] is not None else None
+        return resultados
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error obteniendo avistamientos por especie: {e}")
+        raise HTTPException(status_code=500, detail=f"{error}: {e}")
+
+async def leer_agrupado_mongo(response: Response, dim: str, por_valor: bool, limit: int):
+    ''' Conteos desde rollup_niveles o, si todavía no existen, agrupando en vivo '''
+    meta = await db[COLECCION_META].find_one({"_id": ID_META})
+    if meta is None:
+        return await agregar(db.avistamientos, pipeline_agrupado(dim, por_valor, limit))
+    consulta = consultar(db[COLECCION_NIVELES], consulta_nivel(dim)).sort(orden_nivel(por_valor))
+    if limit:
+        consulta = consulta.limit(limit)
+    response.headers[CABECERA_ROLLUP] = meta["actualizado"].isoformat()
+    return [{"_id": d["_id"]["valor"], "count": d["count"]} for d in await consulta.to_list(None)]
 
-##########################Agrupamientos###############################
 @app.get("/api/avistamientos/agrupados/pais")
-def get_avistamientos_agrupados_por_pais():
+async def get_avistamientos_agrupados_por_pais(response: Response):
     ''' Agrupar avistamientos por país '''
-    try:          
-        Avistamientos = list(db.avistamientos.aggregate([
-            {
-                "$group": {
-                    "_id": "$Ubicacion.Pais",
-                    "count": {"$sum": 1}
-                }
-            }
-        ]))
-        for avistamiento in Avistamientos:
-            avistamiento["_id"] = str(avistamiento["_id"])
-        return Avistamientos
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error agrupando por país: {e}")
+    return await leer_agrupado(response, "Pais", limit=0, error="Error agrupando por país")
 
 @app.get("/api/avistamientos/agrupados/fecha")
-def get_avistamientos_agrupados_por_fecha():
+async def get_avistamientos_agrupados_por_fecha(response: Response):
     ''' Agrupar avistamientos por fecha '''
-    try:
-        pipeline = [
-            {"$match": {"FechaEvento": {"$exists": True, "$nin": [None, ""]}}},
-            {"$group": {"_id": "$FechaEvento", "count": {"$sum": 1}}},
-            {"$sort": {"_id": 1}},
-            {"$limit": 1000}
-        ]
-        resultados = list(db.avistamientos.aggregate(pipeline))
-        for r in resultados:
-            r["_id"] = str(r["_id"])
-        return resultados
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error agrupando por fecha: {e}")
+    return await leer_agrupado(response, "FechaEvento", por_valor=True, error="Error agrupando por fecha")
 
 @app.get("/api/avistamientos/agrupados/especie")
-def get_avistamientos_agrupados_por_especie():
+async def get_avistamientos_agrupados_por_especie(response: Response):
     ''' Agrupar avistamientos por especie '''
-    try:
-        pipeline = [
-            {"$match": {"Taxonomia.Especie": {"$exists": True, "$nin": [None, ""]}}},
-            {"$group": {"_id": "$Taxonomia.Especie", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 1000}
-        ]
-        resultados = list(db.avistamientos.aggregate(pipeline))
-        for r in resultados:
-            r["_id"] = str(r["_id"]) if r["_id"] is not None else None
-        return resultados
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error agrupando por especie: {e}")
-    
+    return await leer_agrupado(response, "Especie", error="Error agrupando por especie")
+
 @app.get("/api/avistamientos/agrupados/genero")
-def get_avistamientos_agrupados_por_genero():
+async def get_avistamientos_agrupados_por_genero(response: Response):
     ''' Agrupar avistamientos por genero '''
-    try:
-        pipeline = [
-            {"$match": {"Taxonomia.Genero": {"$exists": True, "$nin": [None, ""]}}},
-            {"$group": {"_id": "$Taxonomia.Genero", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 1000}
-        ]
-        resultados = list(db.avistamientos.aggregate(pipeline))
-        for r in resultados:
-            r["_id"] = str(r["_id"]) if r["_id"] is not None else None
-        return resultados
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error agrupando por genero: {e}")
-    
+    return await leer_agrupado(response, "Genero", error="Error agrupando por genero")
+
 @app.get("/api/avistamientos/agrupados/clase")
-def get_avistamientos_agrupados_por_clase():
+async def get_avistamientos_agrupados_por_clase(response: Response):
     ''' Agrupar avistamientos por clase '''
-    try:
-        pipeline = [
-            {"$match": {"Taxonomia.Clase": {"$exists": True, "$nin": [None, ""]}}},
-            {"$group": {"_id": "$Taxonomia.Clase", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 1000}
-        ]
-        resultados = list(db.avistamientos.aggregate(pipeline))
-        for r in resultados:
-            r["_id"] = str(r["_id"]) if r["_id"] is not None else None
-        return resultados
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error agrupando por clase: {e}")
+    return await leer_agrupado(response, "Clase", error="Error agrupando por clase")
 
 @app.get("/api/avistamientos/agrupados/reino")
-def get_avistamientos_agrupados_por_reino():
+async def get_avistamientos_agrupados_por_reino(response: Response):
     ''' Agrupar avistamientos por reino '''
-    try:
-        pipeline = [
-            {"$match": {"Taxonomia.Reino": {"$exists": True, "$nin": [None, ""]}}},
-            {"$group": {"_id": "$Taxonomia.Reino", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 1000}
-        ]
-        resultados = list(db.avistamientos.aggregate(pipeline))
-        for r in resultados:
-            r["_id"] = str(r["_id"]) if r["_id"] is not None else None
-        return resultados
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error agrupando por reino: {e}")  
-    
+    return await leer_agrupado(response, "Reino", error="Error agrupando por reino")
+
 @app.get("/api/avistamientos/agrupados/orden")
-def get_avistamientos_agrupados_por_orden():
+async def get_avistamientos_agrupados_por_orden(response: Response):
     ''' Agrupar avistamientos por orden '''
-    try:
-        pipeline = [
-            {"$match": {"Taxonomia.Orden": {"$exists": True, "$nin": [None, ""]}}},
-            {"$group": {"_id": "$Taxonomia.Orden", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 1000}
-        ]
-        resultados = list(db.avistamientos.aggregate(pipeline))
-        for r in resultados:
-            r["_id"] = str(r["_id"]) if r["_id"] is not None else None
-        return resultados
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error agrupando por orden: {e}")  
-    
+    return await leer_agrupado(response, "Orden", error="Error agrupando por orden")
+
 @app.get("/api/avistamientos/agrupados/familia")
-def get_avistamientos_agrupados_por_familia():
+async def get_avistamientos_agrupados_por_familia(response: Response):
     ''' Agrupar avistamientos por familia '''
-    try:
-        pipeline = [
-            {"$match": {"Taxonomia.Familia": {"$exists": True, "$nin": [None, ""]}}},
-            {"$group": {"_id": "$Taxonomia.Familia", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 1000}
-        ]
-        resultados = list(db.avistamientos.aggregate(pipeline))
-        for r in resultados:
-            r["_id"] = str(r["_id"]) if r["_id"] is not None else None
-        return resultados
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error agrupando por familia: {e}")
+    return await leer_agrupado(response, "Familia", error="Error agrupando por familia")
 
 @app.get("/api/avistamientos/agrupados/filo")
-def get_avistamientos_agrupados_por_filo():
+async def get_avistamientos_agrupados_por_filo(response: Response):
     ''' Agrupar avistamientos por filo '''
+    return await leer_agrupado(response, "Filo", error="Error agrupando por filo")
+
+##########################Taxonomía (autocompletado)###############################
+servicio_taxonomia = ServicioTaxonomia()
+
+# Construir el árbol al arrancar para que la primera sugerencia no espere a MongoDB
+@app.on_event("startup")
+async def _precargar_taxonomia():
     try:
-        pipeline = [
-            {"$match": {"Taxonomia.Filo": {"$exists": True, "$nin": [None, ""]}}},
-            {"$group": {"_id": "$Taxonomia.Filo", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 1000}
-        ]
-        resultados = list(db.avistamientos.aggregate(pipeline))
-        for r in resultados:
-            r["_id"] = str(r["_id"]) if r["_id"] is not None else None
-        return resultados
+        await servicio_taxonomia.obtener(db, await version_datos())
+    except Exception:
+        pass
+
+async def arbol_taxonomia(response: Response):
+    try:
+        version = await version_datos()
+        arbol = await servicio_taxonomia.obtener(db, version)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error agrupando por filo: {e}")
+        raise HTTPException(status_code=500, detail=f"Error construyendo el árbol de taxonomía: {e}")
+    if servicio_taxonomia.version != version:
+        # Árbol de la versión anterior mientras se reconstruye: que la caché no lo guarde con la nueva
+        response.headers["Cache-Control"] = "no-store"
+    return arbol
+
+@app.get("/api/taxonomia/sugerir")
+async def sugerir_taxonomia(response: Response, q: str = "", nivel: Optional[str] = None, limite: int = 10):
+    """
+    Autocompletar valores de taxonomía y país por prefijo (sin distinguir mayúsculas).
+    - nivel: Reino, Filo, Clase, Orden, Familia, Genero, Especie o Pais; sin nivel busca en todos.
+    - Cada sugerencia incluye su conteo y la ruta de niveles superiores.
+    - Se responde desde el árbol en memoria (se reconstruye en segundo plano al cambiar la versión
+      de los datos; mientras tanto se sirve el anterior).
+    """
+    if nivel is not None and nivel not in NIVELES_SUGERENCIA:
+        raise HTTPException(status_code=400, detail=f"nivel debe ser uno de: {', '.join(NIVELES_SUGERENCIA)}")
+    if limite < 1:
+        raise HTTPException(status_code=400, detail="limite debe ser mayor que 0")
+    arbol = await arbol_taxonomia(response)
+    return arbol.sugerir(q, nivel=nivel, limite=limite)
+
+@app.get("/api/taxonomia/hijos")
+async def hijos_taxonomia(response: Response, reino: Optional[str] = None, filo: Optional[str] = None,
+                          clase: Optional[str] = None,
+                          orden: Optional[str] = None, familia: Optional[str] = None, genero: Optional[str] = None):
+    """
+    Listar los valores del nivel siguiente a la ruta indicada, con sus conteos.
+    Sin parámetros devuelve los reinos; los niveles deben darse en orden (reino, filo, ...).
+    """
+    valores = [reino, filo, clase, orden, familia, genero]
+    ruta = []
+    for nivel, valor in zip(NIVELES_TAXONOMIA, valores):
+        if valor is None:
+            break
+        ruta.append(valor)
+    if any(v is not None for v in valores[len(ruta):]):
+        raise HTTPException(status_code=400, detail="Los niveles deben indicarse en orden, sin saltos")
+    arbol = await arbol_taxonomia(response)
+    encontrado = arbol.hijos(ruta)
+    if encontrado is None:
+        raise HTTPException(status_code=404, detail="Ruta de taxonomía no encontrada")
+    ruta_mostrada, hijos = encontrado
+    siguiente = NIVELES_TAXONOMIA[len(ruta)] if len(ruta) < len(NIVELES_TAXONOMIA) else None
+    return {"nivel": siguiente, "ruta": ruta_mostrada, "hijos": hijos}
+
+##########################Lotes###############################
+@app.post("/api/lote")
+async def consultas_en_lote(request: Request, cuerpo: dict = Body(...)):
+    """
+    Ejecutar varias consultas GET de la API en una sola petición (p. ej. la carga inicial del dashboard).
+    - Cuerpo: {"consultas": [{"nombre": "paises", "ruta": "avistamientos/agrupados/pais", "params": {...}}, ...]}
+    - Las subconsultas se ejecutan a la vez y las idénticas una sola vez.
+    - Cada resultado trae su código, tiempo, cabeceras (cursor, total, rollup) y datos o error.
+    - Solo rutas JSON: stream y las exportaciones binarias (coordenadas, densidad) responden 400;
+      una subconsulta cuya respuesta supera MAX_BYTES_SUBCONSULTA devuelve 413 en su resultado.
+    """
+    try:
+        consultas = leer_lote(cuerpo)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    contenido = await ejecutar_lote(app, request.scope, consultas, (CABECERA_CURSOR, CABECERA_TOTAL, CABECERA_ROLLUP))
+    return Response(content=contenido, media_type="application/json")
+
+##########################Métricas###############################
+@app.get("/metrics")
+async def metricas():
+    """
+    Métricas en formato de exposición de Prometheus: latencia, códigos y bytes por ruta,
+    duración y documentos devueltos por comando de MongoDB, y contadores de las consultas
+    lentas explicadas (documentos examinados y COLLSCAN por colección).
+    """
+    return Response(content=registro.exponer(), media_type=MEDIA_PROMETHEUS)
+
+@app.get("/metrics/lentas")
+async def consultas_lentas():
+    ''' Últimas consultas lentas muestreadas con el resumen de su explain (más recientes primero) '''
+    return list(reversed(monitor_comandos.recientes))
 
+@app.get("/metrics/instantanea")
+async def memoria_instantanea():
+    ''' Estado de la instantánea en memoria (MOTOR_MEMORIA=1): versión, documentos y bytes por columna y diccionario '''
+    return motor_memoria.memoria()
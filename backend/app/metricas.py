@@ -0,0 +1,383 @@
+"""
+Métricas de la API en formato de exposición de Prometheus y registro de consultas lentas.
+
+- MetricasHTTP: middleware ASGI con latencia, códigos y tamaño de respuesta por
+  ruta (la plantilla declarada, p. ej. /api/avistamientos/pais/{nombre_pais}),
+  incluidas las respuestas servidas por la caché.
+- MonitorComandos: CommandListener de pymongo con la duración de cada comando
+  por colección y los documentos devueltos. Las respuestas de MongoDB no
+  incluyen los documentos examinados ni el plan: para los comandos más lentos
+  que CONSULTA_LENTA_MS se ejecuta, con muestreo, un explain (executionStats)
+  que se escribe en el log "app.metricas.lentas" y alimenta los contadores de
+  documentos examinados y de COLLSCAN por colección.
+
+Configuración (entorno):
+- METRICAS_HABILITADAS: "0" para desactivar middleware y listener.
+- CONSULTA_LENTA_MS: umbral de consulta lenta (por defecto 200 ms).
+- MUESTREO_LENTAS: fracción de consultas lentas a las que se hace explain (0-1).
+- MAX_EXPLAIN_CONCURRENTES: explains en curso como máximo.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+from pymongo import monitoring
+from starlette.routing import Match
+
+METRICAS_HABILITADAS = os.getenv("METRICAS_HABILITADAS", "1") != "0"
+CONSULTA_LENTA_MS = float(os.getenv("CONSULTA_LENTA_MS", "200"))
+MUESTREO_LENTAS = float(os.getenv("MUESTREO_LENTAS", "0.1"))
+MAX_EXPLAIN_CONCURRENTES = int(os.getenv("MAX_EXPLAIN_CONCURRENTES", "2"))
+
+MEDIA_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
+CUBETAS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CUBETAS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+# Comandos de lectura a los que se les puede hacer explain
+COMANDOS_EXPLICABLES = ("find", "aggregate", "count", "distinct")
+# Campos que añade el driver y que explain no acepta
+_CAMPOS_DRIVER = ("$db", "lsid", "$clusterTime", "$readPreference", "txnNumber", "$audit", "apiVersion")
+
+log_lentas = logging.getLogger("app.metricas.lentas")
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas(nombres, valores, extra=None) -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class Contador:
+    ''' Contador con etiquetas (tipo counter de Prometheus) '''
+
+    tipo = "counter"
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def sumar(self, *valores, cantidad=1):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def lineas(self):
+        with self._lock:
+            valores = list(self._valores.items())
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {valor}" for clave, valor in valores]
+
+
+class Histograma:
+    ''' Histograma con cubetas acumulativas, suma y conteo por combinación de etiquetas '''
+
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), cubetas=CUBETAS_SEGUNDOS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.cubetas = tuple(cubetas)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *valores):
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * (len(self.cubetas) + 1), 0.0, 0]
+            serie[0][bisect_left(self.cubetas, valor)] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def lineas(self):
+        with self._lock:
+            series = [(clave, list(cuentas), suma, n) for clave, (cuentas, suma, n) in self._series.items()]
+        lineas = []
+        for clave, cuentas, suma, n in series:
+            acumulado = 0
+            for limite, cuenta in zip(self.cubetas + ("+Inf",), cuentas):
+                acumulado += cuenta
+                le = 'le="%s"' % limite
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, le)} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {suma}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {n}")
+        return lineas
+
+
+class Registro:
+    ''' Conjunto de métricas que se exponen juntas en /metrics '''
+
+    def __init__(self):
+        self.metricas = []
+
+    def agregar(self, metrica):
+        self.metricas.append(metrica)
+        return metrica
+
+    def exponer(self) -> str:
+        lineas = []
+        for metrica in self.metricas:
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            lineas.extend(metrica.lineas())
+        return "\n".join(lineas) + "\n"
+
+
+registro = Registro()
+
+http_solicitudes = registro.agregar(Contador(
+    "biogeovis_http_solicitudes_total", "Solicitudes HTTP por ruta, método, código y resultado de caché",
+    ("ruta", "metodo", "codigo", "cache"),
+))
+http_duracion = registro.agregar(Histograma(
+    "biogeovis_http_duracion_segundos", "Latencia de las solicitudes HTTP", ("ruta", "metodo", "cache"),
+))
+http_bytes = registro.agregar(Histograma(
+    "biogeovis_http_respuesta_bytes", "Tamaño del cuerpo de las respuestas (tal como se envía)",
+    ("ruta", "metodo"), cubetas=CUBETAS_BYTES,
+))
+mongo_duracion = registro.agregar(Histograma(
+    "biogeovis_mongo_comando_duracion_segundos", "Duración de los comandos de MongoDB", ("comando", "coleccion"),
+))
+mongo_comandos = registro.agregar(Contador(
+    "biogeovis_mongo_comandos_total", "Comandos de MongoDB por resultado", ("comando", "coleccion", "resultado"),
+))
+mongo_devueltos = registro.agregar(Contador(
+    "biogeovis_mongo_documentos_devueltos_total", "Documentos devueltos por MongoDB", ("comando", "coleccion"),
+))
+mongo_lentas = registro.agregar(Contador(
+    "biogeovis_mongo_consultas_lentas_total", "Comandos más lentos que CONSULTA_LENTA_MS", ("comando", "coleccion"),
+))
+explain_examinados = registro.agregar(Contador(
+    "biogeovis_mongo_explain_documentos_examinados_total",
+    "Documentos examinados según el explain de las consultas lentas muestreadas", ("comando", "coleccion"),
+))
+explain_devueltos = registro.agregar(Contador(
+    "biogeovis_mongo_explain_documentos_devueltos_total",
+    "Documentos devueltos según el explain de las consultas lentas muestreadas", ("comando", "coleccion"),
+))
+explain_planes = registro.agregar(Contador(
+    "biogeovis_mongo_explain_planes_total",
+    "Planes de las consultas lentas muestreadas (collscan=1 si recorre la colección)",
+    ("comando", "coleccion", "collscan"),
+))
+
+
+##########################Resumen de explain###############################
+def _recorrer_plan(nodo, etapas, indices):
+    ''' Recolectar etapas e índices de un plan (inputStage, inputStages, queryPlan) '''
+    if isinstance(nodo, list):
+        for hijo in nodo:
+            _recorrer_plan(hijo, etapas, indices)
+        return
+    if not isinstance(nodo, dict):
+        return
+    if "stage" in nodo:
+        etapas.append(nodo["stage"])
+    if "indexName" in nodo:
+        indices.append(nodo["indexName"])
+    for clave in ("queryPlan", "inputStage", "inputStages", "winningPlan"):
+        if clave in nodo:
+            _recorrer_plan(nodo[clave], etapas, indices)
+
+
+def _buscar_clave(nodo, clave, encontrados):
+    ''' Todas las apariciones de una clave en el documento de explain (pipelines con $cursor, shards) '''
+    if isinstance(nodo, dict):
+        for k, v in nodo.items():
+            if k == clave:
+                encontrados.append(v)
+            else:
+                _buscar_clave(v, clave, encontrados)
+    elif isinstance(nodo, list):
+        for v in nodo:
+            _buscar_clave(v, clave, encontrados)
+    return encontrados
+
+
+def resumir_explain(explain: dict) -> dict:
+    ''' Resumen compacto de un explain con verbosity executionStats '''
+    etapas, indices = [], []
+    for planner in _buscar_clave(explain, "queryPlanner", []):
+        _recorrer_plan(planner.get("winningPlan"), etapas, indices)
+    # Etapas de agregación posteriores al $cursor (p. ej. $group, $geoNear)
+    for etapa in explain.get("stages", []):
+        nombre = next(iter(etapa))
+        if nombre != "$cursor":
+            etapas.append(nombre)
+    resumen = {
+        "etapas": etapas,
+        "indices": sorted(set(indices)),
+        "collscan": "COLLSCAN" in etapas,
+        "devueltos": 0,
+        "claves_examinadas": 0,
+        "docs_examinados": 0,
+        "tiempo_ms": 0,
+    }
+    for stats in _buscar_clave(explain, "executionStats", []):
+        resumen["devueltos"] += stats.get("nReturned", 0)
+        resumen["claves_examinadas"] += stats.get("totalKeysExamined", 0)
+        resumen["docs_examinados"] += stats.get("totalDocsExamined", 0)
+        resumen["tiempo_ms"] += stats.get("executionTimeMillis", 0)
+    return resumen
+
+
+##########################Middleware HTTP###############################
+def _plantilla_ruta(scope):
+    ''' Ruta declarada que atiende la solicitud (limita la cardinalidad de la etiqueta) '''
+    ruta = scope.get("route")
+    if ruta is not None:
+        return ruta.path
+    # Respuestas de la caché: el router no llegó a ejecutarse
+    app = scope.get("app")
+    for ruta in getattr(getattr(app, "router", None), "routes", ()):
+        coincide, _ = ruta.matches(scope)
+        if coincide == Match.FULL:
+            return ruta.path
+    return "sin_ruta"
+
+
+class MetricasHTTP:
+    ''' Middleware ASGI: latencia, código, caché y bytes por ruta; va por fuera de la caché de respuestas '''
+
+    def __init__(self, app, habilitada: bool = METRICAS_HABILITADAS):
+        self.app = app
+        self.habilitada = habilitada
+
+    async def __call__(self, scope, receive, send):
+        if not self.habilitada or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        estado = {"codigo": 500, "cache": "", "bytes": 0}
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["codigo"] = mensaje["status"]
+                for clave, valor in mensaje.get("headers", []):
+                    if clave.lower() == b"x-cache":
+                        estado["cache"] = valor.decode("latin-1").lower()
+            elif mensaje["type"] == "http.response.body":
+                estado["bytes"] += len(mensaje.get("body", b""))
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            ruta = _plantilla_ruta(scope)
+            metodo = scope["method"]
+            http_solicitudes.sumar(ruta, metodo, str(estado["codigo"]), estado["cache"])
+            http_duracion.observar(duracion, ruta, metodo, estado["cache"])
+            http_bytes.observar(estado["bytes"], ruta, metodo)
+
+
+##########################Listener de MongoDB###############################
+def _documentos_devueltos(reply) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or ())
+    if "n" in reply and isinstance(reply["n"], int):
+        return 1
+    if "values" in reply:
+        return len(reply["values"])
+    return 0
+
+
+class MonitorComandos(monitoring.CommandListener):
+    """
+    Registrar la duración y los documentos devueltos de cada comando de MongoDB.
+    Los comandos de lectura más lentos que el umbral se explican (con muestreo) en segundo plano.
+    - cliente: cliente asíncrono con el que ejecutar los explain (se asigna tras crearlo).
+    """
+
+    def __init__(self, umbral_ms: float = CONSULTA_LENTA_MS, muestreo: float = MUESTREO_LENTAS,
+                 max_explain: int = MAX_EXPLAIN_CONCURRENTES):
+        self.umbral_ms = umbral_ms
+        self.muestreo = muestreo
+        self.max_explain = max_explain
+        self.cliente = None
+        self._en_curso = {}
+        self._explicando = 0
+        # Últimas consultas lentas explicadas (para inspección rápida sin ir al log)
+        self.recientes = deque(maxlen=50)
+
+    def started(self, event):
+        comando = event.command
+        coleccion = comando.get(event.command_name)
+        if event.command_name == "getMore":
+            coleccion = comando.get("collection")
+        guardar = event.command_name in COMANDOS_EXPLICABLES
+        self._en_curso[(event.connection_id, event.request_id)] = (
+            coleccion if isinstance(coleccion, str) else "",
+            {k: v for k, v in comando.items() if k not in _CAMPOS_DRIVER} if guardar else None,
+            event.database_name,
+        )
+
+    def succeeded(self, event):
+        coleccion, comando, base = self._en_curso.pop((event.connection_id, event.request_id), ("", None, None))
+        nombre = event.command_name
+        duracion_ms = event.duration_micros / 1000
+        mongo_duracion.observar(duracion_ms / 1000, nombre, coleccion)
+        mongo_comandos.sumar(nombre, coleccion, "ok")
+        devueltos = _documentos_devueltos(event.reply)
+        if devueltos:
+            mongo_devueltos.sumar(nombre, coleccion, cantidad=devueltos)
+        if duracion_ms >= self.umbral_ms and nombre != "explain":
+            mongo_lentas.sumar(nombre, coleccion)
+            if comando is not None:
+                self._programar_explain(nombre, coleccion, comando, base, duracion_ms)
+
+    def failed(self, event):
+        coleccion, _, _ = self._en_curso.pop((event.connection_id, event.request_id), ("", None, None))
+        mongo_duracion.observar(event.duration_micros / 1_000_000, event.command_name, coleccion)
+        mongo_comandos.sumar(event.command_name, coleccion, "error")
+
+    def _programar_explain(self, nombre, coleccion, comando, base, duracion_ms):
+        if self.cliente is None or self._explicando >= self.max_explain or random.random() >= self.muestreo:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._explicando += 1
+        loop.create_task(self._explicar(nombre, coleccion, comando, base, duracion_ms))
+
+    async def _explicar(self, nombre, coleccion, comando, base, duracion_ms):
+        try:
+            if nombre == "aggregate":
+                comando = {**comando, "cursor": {}}
+            explain = await self.cliente[base].command("explain", comando, verbosity="executionStats")
+            resumen = resumir_explain(explain)
+            explain_examinados.sumar(nombre, coleccion, cantidad=resumen["docs_examinados"])
+            explain_devueltos.sumar(nombre, coleccion, cantidad=resumen["devueltos"])
+            explain_planes.sumar(nombre, coleccion, "1" if resumen["collscan"] else "0")
+            entrada = {
+                "comando": nombre,
+                "coleccion": coleccion,
+                "duracion_ms": round(duracion_ms, 1),
+                "consulta": comando.get("filter") or comando.get("pipeline") or comando.get("query"),
+                "plan": resumen,
+            }
+            self.recientes.append(entrada)
+            log_lentas.warning(json.dumps(entrada, ensure_ascii=False, default=str))
+        except Exception as e:
+            log_lentas.warning(f"No se pudo explicar {nombre} sobre {coleccion}: {e}")
+        finally:
+            self._explicando -= 1
+
+
+monitor_comandos = MonitorComandos()
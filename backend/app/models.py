@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, Annotated
+from typing import Optional, Annotated, List, Dict
 from datetime import datetime
 from bson import ObjectId
 
@@ -15,9 +15,15 @@ class Geolocalizacion(BaseModel):
     Latitud : float
     Longitud : float
 
+class PuntoGeoJSON(BaseModel):
+    type: str = "Point"
+    coordinates: List[float]
+
 class Ubicacion(BaseModel):
     Pais: str
     Geolocalizacion: Geolocalizacion
+    Punto: Optional[PuntoGeoJSON] = None
+    Geohash: Optional[str] = None
 
 class Taxonomia(BaseModel):
     Reino: str
@@ -35,4 +41,6 @@ class Avistamiento(BaseModel):
     Taxonomia: Taxonomia
     Ubicacion: Ubicacion
     FechaEvento: datetime
-    NombreCientifico: str
\ No newline at end of file
+    NombreCientifico: str
+    TaxonomiaNorm: Optional[Dict[str, str]] = None
+    ClaveRegistro: Optional[str] = None
\ No newline at end of file
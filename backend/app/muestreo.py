@@ -0,0 +1,84 @@
+"""
+Muestreo estratificado por celdas de geohash para los listados (sample=N).
+
+Con los topes de 1000/2000 los listados devuelven los primeros documentos en
+orden natural, que suelen ser una sola región o un solo lote de carga. En
+modo muestra se devuelven N documentos repartidos en el espacio y el tiempo:
+
+1. Se cuentan los documentos del filtro por celda (prefijo del geohash
+   guardado en Ubicacion.Geohash). Si hay más celdas que N se usan celdas
+   más grandes (prefijos más cortos) hasta que quepan; la suma es el total real.
+2. Cada celda recibe una cuota min(conteo, T), con T el mayor umbral cuya
+   suma de cuotas no supera N: las celdas pequeñas entran completas y el
+   resto se reparte por igual entre las grandes.
+3. Una sola agregación numera los documentos de cada celda por FechaEvento
+   ($setWindowFields) y se queda con cuota documentos espaciados
+   uniformemente, así la muestra de cada celda cubre todo su rango de fechas.
+"""
+from .geo import CAMPO_GEOHASH
+
+MUESTRA_MAXIMA = 10000
+# Precisión de geohash de partida para las celdas (5 ≈ 4,9 km × 4,9 km)
+PRECISION_CELDAS = 5
+CABECERA_CELDAS = "X-Sample-Cells"
+
+
+def _celda(precision: int):
+    ''' Expresión de la celda de un documento (cadena vacía si no tiene geohash) '''
+    return {"$substrBytes": [{"$ifNull": [f"${CAMPO_GEOHASH}", ""]}, 0, precision]}
+
+
+def pipeline_conteo_celdas(query: dict, precision: int = PRECISION_CELDAS):
+    ''' Conteo de los documentos del filtro por celda '''
+    return [
+        {"$match": query},
+        {"$group": {"_id": _celda(precision), "n": {"$sum": 1}}},
+    ]
+
+
+def agrupar_celdas(conteos: dict, n: int, precision: int = PRECISION_CELDAS):
+    ''' Acortar el prefijo de las celdas hasta que haya como mucho n; devuelve (precision, conteos) '''
+    while len(conteos) > n and precision > 1:
+        precision -= 1
+        agrupados = {}
+        for celda, conteo in conteos.items():
+            agrupados[celda[:precision]] = agrupados.get(celda[:precision], 0) + conteo
+        conteos = agrupados
+    return precision, conteos
+
+
+def umbral_cuota(conteos, n: int) -> int:
+    ''' Mayor T tal que sum(min(conteo, T)) <= n (al menos 1) '''
+    restante = n
+    pendientes = sorted(conteos)
+    for i, conteo in enumerate(pendientes):
+        parte = restante // (len(pendientes) - i)
+        if conteo > parte:
+            return max(parte, 1)
+        restante -= conteo
+    return pendientes[-1] if pendientes else 0
+
+
+def pipeline_muestra(query: dict, precision: int, umbral: int, n: int, proyeccion: dict = None):
+    """
+    Documentos de la muestra en una sola agregación.
+    Dentro de cada celda, con i = posición por FechaEvento (1..conteo) y q = min(conteo, umbral),
+    se conservan las posiciones donde floor(i * q / conteo) aumenta: exactamente q documentos
+    repartidos uniformemente a lo largo del tiempo de la celda.
+    """
+    cuota = {"$min": ["$_n", umbral]}
+    paso = lambda i: {"$floor": {"$divide": [{"$multiply": [i, cuota]}, "$_n"]}}
+    pipeline = [
+        {"$match": query},
+        {"$setWindowFields": {
+            "partitionBy": _celda(precision),
+            "sortBy": {"FechaEvento": 1},
+            "output": {"_i": {"$documentNumber": {}}, "_n": {"$count": {}}},
+        }},
+        {"$match": {"$expr": {"$gt": [paso("$_i"), paso({"$subtract": ["$_i", 1]})]}}},
+        {"$limit": n},
+        {"$unset": ["_i", "_n"]},
+    ]
+    if proyeccion:
+        pipeline.append({"$project": proyeccion})
+    return pipeline
@@ -0,0 +1,91 @@
+"""
+Paginación por cursor (keyset) para los endpoints de listado.
+
+El cursor es un token opaco con la clave de orden y el _id del último
+documento entregado; la página siguiente continúa a partir de esa clave con
+un rango sobre el índice en lugar de recorrer y descartar documentos con skip().
+"""
+import base64
+from typing import Optional
+
+from bson import ObjectId, json_util
+
+# Órdenes admitidos: la clave principal siempre se desempata con _id
+ORDENES = {
+    "_id": [("_id", 1)],
+    "FechaEvento": [("FechaEvento", 1), ("_id", 1)],
+}
+
+# Índices que respaldan los órdenes anteriores (además del índice de _id)
+INDICES_ORDEN = [
+    [("FechaEvento", 1), ("_id", 1)],
+]
+
+CABECERA_CURSOR = "X-Next-Cursor"
+CABECERA_TOTAL = "X-Total-Count"
+
+
+def validar_orden(orden: str):
+    if orden not in ORDENES:
+        raise ValueError(f"ordenar_por debe ser uno de: {', '.join(ORDENES)}")
+    return ORDENES[orden]
+
+
+def codificar_cursor(doc: dict, orden: str = "_id") -> str:
+    ''' Token opaco con la posición del documento según el orden indicado '''
+    ultimo_id = doc["_id"]
+    if isinstance(ultimo_id, str) and ObjectId.is_valid(ultimo_id):
+        # La API decodifica _id como texto (serializacion.CODEC_API); el cursor compara con el ObjectId
+        ultimo_id = ObjectId(ultimo_id)
+    contenido = {"o": orden, "id": ultimo_id}
+    if orden != "_id":
+        contenido["v"] = doc.get(orden)
+    texto = json_util.dumps(contenido, separators=(",", ":"))
+    return base64.urlsafe_b64encode(texto.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(token: str):
+    ''' Recuperar (orden, valor, _id) de un token; lanza ValueError si no es válido '''
+    try:
+        relleno = "=" * (-len(token) % 4)
+        contenido = json_util.loads(base64.urlsafe_b64decode(token + relleno).decode("utf-8"))
+        return contenido["o"], contenido.get("v"), contenido["id"]
+    except Exception:
+        raise ValueError("cursor no válido")
+
+
+def aplicar_cursor(query: dict, cursor: Optional[str], orden: str = "_id") -> dict:
+    ''' Combinar la consulta con la condición "después del cursor" para el orden indicado '''
+    validar_orden(orden)
+    if not cursor:
+        return query
+    orden_cursor, valor, ultimo_id = decodificar_cursor(cursor)
+    if orden_cursor != orden:
+        raise ValueError("El cursor pertenece a otro orden")
+    if orden == "_id":
+        condicion = {"_id": {"$gt": ultimo_id}}
+    elif valor is None:
+        # Los documentos sin clave van primero; $gt: null no alcanza a los que sí la tienen
+        condicion = {"$or": [
+            {orden: {"$ne": None}},
+            {orden: None, "_id": {"$gt": ultimo_id}},
+        ]}
+    else:
+        condicion = {"$or": [
+            {orden: {"$gt": valor}},
+            {orden: valor, "_id": {"$gt": ultimo_id}},
+        ]}
+    if not query:
+        return condicion
+    return {"$and": [query, condicion]}
+
+
+def cortar_pagina(docs: list, limit: int, orden: str = "_id"):
+    """
+    Recibe hasta limit + 1 documentos ordenados y devuelve (página, siguiente_cursor).
+    El documento extra solo indica que hay más resultados; no se entrega.
+    """
+    if len(docs) <= limit:
+        return docs, None
+    pagina = docs[:limit]
+    return pagina, codificar_cursor(pagina[-1], orden)
@@ -0,0 +1,104 @@
+"""
+Clave determinista de cada avistamiento para cargas idempotentes.
+
+ClaveRegistro es un hash del nombre científico, la taxonomía (normalizados),
+las coordenadas y la fecha. Un índice único sobre ella permite que
+load_data.py cargue con upserts: volver a cargar el mismo archivo, o un
+archivo diario con registros repetidos, no duplica documentos.
+"""
+import hashlib
+import json
+from datetime import datetime
+
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from .fechas import normalizar_fecha
+from .filtros import NIVELES_TAXONOMIA, normalizar_texto
+from .geo import coordenadas
+
+CAMPO_CLAVE = "ClaveRegistro"
+# Índice único parcial: los documentos antiguos sin clave no chocan entre sí hasta completarla
+INDICE_CLAVE = {
+    "keys": [(CAMPO_CLAVE, 1)],
+    "unique": True,
+    "partialFilterExpression": {CAMPO_CLAVE: {"$exists": True}},
+}
+# Decimales de las coordenadas que forman parte de la clave (~11 cm)
+DECIMALES_CLAVE = 6
+
+
+def clave_registro(doc) -> str:
+    ''' Hash estable del contenido que identifica un avistamiento '''
+    tax = doc.get("Taxonomia") or {}
+    coords = coordenadas(doc)
+    # Las fechas de texto de documentos antiguos se interpretan igual que al cargar,
+    # así la clave no cambia cuando migrar_fechas las convierte a Date
+    fecha = normalizar_fecha(doc.get("FechaEvento")) or doc.get("FechaEvento")
+    contenido = [
+        normalizar_texto(doc.get("NombreCientifico")),
+        [normalizar_texto(tax.get(nivel)) for nivel in NIVELES_TAXONOMIA],
+        [round(c, DECIMALES_CLAVE) for c in coords] if coords else None,
+        fecha.isoformat() if isinstance(fecha, datetime) else fecha,
+    ]
+    texto = json.dumps(contenido, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def crear_indice_clave(collection):
+    collection.create_index(INDICE_CLAVE["keys"], unique=True,
+                            partialFilterExpression=INDICE_CLAVE["partialFilterExpression"])
+
+
+def _escribir_claves(collection, ids, operaciones):
+    """
+    Aplicar las claves calculadas; devuelve (modificados, eliminados).
+    Una clave que choca con el índice único es un duplicado de un documento ya cargado
+    (p. ej. el mismo registro importado de nuevo): se elimina el documento antiguo.
+    """
+    try:
+        return collection.bulk_write(operaciones, ordered=False).modified_count, 0
+    except BulkWriteError as e:
+        errores = e.details.get("writeErrors", [])
+        if any(error.get("code") != 11000 for error in errores):
+            raise
+        repetidos = [ids[error["index"]] for error in errores]
+        return e.details.get("nModified", 0), collection.delete_many({"_id": {"$in": repetidos}}).deleted_count
+
+
+def completar_claves(collection, batch_size=1000):
+    """
+    Migración: calcular ClaveRegistro en los documentos que no la tienen y eliminar los duplicados
+    (se conserva el de menor _id). Devuelve (claves_calculadas, duplicados_eliminados).
+    Los documentos con FechaEvento de texto se recalculan siempre: sus claves anteriores se
+    calcularon sobre el texto sin interpretar y no coinciden con las de los registros nuevos.
+    """
+    pendientes = collection.find({"$or": [{CAMPO_CLAVE: {"$exists": False}}, {"FechaEvento": {"$type": "string"}}]})
+    ids, operaciones = [], []
+    calculadas = eliminados = 0
+    for doc in pendientes:
+        clave = clave_registro(doc)
+        if doc.get(CAMPO_CLAVE) == clave:
+            continue
+        ids.append(doc["_id"])
+        operaciones.append(UpdateOne({"_id": doc["_id"]}, {"$set": {CAMPO_CLAVE: clave}}))
+        if len(operaciones) >= batch_size:
+            modificados, repetidos = _escribir_claves(collection, ids, operaciones)
+            calculadas += modificados
+            eliminados += repetidos
+            ids, operaciones = [], []
+    if operaciones:
+        modificados, repetidos = _escribir_claves(collection, ids, operaciones)
+        calculadas += modificados
+        eliminados += repetidos
+
+    if calculadas:
+        repetidos = collection.aggregate([
+            {"$match": {CAMPO_CLAVE: {"$exists": True}}},
+            {"$group": {"_id": f"${CAMPO_CLAVE}", "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+            {"$match": {"n": {"$gt": 1}}},
+        ], allowDiskUse=True)
+        borrar = [DeleteOne({"_id": _id}) for grupo in repetidos for _id in sorted(grupo["ids"])[1:]]
+        for i in range(0, len(borrar), batch_size):
+            eliminados += collection.bulk_write(borrar[i:i + batch_size], ordered=False).deleted_count
+    return calculadas, eliminados
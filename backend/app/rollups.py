@@ -0,0 +1,194 @@
+"""
+Colecciones de agregados precalculados (rollups) para los endpoints /agrupados/*.
+
+- rollup_cubo: conteos por taxonomía completa × país × mes. El _id guarda los
+  valores tal como se muestran y, en TaxonomiaNorm, la forma normalizada por la
+  que filtran la API y la colección base.
+- rollup_niveles: conteos por valor de cada dimensión (país, cada nivel
+  taxonómico y FechaEvento), derivados del cubo y de la colección base.
+- rollup_meta: marca de tiempo de la última actualización y versión del esquema
+  del cubo (un cubo con otra forma se reconstruye en la siguiente carga).
+
+load_data.py reconstruye los rollups tras una carga completa y los mantiene
+de forma incremental en cada lote insertado; la API solo hace lecturas
+indexadas sobre rollup_niveles.
+"""
+from collections import Counter
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from .filtros import CAMPO_TAXONOMIA_NORM, NIVELES_TAXONOMIA
+
+COLECCION_CUBO = "rollup_cubo"
+COLECCION_NIVELES = "rollup_niveles"
+COLECCION_META = "rollup_meta"
+ID_META = "rollups"
+# Forma del _id de rollup_cubo; cambia cuando se agregan o quitan campos de la clave
+ESQUEMA_CUBO = 2
+# Filtro de rollup_meta que solo encuentra rollups con el cubo en la forma actual
+FILTRO_META_CUBO = {"_id": ID_META, "esquema": ESQUEMA_CUBO}
+# Cabecera con la fecha de la última actualización de los rollups servidos
+CABECERA_ROLLUP = "X-Rollup-Actualizado"
+
+# Dimensiones del cubo: niveles taxonómicos, país y mes
+DIMENSIONES_CUBO = NIVELES_TAXONOMIA + ["Pais"]
+
+INDICES_ROLLUPS = {
+    COLECCION_NIVELES: [[("_id.dim", 1), ("count", -1)], [("_id.dim", 1), ("_id.valor", 1)]],
+    # Los filtros del cubo comparan por igualdad exacta (sin intercalación), como en avistamientos
+    COLECCION_CUBO: [
+        [("_id.Mes", 1)],
+        *[[(f"_id.{CAMPO_TAXONOMIA_NORM}.{nivel}", 1)] for nivel in NIVELES_TAXONOMIA],
+        [("_id.Pais", 1)],
+    ],
+}
+
+
+def _mes(fecha):
+    ''' Primer día del mes de una fecha, o None si no es una fecha '''
+    if isinstance(fecha, datetime):
+        return datetime(fecha.year, fecha.month, 1)
+    return None
+
+
+def clave_cubo(doc):
+    ''' Clave del cubo (taxonomía × país × mes) para un documento de avistamiento '''
+    tax = doc.get("Taxonomia") or {}
+    norm = doc.get(CAMPO_TAXONOMIA_NORM) or {}
+    clave = {nivel: tax.get(nivel) for nivel in NIVELES_TAXONOMIA}
+    clave["Pais"] = (doc.get("Ubicacion") or {}).get("Pais")
+    clave["Mes"] = _mes(doc.get("FechaEvento"))
+    # Mismo orden de campos que pipeline_cubo: el _id se compara como documento completo
+    clave[CAMPO_TAXONOMIA_NORM] = {nivel: norm.get(nivel) for nivel in NIVELES_TAXONOMIA}
+    return clave
+
+
+def pipeline_cubo():
+    ''' Pipeline que reconstruye el cubo completo desde la colección de avistamientos '''
+    grupo = {nivel: f"$Taxonomia.{nivel}" for nivel in NIVELES_TAXONOMIA}
+    grupo["Pais"] = "$Ubicacion.Pais"
+    grupo["Mes"] = {"$cond": [
+        {"$eq": [{"$type": "$FechaEvento"}, "date"]},
+        {"$dateTrunc": {"date": "$FechaEvento", "unit": "month"}},
+        None,
+    ]}
+    grupo[CAMPO_TAXONOMIA_NORM] = {nivel: f"${CAMPO_TAXONOMIA_NORM}.{nivel}" for nivel in NIVELES_TAXONOMIA}
+    return [
+        {"$group": {"_id": grupo, "count": {"$sum": 1}}},
+        {"$out": COLECCION_CUBO},
+    ]
+
+
+def pipeline_niveles_desde_cubo(destino):
+    ''' Pipeline que deriva los conteos por dimensión a partir del cubo '''
+    pares = [{"dim": dim, "valor": f"$_id.{dim}"} for dim in DIMENSIONES_CUBO]
+    return [
+        {"$project": {"count": 1, "pares": pares}},
+        {"$unwind": "$pares"},
+        {"$group": {"_id": "$pares", "count": {"$sum": "$count"}}},
+        {"$out": destino},
+    ]
+
+
+def pipeline_niveles_fecha(destino):
+    ''' Pipeline con los conteos por FechaEvento exacta (no cabe en el cubo mensual) '''
+    return [
+        {"$match": {"FechaEvento": {"$exists": True, "$nin": [None, ""]}}},
+        {"$group": {"_id": {"dim": "FechaEvento", "valor": "$FechaEvento"}, "count": {"$sum": 1}}},
+        {"$merge": {"into": destino, "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+
+def crear_indices_rollups(db):
+    for coleccion, indices in INDICES_ROLLUPS.items():
+        for claves in indices:
+            db[coleccion].create_index(claves)
+
+
+def marcar_actualizado(db):
+    ''' Registrar la fecha de la última actualización de los rollups '''
+    ahora = datetime.utcnow()
+    db[COLECCION_META].update_one({"_id": ID_META}, {"$set": {"actualizado": ahora}}, upsert=True)
+    return ahora
+
+
+def rollups_inicializados(db):
+    return db[COLECCION_META].find_one(FILTRO_META_CUBO) is not None
+
+
+def reconstruir_rollups(db, coleccion="avistamientos"):
+    """
+    Reconstruir todos los rollups desde cero con agregaciones en el servidor.
+    rollup_niveles se arma en una colección temporal y se renombra al final,
+    así la API nunca lee un rollup a medio construir.
+    """
+    temporal = f"{COLECCION_NIVELES}_tmp"
+    db[coleccion].aggregate(pipeline_cubo(), allowDiskUse=True)
+    db[COLECCION_CUBO].aggregate(pipeline_niveles_desde_cubo(temporal), allowDiskUse=True)
+    db[coleccion].aggregate(pipeline_niveles_fecha(temporal), allowDiskUse=True)
+    db[temporal].rename(COLECCION_NIVELES, dropTarget=True)
+    crear_indices_rollups(db)
+    db[COLECCION_META].update_one({"_id": ID_META}, {"$set": {"esquema": ESQUEMA_CUBO}}, upsert=True)
+    return marcar_actualizado(db)
+
+
+def actualizar_rollups(db, docs):
+    ''' Sumar un lote de documentos recién insertados a los rollups (incremental) '''
+    cubo = Counter()
+    niveles = Counter()
+    for doc in docs:
+        clave = clave_cubo(doc)
+        # La taxonomía normalizada es un subdocumento: se cuenta como tupla y va al final del _id
+        norm = clave.pop(CAMPO_TAXONOMIA_NORM)
+        cubo[(tuple(clave.items()), tuple(norm.items()))] += 1
+        for dim in DIMENSIONES_CUBO:
+            niveles[(dim, clave[dim])] += 1
+        if doc.get("FechaEvento") not in (None, ""):
+            niveles[("FechaEvento", doc["FechaEvento"])] += 1
+    if not cubo:
+        return
+    db[COLECCION_CUBO].bulk_write([
+        UpdateOne({"_id": {**dict(clave), CAMPO_TAXONOMIA_NORM: dict(norm)}}, {"$inc": {"count": n}}, upsert=True)
+        for (clave, norm), n in cubo.items()
+    ], ordered=False)
+    db[COLECCION_NIVELES].bulk_write([
+        UpdateOne({"_id": {"dim": dim, "valor": valor}}, {"$inc": {"count": n}}, upsert=True)
+        for (dim, valor), n in niveles.items()
+    ], ordered=False)
+    marcar_actualizado(db)
+
+
+def campo_dimension(dim: str):
+    ''' Ruta del campo de avistamientos que corresponde a una dimensión '''
+    if dim == "Pais":
+        return "Ubicacion.Pais"
+    if dim == "FechaEvento":
+        return "FechaEvento"
+    return f"Taxonomia.{dim}"
+
+
+def orden_nivel(por_valor: bool = False):
+    ''' Orden de lectura en rollup_niveles: por valor ascendente o por conteo descendente '''
+    return [("_id.valor", 1)] if por_valor else [("count", -1)]
+
+
+def pipeline_agrupado(dim: str, por_valor: bool = False, limit: int = 0):
+    ''' Agrupación en vivo sobre avistamientos; solo se usa si los rollups no existen todavía '''
+    campo = campo_dimension(dim)
+    pipeline = []
+    if dim != "Pais":
+        pipeline.append({"$match": {campo: {"$exists": True, "$nin": [None, ""]}}})
+    pipeline.append({"$group": {"_id": f"${campo}", "count": {"$sum": 1}}})
+    pipeline.append({"$sort": {"_id": 1} if por_valor else {"count": -1}})
+    if limit:
+        pipeline.append({"$limit": limit})
+    return pipeline
+
+
+def consulta_nivel(dim: str):
+    ''' Filtro sobre rollup_niveles para una dimensión; excluye valores vacíos salvo para Pais '''
+    query = {"_id.dim": dim}
+    if dim != "Pais":
+        query["_id.valor"] = {"$nin": [None, ""]}
+    return query
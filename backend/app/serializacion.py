@@ -0,0 +1,69 @@
+"""
+Serialización rápida de las respuestas JSON.
+
+- CODEC_API: opciones de decodificación de la base de datos de la API. Un
+  TypeDecoder convierte cada ObjectId en texto al leer el BSON, así los
+  documentos llegan listos para JSON y las rutas no recorren la página para
+  reescribir _id.
+- RespuestaJSON: respuesta codificada con orjson (datetime, UUID y arreglos
+  de NumPy nativos; ObjectId por la función default). Las rutas de listado la
+  devuelven directamente, sin pasar por jsonable_encoder, que recorría cada
+  Taxonomia/Ubicacion anidada antes de codificar.
+"""
+from datetime import date
+
+import orjson
+from bson import ObjectId
+from bson.codec_options import CodecOptions, TypeDecoder, TypeRegistry
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+OPCIONES_ORJSON = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+class ObjectIdComoTexto(TypeDecoder):
+    ''' Decodificar ObjectId directamente como su representación hexadecimal '''
+
+    bson_type = ObjectId
+
+    def transform_bson(self, valor):
+        return str(valor)
+
+
+CODEC_API = CodecOptions(type_registry=TypeRegistry([ObjectIdComoTexto()]))
+
+
+def _por_defecto(valor):
+    if isinstance(valor, ObjectId):
+        return str(valor)
+    if isinstance(valor, date):
+        return valor.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def a_json(contenido) -> bytes:
+    ''' Codificar con orjson (mismo formato que las respuestas de la API) '''
+    return orjson.dumps(contenido, default=_por_defecto, option=OPCIONES_ORJSON)
+
+
+class RespuestaJSON(JSONResponse):
+    ''' JSONResponse codificada con orjson '''
+
+    def render(self, content) -> bytes:
+        return a_json(content)
+
+
+def respuesta_json(contenido, response: Response = None) -> RespuestaJSON:
+    """
+    Devolver contenido ya serializable como RespuestaJSON, sin jsonable_encoder.
+    Copia las cabeceras fijadas en el Response inyectado de la ruta (cursor, total, rollup),
+    que FastAPI no aplica cuando la ruta devuelve su propia respuesta.
+    """
+    respuesta = RespuestaJSON(contenido)
+    if response is not None:
+        for clave, valor in response.raw_headers:
+            if clave not in (b"content-length", b"content-type"):
+                respuesta.raw_headers.append((clave, valor))
+        if response.status_code:
+            respuesta.status_code = response.status_code
+    return respuesta
@@ -0,0 +1,47 @@
+"""
+Respuestas NDJSON en streaming para conjuntos de resultados grandes.
+
+Los documentos se codifican y envían a medida que llegan del cursor de
+MongoDB, en lotes acotados, en lugar de acumular toda la lista en memoria.
+"""
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from .serializacion import a_json
+
+NDJSON = "application/x-ndjson"
+# Documentos por lote: tamaño de batch del cursor y de cada fragmento enviado
+TAM_LOTE_STREAM = 500
+
+
+def limite_stream(request: Request, stream: bool = False) -> Optional[int]:
+    """
+    Dependencia del modo streaming (?stream=1 o cabecera Accept: application/x-ndjson).
+    Devuelve None si el cliente no lo pidió. Si lo pidió, devuelve el limit explícito de
+    la petición o 0 (sin límite): en streaming no se aplican los topes de 1000/2000.
+    """
+    if not stream and NDJSON not in request.headers.get("accept", ""):
+        return None
+    try:
+        return max(0, int(request.query_params.get("limit", 0)))
+    except ValueError:
+        return 0
+
+
+async def generar_ndjson(cursor):
+    ''' Codificar los documentos del cursor asíncrono como líneas JSON, agrupadas en lotes '''
+    lote = []
+    async for doc in cursor:
+        lote.append(a_json(doc))
+        if len(lote) >= TAM_LOTE_STREAM:
+            yield b"\n".join(lote) + b"\n"
+            lote = []
+    if lote:
+        yield b"\n".join(lote) + b"\n"
+
+
+def respuesta_ndjson(cursor):
+    ''' StreamingResponse NDJSON a partir de un cursor asíncrono de pymongo '''
+    return StreamingResponse(generar_ndjson(cursor.batch_size(TAM_LOTE_STREAM)), media_type=NDJSON)
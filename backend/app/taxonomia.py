@@ -0,0 +1,250 @@
+"""
+Taxonomía de los avistamientos.
+
+- TaxonomiaNorm guarda cada nivel en minúsculas y sin espacios en los extremos;
+  load_data.py la escribe al cargar y completar_taxonomia_normalizada() la
+  calcula para los documentos cargados antes de que existiera.
+- ArbolTaxonomia es el árbol Reino -> ... -> Especie (más la lista de países)
+  con conteos, en memoria, para el autocompletado y la navegación del filtro.
+  Se construye desde el cubo de rollups y se reconstruye en segundo plano
+  cuando cambia la versión de los datos; las consultas no tocan MongoDB.
+"""
+import asyncio
+import heapq
+import os
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from pymongo import UpdateOne
+
+from .filtros import CAMPO_TAXONOMIA_NORM, NIVELES_TAXONOMIA, normalizar_texto, taxonomia_normalizada
+from .rollups import COLECCION_CUBO, COLECCION_META, FILTRO_META_CUBO
+
+# Niveles que se pueden autocompletar: los taxonómicos y el país
+NIVELES_SUGERENCIA = NIVELES_TAXONOMIA + ["Pais"]
+# Límite de texto para la búsqueda por prefijo con bisect
+_FIN_PREFIJO = "\uffff"
+# Segundos que la versión debe quedar quieta antes de reconstruir el árbol
+ESTABLE_S = float(os.getenv("TAXONOMIA_ESTABLE_S", "5"))
+# Segundos antes de reintentar una reconstrucción fallida de la misma versión
+REINTENTO_S = float(os.getenv("TAXONOMIA_REINTENTO_S", "60"))
+
+
+def completar_taxonomia_normalizada(collection, batch_size=1000):
+    ''' Migración: calcular TaxonomiaNorm en los documentos existentes que no la tienen '''
+    pendientes = collection.find({CAMPO_TAXONOMIA_NORM: {"$exists": False}}, {"Taxonomia": 1})
+    operaciones = []
+    actualizados = 0
+    for doc in pendientes:
+        if not isinstance(doc.get("Taxonomia"), dict):
+            continue
+        operaciones.append(UpdateOne({"_id": doc["_id"]}, {"$set": {CAMPO_TAXONOMIA_NORM: taxonomia_normalizada(doc["Taxonomia"])}}))
+        if len(operaciones) >= batch_size:
+            actualizados += collection.bulk_write(operaciones, ordered=False).modified_count
+            operaciones = []
+    if operaciones:
+        actualizados += collection.bulk_write(operaciones, ordered=False).modified_count
+    return actualizados
+
+
+class NodoTaxonomia:
+    ''' Un valor de un nivel taxonómico dentro de su ruta, con el total de avistamientos '''
+    __slots__ = ("nivel", "clave", "valor", "count", "hijos", "padre", "_variantes")
+
+    def __init__(self, nivel, clave, padre=None):
+        self.nivel = nivel
+        self.clave = clave
+        self.valor = None
+        self.count = 0
+        self.hijos = {}
+        self.padre = padre
+        self._variantes = None
+
+    def ruta(self):
+        ''' Valores de los niveles superiores, de Reino hacia abajo '''
+        valores = []
+        nodo = self.padre
+        while nodo is not None and nodo.nivel is not None:
+            valores.append(nodo.valor)
+            nodo = nodo.padre
+        return valores[::-1]
+
+    def como_dict(self, con_ruta=False):
+        salida = {"nivel": self.nivel, "valor": self.valor, "count": self.count}
+        if con_ruta:
+            salida["ruta"] = self.ruta()
+        else:
+            salida["hijos"] = len(self.hijos)
+        return salida
+
+
+class ArbolTaxonomia:
+    """
+    Árbol de taxonomía con conteos e índices ordenados por nivel para búsquedas por prefijo.
+    - filas: pares (valores de Reino..Especie, count); un valor vacío corta la ruta.
+    - paises: pares (país, count).
+    Los valores se agrupan sin distinguir mayúsculas; se muestra la variante más frecuente.
+    """
+
+    def __init__(self, filas, paises=()):
+        self.raiz = NodoTaxonomia(None, None)
+        for valores, count in filas:
+            nodo = self.raiz
+            nodo.count += count
+            for nivel, valor in zip(NIVELES_TAXONOMIA, valores):
+                if not isinstance(valor, str) or not valor.strip():
+                    break
+                clave = normalizar_texto(valor)
+                valor = valor.strip()
+                hijo = nodo.hijos.get(clave)
+                if hijo is None:
+                    hijo = nodo.hijos[clave] = NodoTaxonomia(nivel, clave, nodo)
+                    hijo.valor = valor
+                # Solo se cuentan variantes de escritura cuando aparece más de una
+                if hijo._variantes is None and valor != hijo.valor:
+                    hijo._variantes = Counter({hijo.valor: hijo.count})
+                if hijo._variantes is not None:
+                    hijo._variantes[valor] += count
+                hijo.count += count
+                nodo = hijo
+
+        por_nivel = {nivel: [] for nivel in NIVELES_SUGERENCIA}
+        pendientes = list(self.raiz.hijos.values())
+        while pendientes:
+            nodo = pendientes.pop()
+            if nodo._variantes:
+                nodo.valor = nodo._variantes.most_common(1)[0][0]
+                nodo._variantes = None
+            por_nivel[nodo.nivel].append(nodo)
+            pendientes.extend(nodo.hijos.values())
+
+        conteo_paises = Counter()
+        variantes_paises = {}
+        for pais, count in paises:
+            if not isinstance(pais, str) or not pais.strip():
+                continue
+            clave = normalizar_texto(pais)
+            conteo_paises[clave] += count
+            variantes_paises.setdefault(clave, Counter())[pais.strip()] += count
+        for clave, count in conteo_paises.items():
+            nodo = NodoTaxonomia("Pais", clave)
+            nodo.valor = variantes_paises[clave].most_common(1)[0][0]
+            nodo.count = count
+            por_nivel["Pais"].append(nodo)
+
+        # Índice ordenado por clave normalizada: el prefijo es un rango contiguo (bisect)
+        self._claves = {}
+        self._nodos = {}
+        for nivel, nodos in por_nivel.items():
+            nodos.sort(key=lambda n: n.clave)
+            self._claves[nivel] = [n.clave for n in nodos]
+            self._nodos[nivel] = nodos
+
+    @property
+    def total(self):
+        return self.raiz.count
+
+    def tamanos(self):
+        return {nivel: len(nodos) for nivel, nodos in self._nodos.items()}
+
+    def sugerir(self, prefijo: str, nivel=None, limite: int = 10):
+        ''' Valores que empiezan por el prefijo (sin distinguir mayúsculas), los más frecuentes primero '''
+        clave = normalizar_texto(prefijo or "")
+        niveles = [nivel] if nivel else NIVELES_SUGERENCIA
+        candidatos = []
+        for n in niveles:
+            claves = self._claves[n]
+            inicio = bisect_left(claves, clave)
+            fin = bisect_left(claves, clave + _FIN_PREFIJO, inicio)
+            candidatos.extend(self._nodos[n][inicio:fin])
+        mejores = heapq.nlargest(limite, candidatos, key=lambda n: n.count)
+        return [n.como_dict(con_ruta=True) for n in mejores]
+
+    def hijos(self, ruta):
+        """
+        Hijos del nodo en la ruta (valores desde Reino, sin distinguir mayúsculas), ordenados por count.
+        Devuelve (ruta con los valores tal como se muestran, hijos) o None si la ruta no existe.
+        """
+        nodo = self.raiz
+        for valor in ruta:
+            nodo = nodo.hijos.get(normalizar_texto(valor))
+            if nodo is None:
+                return None
+        hijos = sorted(nodo.hijos.values(), key=lambda n: -n.count)
+        ruta_mostrada = nodo.ruta() + [nodo.valor] if nodo.nivel else []
+        return ruta_mostrada, [h.como_dict() for h in hijos]
+
+
+async def _agrupar(coleccion, pipeline):
+    cursor = await coleccion.aggregate(pipeline, allowDiskUse=True)
+    return await cursor.to_list(None)
+
+
+async def construir_arbol(db):
+    ''' Construir el árbol desde el cubo de rollups (o desde avistamientos si aún no existe) '''
+    if await db[COLECCION_META].find_one(FILTRO_META_CUBO) is not None:
+        origen, campos, suma = db[COLECCION_CUBO], {n: f"$_id.{n}" for n in NIVELES_SUGERENCIA}, "$count"
+    else:
+        campos = {n: f"$Taxonomia.{n}" for n in NIVELES_TAXONOMIA}
+        campos["Pais"] = "$Ubicacion.Pais"
+        origen, suma = db.avistamientos, 1
+    filas, paises = await asyncio.gather(
+        _agrupar(origen, [{"$group": {"_id": {n: campos[n] for n in NIVELES_TAXONOMIA}, "count": {"$sum": suma}}}]),
+        _agrupar(origen, [{"$group": {"_id": campos["Pais"], "count": {"$sum": suma}}}]),
+    )
+    # Construir el árbol fuera del bucle de eventos: con muchas especies tarda segundos
+    return await asyncio.to_thread(
+        ArbolTaxonomia,
+        [([f["_id"].get(n) for n in NIVELES_TAXONOMIA], f["count"]) for f in filas],
+        [(p["_id"], p["count"]) for p in paises],
+    )
+
+
+class ServicioTaxonomia:
+    """
+    Árbol de taxonomía en memoria, reconstruido una sola vez por versión de los datos.
+    - La primera construcción se espera (no hay árbol que servir).
+    - Cuando la versión cambia se sigue sirviendo el árbol anterior y se reconstruye en
+      segundo plano (una reconstrucción a la vez), después de que la versión lleve
+      ESTABLE_S segundos sin cambiar, igual que la instantánea en memoria.
+    - Una reconstrucción fallida no se reintenta para la misma versión antes de REINTENTO_S.
+    """
+
+    def __init__(self, estable: float = ESTABLE_S):
+        self.estable = estable
+        self.arbol = None
+        self.version = None
+        self._lock = asyncio.Lock()
+        self._tarea = None
+        self._fallo = (None, 0.0)
+        self._vista = (None, 0.0)
+
+    async def obtener(self, db, version) -> ArbolTaxonomia:
+        if self.arbol is None:
+            async with self._lock:
+                if self.arbol is None:
+                    self.arbol = await construir_arbol(db)
+                    self.version = version
+            return self.arbol
+        if self.version != version:
+            self._programar(db, version)
+        return self.arbol
+
+    def _programar(self, db, version):
+        ahora = time.monotonic()
+        if self._vista[0] != version:
+            self._vista = (version, ahora)
+        version_fallida, momento = self._fallo
+        reintentar = version_fallida != version or ahora - momento >= REINTENTO_S
+        if (self._tarea is None or self._tarea.done()) and ahora - self._vista[1] >= self.estable and reintentar:
+            self._tarea = asyncio.create_task(self._reconstruir(db, version))
+
+    async def _reconstruir(self, db, version):
+        try:
+            arbol = await construir_arbol(db)
+        except Exception as e:
+            self._fallo = (version, time.monotonic())
+            print(f"Aviso: no se pudo reconstruir el árbol de taxonomía: {e}")
+            return
+        self.arbol, self.version = arbol, version
@@ -0,0 +1,51 @@
+"""
+Contador de versión del conjunto de datos.
+
+load_data.py incrementa la versión cada vez que modifica avistamientos; la
+API la consulta (con un intervalo mínimo entre lecturas) para invalidar todo
+lo que dependa de los datos, como la caché de respuestas.
+"""
+import time
+from datetime import datetime
+
+from pymongo import ReturnDocument
+
+COLECCION_METADATOS = "metadatos"
+ID_VERSION = "version_datos"
+
+
+def incrementar_version(db):
+    ''' Incrementar la versión de los datos (uso síncrono desde load_data.py) '''
+    doc = db[COLECCION_METADATOS].find_one_and_update(
+        {"_id": ID_VERSION},
+        {"$inc": {"version": 1}, "$set": {"actualizado": datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return doc["version"]
+
+
+class VigilanteVersion:
+    """
+    Lectura asíncrona y espaciada de la versión de los datos.
+    Como mucho hace una consulta a MongoDB cada `intervalo` segundos; entre
+    lecturas devuelve el último valor conocido.
+    """
+
+    def __init__(self, intervalo: float = 2.0):
+        self.intervalo = intervalo
+        self.version = None
+        self._leido = 0.0
+
+    async def actual(self, db) -> int:
+        ahora = time.monotonic()
+        if self.version is None or ahora - self._leido >= self.intervalo:
+            self._leido = ahora
+            try:
+                doc = await db[COLECCION_METADATOS].find_one({"_id": ID_VERSION})
+                self.version = doc["version"] if doc else 0
+            except Exception:
+                # Sin MongoDB se conserva la última versión conocida
+                if self.version is None:
+                    self.version = 0
+        return self.version
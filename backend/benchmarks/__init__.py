@@ -0,0 +1,13 @@
+"""
+Benchmarks reproducibles de la API de BioGeoVis.
+
+- generador.py: conjuntos sintéticos de avistamientos (10k / 1M / 10M) con
+  sesgo taxonómico (Zipf) y agrupamiento espacial, cargados con load_data.py.
+- escenarios.py: una petición representativa por cada ruta de main.py.
+- explicar.py: resumen de explain (índice usado, claves y documentos examinados).
+- ejecutar.py: ejecuta los escenarios con concurrencia configurable y guarda
+  un informe JSON (p50/p95/p99, rendimiento, bytes y explain).
+- comparar.py: compara dos informes y señala regresiones.
+
+Ver benchmarks/README.md.
+"""
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Comparar dos informes de benchmarks/ejecutar.py.
+
+Empareja los resultados por (escenario, caché, concurrencia) y muestra el
+cambio relativo de p50/p95/p99, rendimiento y bytes. Un escenario es una
+regresión si su p95 empeora más que el umbral (o empieza a fallar); en ese
+caso el proceso termina con código 1, útil para CI.
+
+Uso (desde backend/):
+    python -m benchmarks.comparar base.json nuevo.json [--umbral 0.2] [--metrica p95]
+"""
+import argparse
+import json
+import sys
+
+
+def cargar(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        informe = json.load(f)
+    return informe, {(r["nombre"], r["cache"], r["concurrencia"]): r for r in informe["resultados"]}
+
+
+def _cambio(antes, despues):
+    if not antes or despues is None:
+        return None
+    return (despues - antes) / antes
+
+
+def comparar(base, nuevo, umbral=0.2, metrica="p95"):
+    ''' Filas de comparación y lista de regresiones '''
+    filas, regresiones = [], []
+    for clave in sorted(set(base) & set(nuevo), key=lambda c: (c[2], c[0], c[1])):
+        a, b = base[clave], nuevo[clave]
+        lat_a, lat_b = a["latencia_ms"] or {}, b["latencia_ms"] or {}
+        fila = {
+            "clave": clave,
+            "latencia": {p: (lat_a.get(p), lat_b.get(p), _cambio(lat_a.get(p), lat_b.get(p))) for p in ("p50", "p95", "p99")},
+            "rps": (a["rps"], b["rps"], _cambio(a["rps"], b["rps"])),
+            "bytes_red": (a["bytes_red"], b["bytes_red"], _cambio(a["bytes_red"], b["bytes_red"])),
+            "errores": (a["errores"], b["errores"]),
+        }
+        cambio = fila["latencia"][metrica][2]
+        if (cambio is not None and cambio > umbral) or (b["errores"] and not a["errores"]):
+            regresiones.append(fila)
+        filas.append(fila)
+    return filas, regresiones
+
+
+def _pct(cambio):
+    return "      -" if cambio is None else f"{cambio * 100:+6.1f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Comparar dos informes de benchmark y señalar regresiones.")
+    parser.add_argument("base", help="Informe de referencia")
+    parser.add_argument("nuevo", help="Informe a comparar")
+    parser.add_argument("--umbral", type=float, default=0.2, help="Empeoramiento relativo que cuenta como regresión")
+    parser.add_argument("--metrica", choices=["p50", "p95", "p99"], default="p95", help="Percentil que decide la regresión")
+    args = parser.parse_args(argv)
+
+    informe_base, base = cargar(args.base)
+    informe_nuevo, nuevo = cargar(args.nuevo)
+    print(f"Base:  {args.base} (commit {informe_base.get('commit')}, {informe_base.get('documentos', '?')} documentos)")
+    print(f"Nuevo: {args.nuevo} (commit {informe_nuevo.get('commit')}, {informe_nuevo.get('documentos', '?')} documentos)\n")
+
+    filas, regresiones = comparar(base, nuevo, args.umbral, args.metrica)
+    for fila in filas:
+        nombre, cache, concurrencia = fila["clave"]
+        lat = fila["latencia"]
+        marca = "  <-- regresión" if fila in regresiones else ""
+        print(f"{nombre:<26} c={concurrencia:<3} {cache:<8} "
+              f"p50 {_pct(lat['p50'][2])}  p95 {_pct(lat['p95'][2])}  p99 {_pct(lat['p99'][2])}  "
+              f"req/s {_pct(fila['rps'][2])}  bytes {_pct(fila['bytes_red'][2])}{marca}")
+
+    solo_base = set(base) - set(nuevo)
+    if solo_base:
+        print(f"\nSin resultado en el informe nuevo: {len(solo_base)} combinaciones")
+    print(f"\n{len(regresiones)} regresiones ({args.metrica} > {args.umbral:.0%}) de {len(filas)} comparaciones")
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+"""
+Escenarios de benchmark: una o más peticiones representativas por cada ruta de main.py.
+
+Los parámetros (taxones comunes y raros, país, coordenadas, fechas) se
+descubren desde la propia API al empezar, así los mismos escenarios sirven
+para los conjuntos sintéticos y para los datos reales. Cada escenario lleva
+además la consulta de MongoDB equivalente, construida con los mismos
+helpers que la API, para resumir su explain.
+"""
+from datetime import datetime
+
+from app.facetas import pipeline_facetas
+from app.filtros import NIVELES_TAXONOMIA, construir_filtro, filtro_taxonomia
+from app.geo import CAMPO_PUNTO, filtro_radio, geometria_bbox, pipeline_cercanos, pipeline_clusters, precision_para_zoom
+from app.histograma import pipeline_histograma
+from app.muestreo import PRECISION_CELDAS, pipeline_muestra
+from app.paginacion import ORDENES
+from app.rollups import COLECCION_NIVELES, consulta_nivel, orden_nivel
+
+COLECCION = "avistamientos"
+CAMPOS_LIGEROS = "_id,NombreCientifico,Taxonomia.Reino,Taxonomia.Especie,Ubicacion.Geolocalizacion"
+
+
+class Escenario:
+    ''' Petición HTTP de un escenario y la consulta de MongoDB que la respalda (para explain) '''
+
+    def __init__(self, nombre, ruta, plantilla=None, params=None, metodo="GET", cuerpo=None, consulta=None):
+        self.nombre = nombre
+        self.ruta = ruta
+        # Ruta tal como está declarada en main.py (para verificar la cobertura)
+        self.plantilla = plantilla or ruta
+        self.params = params or {}
+        self.metodo = metodo
+        self.cuerpo = cuerpo
+        # ("find", coleccion, filtro, orden, limit) o ("aggregate", coleccion, pipeline); None si no consulta MongoDB
+        self.consulta = consulta
+
+    def como_dict(self):
+        return {"nombre": self.nombre, "metodo": self.metodo, "ruta": self.ruta, "params": self.params}
+
+
+async def _json(cliente, ruta, **params):
+    respuesta = await cliente.get(ruta, params=params)
+    respuesta.raise_for_status()
+    return respuesta.json()
+
+
+async def _recorrer(cliente, elegir):
+    ''' Bajar por /api/taxonomia/hijos eligiendo un hijo por nivel; devuelve la ruta de 7 valores '''
+    ruta = []
+    params = {}
+    for nivel in NIVELES_TAXONOMIA:
+        hijos = (await _json(cliente, "/api/taxonomia/hijos", **params))["hijos"]
+        if not hijos:
+            raise RuntimeError(f"No hay valores de {nivel} bajo {ruta}")
+        valor = elegir(hijos)["valor"]
+        ruta.append(valor)
+        if nivel != "Especie":
+            params[nivel.lower()] = valor
+    return ruta
+
+
+async def descubrir_parametros(cliente):
+    """
+    Valores reales para los escenarios, leídos desde la API:
+    - comun / rara: rutas taxonómicas completas siguiendo el hijo con más y con menos avistamientos.
+    - pais / pais_raro: países con más y con menos avistamientos.
+    - lat, lng, anio: de un avistamiento de la especie común.
+    """
+    comun = await _recorrer(cliente, lambda hijos: hijos[0])
+    rara = await _recorrer(cliente, lambda hijos: hijos[-1])
+    paises = await _json(cliente, "/api/avistamientos/agrupados/pais")
+    muestra = (await _json(cliente, "/api/avistamientos/buscar", genero=comun[5], especie=comun[6], limit=1))[0]
+    geo = muestra["Ubicacion"]["Geolocalizacion"]
+    return {
+        "comun": comun,
+        "rara": rara,
+        "pais": paises[0]["_id"],
+        "pais_raro": paises[-1]["_id"],
+        "lat": float(geo["Latitud"]),
+        "lng": float(geo["Longitud"]),
+        "anio": datetime.fromisoformat(str(muestra["FechaEvento"])).year,
+    }
+
+
+def _caja(lat, lng, lado):
+    return [lng - lado, max(lat - lado, -89.9), lng + lado, min(lat + lado, 89.9)]
+
+
+def _buscar(nombre, consulta_params, orden="_id", limit=1000, **extra):
+    filtro = construir_filtro(**consulta_params)
+    return Escenario(
+        nombre, "/api/avistamientos/buscar",
+        params={**consulta_params, "limit": limit, **extra},
+        consulta=("find", COLECCION, filtro, ORDENES[orden], limit + 1),
+    )
+
+
+def _listado(nombre, ruta, plantilla, filtro, limit=1000, orden="_id", **params):
+    return Escenario(nombre, ruta, plantilla, params={"limit": limit, **params},
+                     consulta=("find", COLECCION, filtro, ORDENES[orden], limit + 1))
+
+
+def construir_escenarios(p):
+    ''' Lista de escenarios a partir de los parámetros descubiertos '''
+    reino, filo, clase, orden, familia, genero, especie = p["comun"]
+    rara = p["rara"]
+    lat, lng = p["lat"], p["lng"]
+    desde, hasta = f"{p['anio']}-01-01", f"{p['anio']}-12-31"
+    bbox = _caja(lat, lng, 5)
+    bbox_txt = ",".join(f"{v:.4f}" for v in bbox)
+    especie_comun = {"genero": genero, "especie": especie}
+    especie_rara = {"genero": rara[5], "especie": rara[6]}
+
+    escenarios = [
+        Escenario("raiz", "/"),
+
+        # Listados y búsqueda compuesta
+        _listado("listado_pagina", "/api/avistamientos", "/api/avistamientos", {}, limit=100),
+        _listado("listado_columnas", "/api/avistamientos", "/api/avistamientos", {}, limit=1000,
+                 format="columns", fields=CAMPOS_LIGEROS),
+        _buscar("buscar_especie_comun", especie_comun),
+        _buscar("buscar_especie_rara", especie_rara),
+        _buscar("buscar_especie_campos", especie_comun, fields=CAMPOS_LIGEROS),
+        _buscar("buscar_pais_fechas", {"pais": p["pais"], "desde": desde, "hasta": hasta}, orden="FechaEvento",
+                ordenar_por="FechaEvento"),
+        _buscar("buscar_reino_total", {"reino": reino}, limit=100, total="true"),
+        _buscar("buscar_bbox_especie", {**especie_comun, "bbox": bbox_txt}),
+
+        # Mapa
+        Escenario("clusters_mundo", "/api/avistamientos/clusters", params={"zoom": 2},
+                  consulta=("aggregate", COLECCION, pipeline_clusters({}, precision_para_zoom(2)))),
+        Escenario("clusters_bbox", "/api/avistamientos/clusters", params={"zoom": 8, "bbox": bbox_txt},
+                  consulta=("aggregate", COLECCION,
+                            pipeline_clusters(construir_filtro(bbox=bbox_txt), precision_para_zoom(8)))),
+        Escenario("coordenadas_especie", "/api/avistamientos/coordenadas", params=dict(especie_comun),
+                  consulta=("find", COLECCION, construir_filtro(**especie_comun), None, None)),
+        Escenario("coordenadas_reino", "/api/avistamientos/coordenadas", params={"reino": reino},
+                  consulta=("find", COLECCION, construir_filtro(reino=reino), None, None)),
+
+        # Histograma: cubo de rollups (mes) y agrupación en vivo (día con rango de fechas)
+        Escenario("histograma_mes_especie", "/api/avistamientos/histograma", params={**especie_comun, "unidad": "month"}),
+        Escenario("histograma_dia_pais", "/api/avistamientos/histograma",
+                  params={"pais": p["pais"], "desde": desde, "hasta": hasta, "unidad": "day"},
+                  consulta=("aggregate", COLECCION, pipeline_histograma(
+                      construir_filtro(pais=p["pais"], desde=desde, hasta=hasta), "day"))),
+
+        # Facetas: desde el cubo (taxonomía) y en vivo (con rango de fechas)
+        Escenario("facetas_reino", "/api/avistamientos/facetas", params={"reino": reino}),
+        Escenario("facetas_pais_fechas", "/api/avistamientos/facetas",
+                  params={"pais": p["pais"], "desde": desde, "hasta": hasta},
+                  consulta=("aggregate", COLECCION, pipeline_facetas(
+                      construir_filtro(pais=p["pais"], desde=desde, hasta=hasta), 10))),
+
+        # Mapas de densidad precalculados (lectura de un documento, sin consulta a avistamientos)
+        Escenario("densidad_mundo_png", "/api/avistamientos/densidad", params={"zoom": 2, "format": "png"}),
+        Escenario("densidad_reino_bbox", "/api/avistamientos/densidad", params={"reino": reino, "bbox": bbox_txt, "zoom": 6}),
+
+        # Rutas por atributo
+        _listado("nombre_cientifico", f"/api/avistamientos/nombre_cientifico/{genero} {especie}",
+                 "/api/avistamientos/nombre_cientifico/{nombre_cientifico}",
+                 {"NombreCientifico": f"{genero} {especie}"}),
+        _listado("fecha_anio", f"/api/avistamientos/fecha/{desde}/{hasta}", "/api/avistamientos/fecha/{desde}/{hasta}",
+                 construir_filtro(desde=desde, hasta=hasta), orden="FechaEvento"),
+        _listado("pais_comun", f"/api/avistamientos/pais/{p['pais']}", "/api/avistamientos/pais/{nombre_pais}",
+                 {"Ubicacion.Pais": p["pais"]}),
+        _listado("pais_raro", f"/api/avistamientos/pais/{p['pais_raro']}", "/api/avistamientos/pais/{nombre_pais}",
+                 {"Ubicacion.Pais": p["pais_raro"]}),
+        Escenario("pais_comun_muestra", f"/api/avistamientos/pais/{p['pais']}", "/api/avistamientos/pais/{nombre_pais}",
+                  params={"sample": 1000},
+                  consulta=("aggregate", COLECCION, pipeline_muestra({"Ubicacion.Pais": p["pais"]}, PRECISION_CELDAS, 10, 1000))),
+        _listado("taxonomia_completa", "/api/avistamientos/taxonomia/" + "/".join(p["comun"]),
+                 "/api/avistamientos/taxonomia/{reino}/{filo}/{clase}/{orden}/{familia}/{genero}/{especie}",
+                 construir_filtro(**dict(zip([n.lower() for n in NIVELES_TAXONOMIA], p["comun"])))),
+        _listado("taxonomia_comodines", f"/api/avistamientos/taxonomia/{reino}/*/*/*/*/*/{especie}",
+                 "/api/avistamientos/taxonomia/{reino}/{filo}/{clase}/{orden}/{familia}/{genero}/{especie}",
+                 construir_filtro(reino=reino, especie=especie)),
+        _listado("ubicacion", f"/api/avistamientos/ubicacion/{lat:.4f}/{lng:.4f}", "/api/avistamientos/ubicacion/{lat}/{lng}",
+                 {CAMPO_PUNTO: {"$geoWithin": {"$geometry": geometria_bbox(*_caja(lat, lng, 0.5))}}}, tolerancia=0.5),
+    ]
+
+    # Rutas de un solo nivel taxonómico
+    for nivel, valor in zip(NIVELES_TAXONOMIA, p["comun"]):
+        ruta = nivel.lower()
+        escenarios.append(_listado(f"nivel_{ruta}", f"/api/avistamientos/{ruta}/{valor}",
+                                   f"/api/avistamientos/{ruta}/{{{ruta}}}", filtro_taxonomia(nivel, valor)))
+
+    # Geoespaciales
+    escenarios += [
+        _listado("geo_radio", "/api/avistamientos/geo/radio", "/api/avistamientos/geo/radio",
+                 filtro_radio(lat, lng, 50), lat=lat, lng=lng, radio_km=50),
+        Escenario("geo_poligono", "/api/avistamientos/geo/poligono", metodo="POST",
+                  params={"limit": 1000}, cuerpo=geometria_bbox(*_caja(lat, lng, 1)),
+                  consulta=("find", COLECCION, {CAMPO_PUNTO: {"$geoWithin": {"$geometry": geometria_bbox(*_caja(lat, lng, 1))}}},
+                            ORDENES["_id"], 1001)),
+        Escenario("geo_cercanos", "/api/avistamientos/geo/cercanos", params={"lat": lat, "lng": lng, "k": 10},
+                  consulta=("aggregate", COLECCION, pipeline_cercanos(lat, lng, {}, k=10))),
+    ]
+
+    # Agrupamientos (rollup_niveles)
+    for ruta, dim, por_valor in [
+        ("pais", "Pais", False), ("fecha", "FechaEvento", True), ("especie", "Especie", False),
+        ("genero", "Genero", False), ("clase", "Clase", False), ("reino", "Reino", False),
+        ("orden", "Orden", False), ("familia", "Familia", False), ("filo", "Filo", False),
+    ]:
+        escenarios.append(Escenario(
+            f"agrupados_{ruta}", f"/api/avistamientos/agrupados/{ruta}",
+            consulta=("find", COLECCION_NIVELES, consulta_nivel(dim), orden_nivel(por_valor), None),
+        ))
+
+    # Autocompletado (árbol en memoria)
+    escenarios += [
+        Escenario("taxonomia_sugerir", "/api/taxonomia/sugerir", params={"q": genero[:3], "limite": 10}),
+        Escenario("taxonomia_hijos", "/api/taxonomia/hijos", params={"reino": reino, "filo": filo}),
+    ]
+
+    # Lote: carga inicial del dashboard (agrupamientos, histograma y árbol) en una sola petición
+    escenarios.append(Escenario(
+        "lote_dashboard", "/api/lote", metodo="POST",
+        cuerpo={"consultas": [
+            *[{"nombre": dim, "ruta": f"avistamientos/agrupados/{dim}"} for dim in ("pais", "reino", "clase", "fecha")],
+            {"nombre": "histograma", "ruta": "avistamientos/histograma", "params": {"unidad": "year"}},
+            {"nombre": "hijos", "ruta": "taxonomia/hijos", "params": {"reino": reino}},
+        ]},
+    ))
+
+    # Métricas
+    escenarios += [
+        Escenario("metricas", "/metrics"),
+        Escenario("metricas_lentas", "/metrics/lentas"),
+    ]
+    return escenarios
+
+
+def rutas_sin_escenario(escenarios):
+    ''' Rutas declaradas en main.py que ningún escenario ejercita '''
+    from app.main import app
+
+    cubiertas = {(e.metodo, e.plantilla) for e in escenarios}
+    faltan = []
+    for ruta in app.routes:
+        for metodo in sorted(getattr(ruta, "methods", None) or []):
+            if metodo in ("HEAD", "OPTIONS") or ruta.path.startswith(("/docs", "/redoc", "/openapi")):
+                continue
+            if (metodo, ruta.path) not in cubiertas:
+                faltan.append(f"{metodo} {ruta.path}")
+    return faltan
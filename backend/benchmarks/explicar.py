@@ -0,0 +1,25 @@
+"""
+Resumen del explain de MongoDB para la consulta de cada escenario.
+
+Del plan ganador se guardan las etapas y los índices usados; de
+executionStats, los documentos devueltos, las claves y documentos
+examinados y el tiempo en el servidor. Un COLLSCAN o una proporción
+docs_examinados / devueltos alta señalan un índice que falta. El resumen es
+el mismo que usa el registro de consultas lentas de la API (app/metricas.py).
+"""
+from app.metricas import resumir_explain
+
+
+def explicar(db, consulta) -> dict:
+    ''' Ejecutar explain (executionStats) de la consulta de un escenario con un cliente síncrono '''
+    if consulta[0] == "find":
+        _, coleccion, filtro, orden, limit = consulta
+        comando = {"find": coleccion, "filter": filtro}
+        if orden:
+            comando["sort"] = dict(orden)
+        if limit:
+            comando["limit"] = limit
+    else:
+        _, coleccion, pipeline = consulta
+        comando = {"aggregate": coleccion, "pipeline": pipeline, "cursor": {}}
+    return resumir_explain(db.command("explain", comando, verbosity="executionStats"))
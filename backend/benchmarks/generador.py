@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Generador de avistamientos sintéticos para benchmarks.
+
+Produce un archivo NDJSON con el mismo formato de entrada que
+avistamientos_mongodb.json (Taxonomia, Ubicacion.Pais/Geolocalizacion,
+FechaEvento como texto y NombreCientifico), así la carga pasa por
+load_data.py igual que los datos reales (TaxonomiaNorm, Punto, Geohash,
+ClaveRegistro y rollups incluidos).
+
+Distribuciones, deterministas para una semilla:
+- Taxonomía: árbol Reino → Especie con nombres sintéticos; la frecuencia de
+  las especies sigue una ley de Zipf (pocas especies muy comunes y una cola
+  larga de especies raras), como en los datos de observación reales.
+- Espacio: focos (hotspots) con un país y una dispersión gaussiana; cada
+  especie se observa sobre todo en unos pocos focos propios y el resto de
+  puntos cae en focos comunes o, en una fracción pequeña, uniformes.
+- Fecha: densidad creciente en el tiempo (más registros recientes).
+
+Uso:
+    python -m benchmarks.generador --escala 1m --salida database/bench_1m.ndjson
+    python -m benchmarks.generador --escala 10k --salida /tmp/bench.ndjson --cargar --db biogeovis_bench
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Escalas predefinidas (número de avistamientos)
+ESCALAS = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+
+NIVELES = ["Reino", "Filo", "Clase", "Orden", "Familia", "Genero", "Especie"]
+# Reinos con su peso relativo y ramificación media de cada nivel por debajo
+REINOS = {"Animalia": 0.62, "Plantae": 0.30, "Fungi": 0.06, "Chromista": 0.015, "Bacteria": 0.005}
+RAMIFICACION = {"Filo": 6, "Clase": 5, "Orden": 6, "Familia": 5, "Genero": 4, "Especie": 5}
+SUFIJOS = {"Filo": "phyta", "Clase": "opsida", "Orden": "ales", "Familia": "aceae"}
+
+PAISES = [
+    "Mexico", "Colombia", "Brazil", "Argentina", "Chile", "Peru", "Ecuador", "Costa Rica", "Guatemala",
+    "United States", "Canada", "Spain", "Portugal", "France", "Germany", "United Kingdom", "Italy",
+    "Sweden", "Norway", "South Africa", "Kenya", "Tanzania", "Madagascar", "India", "China", "Japan",
+    "Indonesia", "Philippines", "Australia", "New Zealand",
+]
+
+FECHA_INICIO = datetime(1990, 1, 1)
+FECHA_FIN = datetime(2025, 12, 31)
+
+SILABAS = ["ca", "ri", "to", "me", "la", "nu", "ser", "pho", "dro", "gli", "an", "ter", "os", "mi", "cu",
+           "ra", "lo", "phy", "chi", "sa", "tri", "bo", "le", "na", "xi", "mor", "vi", "pe", "go", "du"]
+
+
+def _nombre(rng, silabas_min=2, silabas_max=4):
+    partes = rng.choice(SILABAS, size=rng.integers(silabas_min, silabas_max + 1))
+    return "".join(partes)
+
+
+def construir_taxonomia(rng, especies_max=None):
+    """
+    Árbol taxonómico sintético; devuelve la lista de especies como tuplas de 7 niveles.
+    - especies_max recorta el número de especies (para conjuntos pequeños).
+    """
+    rutas = [(reino,) for reino in REINOS]
+    usados = set(REINOS)
+    for nivel in NIVELES[1:]:
+        siguientes = []
+        for ruta in rutas:
+            for _ in range(max(1, rng.poisson(RAMIFICACION[nivel]))):
+                if nivel == "Especie":
+                    valor = _nombre(rng, 2, 3)
+                else:
+                    while True:
+                        valor = _nombre(rng).capitalize() + SUFIJOS.get(nivel, "")
+                        if valor not in usados:
+                            break
+                    usados.add(valor)
+                siguientes.append(ruta + (valor,))
+        rutas = siguientes
+    # Las especies de reinos con más peso quedan primero (y reciben los rangos Zipf más altos)
+    orden = rng.permutation(len(rutas))
+    rutas = sorted((rutas[i] for i in orden), key=lambda r: -REINOS[r[0]])
+    if especies_max:
+        rutas = rutas[:especies_max]
+    return rutas
+
+
+def construir_focos(rng, n_focos):
+    ''' Focos espaciales: (lat, lng, sigma en grados, país) '''
+    lat = np.clip(rng.normal(5, 30, n_focos), -55, 70)
+    lng = rng.uniform(-170, 170, n_focos)
+    sigma = rng.uniform(0.05, 2.5, n_focos)
+    paises = rng.choice(PAISES, size=n_focos)
+    return lat, lng, sigma, paises
+
+
+def pesos_zipf(n, s):
+    pesos = 1.0 / np.arange(1, n + 1) ** s
+    return pesos / pesos.sum()
+
+
+class Generador:
+    """
+    Genera avistamientos por bloques vectorizados con NumPy.
+    Con la misma semilla y parámetros el archivo resultante es idéntico.
+    """
+
+    def __init__(self, semilla=42, especies=None, focos=400, zipf=1.1, focos_por_especie=3, dispersion=0.03):
+        self.rng = np.random.default_rng(semilla)
+        self.especies = construir_taxonomia(self.rng, especies)
+        self.p_especie = pesos_zipf(len(self.especies), zipf)
+        self.foco_lat, self.foco_lng, self.foco_sigma, self.foco_pais = construir_focos(self.rng, focos)
+        self.p_foco = pesos_zipf(focos, 0.8)[self.rng.permutation(focos)]
+        # Focos propios de cada especie
+        self.focos_especie = self.rng.choice(focos, size=(len(self.especies), focos_por_especie), p=self.p_foco)
+        self.dispersion = dispersion
+        self.dias = (FECHA_FIN - FECHA_INICIO).days
+
+    def bloque(self, n):
+        ''' n avistamientos como lista de diccionarios '''
+        rng = self.rng
+        especie = rng.choice(len(self.especies), size=n, p=self.p_especie)
+        # 80 % en un foco propio de la especie, el resto en cualquier foco
+        propio = rng.random(n) < 0.8
+        foco = np.where(
+            propio,
+            self.focos_especie[especie, rng.integers(0, self.focos_especie.shape[1], n)],
+            rng.choice(len(self.p_foco), size=n, p=self.p_foco),
+        )
+        lat = self.foco_lat[foco] + rng.normal(0, 1, n) * self.foco_sigma[foco]
+        lng = self.foco_lng[foco] + rng.normal(0, 1, n) * self.foco_sigma[foco]
+        uniforme = rng.random(n) < self.dispersion
+        lat = np.clip(np.where(uniforme, rng.uniform(-60, 75, n), lat), -89.9, 89.9)
+        lng = (np.where(uniforme, rng.uniform(-180, 180, n), lng) + 180) % 360 - 180
+        # Densidad lineal creciente: más registros recientes
+        dias = (np.sqrt(rng.random(n)) * self.dias).astype(int)
+
+        registros = []
+        for i in range(n):
+            ruta = self.especies[especie[i]]
+            registros.append({
+                "Taxonomia": dict(zip(NIVELES, ruta)),
+                "Ubicacion": {
+                    "Pais": str(self.foco_pais[foco[i]]),
+                    "Geolocalizacion": {"Latitud": round(float(lat[i]), 6), "Longitud": round(float(lng[i]), 6)},
+                },
+                "FechaEvento": (FECHA_INICIO + timedelta(days=int(dias[i]))).strftime("%Y-%m-%d"),
+                "NombreCientifico": f"{ruta[5]} {ruta[6]}",
+            })
+        return registros
+
+    def registros(self, n, bloque=100_000):
+        generados = 0
+        while generados < n:
+            tam = min(bloque, n - generados)
+            yield from self.bloque(tam)
+            generados += tam
+
+
+def escribir_ndjson(generador, n, salida):
+    ''' Escribir n avistamientos en salida (NDJSON); devuelve el número escrito '''
+    directorio = os.path.dirname(os.path.abspath(salida))
+    os.makedirs(directorio, exist_ok=True)
+    escritos = 0
+    with open(salida, "w", encoding="utf-8") as f:
+        for registro in generador.registros(n):
+            f.write(json.dumps(registro, ensure_ascii=False))
+            f.write("\n")
+            escritos += 1
+            if escritos % 1_000_000 == 0:
+                print(f"  {escritos} registros escritos")
+    return escritos
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generar avistamientos sintéticos (NDJSON) para benchmarks.")
+    tam = parser.add_mutually_exclusive_group(required=True)
+    tam.add_argument("--escala", choices=list(ESCALAS), help="Tamaño predefinido")
+    tam.add_argument("--n", type=int, help="Número exacto de avistamientos")
+    parser.add_argument("--salida", required=True, help="Archivo NDJSON de salida")
+    parser.add_argument("--semilla", type=int, default=42, help="Semilla (mismo archivo para la misma semilla)")
+    parser.add_argument("--especies", type=int, default=None, help="Máximo de especies (por defecto todo el árbol)")
+    parser.add_argument("--focos", type=int, default=400, help="Focos espaciales")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Exponente de Zipf de la frecuencia de especies")
+    parser.add_argument("--cargar", action="store_true", help="Cargar el archivo con load_data.py --completa al terminar")
+    parser.add_argument("--uri", default=None, help="URI de MongoDB para --cargar (por defecto MONGO_URI)")
+    parser.add_argument("--db", default="biogeovis_bench", help="Base de datos para --cargar")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    n = args.n if args.n is not None else ESCALAS[args.escala]
+    generador = Generador(semilla=args.semilla, especies=args.especies, focos=args.focos, zipf=args.zipf)
+    print(f"Generando {n} avistamientos ({len(generador.especies)} especies, {args.focos} focos) en {args.salida}")
+    escribir_ndjson(generador, n, args.salida)
+    print("Archivo generado")
+
+    if args.cargar:
+        from app import load_data
+
+        argumentos = ["--archivo", args.salida, "--formato", "ndjson", "--completa", "--sin-reanudar", "--db", args.db]
+        if args.uri:
+            argumentos += ["--uri", args.uri]
+        load_data.main(argumentos)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
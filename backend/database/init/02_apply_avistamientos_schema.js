@@ -31,10 +31,25 @@ const avistamientosSchema = {
                         Longitud: { bsonType: "number" },
                     },
                 },
+                Punto: {
+                    bsonType: "object",
+                    description: "Punto GeoJSON [Longitud, Latitud] para el índice 2dsphere",
+                    required: ["type", "coordinates"],
+                    properties: {
+                        type: { enum: ["Point"] },
+                        coordinates: { bsonType: "array", minItems: 2, maxItems: 2 },
+                    },
+                },
+                Geohash: { bsonType: "string", description: "Celda geohash para clusters del mapa" },
             },
         },
         FechaEvento: { bsonType: "date", description: "Fecha del avistamiento" },
         NombreCientifico: { bsonType: "string" },
+        TaxonomiaNorm: {
+            bsonType: "object",
+            description: "Copia de Taxonomia en minúsculas y sin espacios en los extremos (filtros insensibles a mayúsculas)",
+        },
+        ClaveRegistro: { bsonType: "string", description: "Hash del contenido del registro (carga idempotente)" },
     },
 };
 
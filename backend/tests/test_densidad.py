@@ -0,0 +1,33 @@
+import numpy as np
+
+from app.densidad import ALTO, ANCHO, recortar
+from app.filtros import parse_bbox
+
+
+def rejilla_prueba():
+    return (np.arange(ALTO * ANCHO, dtype=np.uint32) % 7).reshape(ALTO, ANCHO)
+
+
+def test_recortar_caja_normal():
+    rejilla = rejilla_prueba()
+    conteos, efectivo = recortar(rejilla, parse_bbox("-10,-10,10,10"), 2)
+    assert conteos.shape == (80, 80)
+    assert efectivo == (-10.0, -10.0, 10.0, 10.0)
+    assert conteos.sum() == rejilla[320:400, 680:760].sum()
+
+
+def test_recortar_cruza_antimeridiano():
+    rejilla = rejilla_prueba()
+    conteos, efectivo = recortar(rejilla, parse_bbox("170,-10,-170,10"), 2)
+    assert conteos.shape == (80, 80)
+    assert efectivo == (170.0, -10.0, -170.0, 10.0)
+    # Las primeras 40 columnas son 170..180 y las siguientes -180..-170
+    np.testing.assert_array_equal(conteos[:, :40], rejilla[320:400, 1400:])
+    np.testing.assert_array_equal(conteos[:, 40:], rejilla[320:400, :40])
+
+
+def test_recortar_cruza_antimeridiano_agregado():
+    rejilla = rejilla_prueba()
+    conteos, efectivo = recortar(rejilla, parse_bbox("170,-10,-170,10"), 0)
+    assert efectivo[0] > efectivo[2]
+    assert conteos.sum() == rejilla[320:400, 1400:].sum() + rejilla[320:400, :40].sum()
@@ -13,13 +13,6 @@ async function apiGet(path) {
   return res.json();
 }
 
-// Funcion que construye la ruta del endpoint de taxonomía a partir de los filtros; usa wildcard '*' para vacíos.
-function buildTaxonomiaPath({ reino, filo, clase, orden, familia, genero, especie }) {
-  const sanitize = v => (v && v.trim()) ? encodeURIComponent(v.trim()) : '*';
-  const seg = [reino, filo, clase, orden, familia, genero, especie].map(sanitize);
-  return `/api/avistamientos/taxonomia/${seg.join('/')}`;
-}
-
 // Función que transforma un documento de avistamiento del backend en un objeto marcador para el globo.
 function toMarker(doc) {
   let lat = doc?.Ubicacion?.Geolocalizacion?.Latitud;
@@ -59,26 +52,8 @@ function toMarker(doc) {
     const color = colorMap[reino] || '#ff0000';
     return { lat: latNum, lng: lngNum, label, color };
 }
-// Match taxonomia para filtros avanzados.
-function matchTaxonomia(doc, { reino, filo, clase, orden, familia, genero, especie }) {
-    const tax = doc?.Taxonomia || {};
-    function matches(fieldValue, filterValue) {
-        if (!filterValue || filterValue === '*') return true;
-        if (!fieldValue) return false;
-        return String(fieldValue).toLowerCase() === String(filterValue).toLowerCase();
-    }
-    return (
-        matches(tax.Reino, reino) &&
-        matches(tax.Filo, filo) &&
-        matches(tax.Clase, clase) &&
-        matches(tax.Orden, orden) &&
-        matches(tax.Familia, familia) &&
-        matches(tax.Genero, genero) &&
-        matches(tax.Especie, especie)
-    );
-}
-
 // Funcion principal para obtener avistamientos según filtros avanzados.
+// Todos los filtros se envían juntos al endpoint de búsqueda compuesta del backend.
 export async function fetchAvistamientosAdvanced(filters) {
   const {
     nombreCientifico,
@@ -93,65 +68,33 @@ export async function fetchAvistamientosAdvanced(filters) {
     fechaFin,
   } = filters;
 
-  const filo = filters.filo || ''; 
+  const filo = filters.filo || '';
 
-  const hasTax = [reino, filo, clase, orden, familia, genero, especie].some(v => v && v.trim());
-  const hasDateRange = fechaInicio && fechaFin;
+  const params = new URLSearchParams();
+  const add = (key, value) => {
+    if (value && String(value).trim()) params.set(key, String(value).trim());
+  };
+  add('reino', reino);
+  add('filo', filo);
+  add('clase', clase);
+  add('orden', orden);
+  add('familia', familia);
+  add('genero', genero);
+  add('especie', especie);
+  add('pais', pais);
+  add('nombre_cientifico', nombreCientifico);
+  add('desde', fechaInicio);
+  add('hasta', fechaFin);
+  if (![...params.keys()].length) params.set('limit', '200');
+  // Solo los campos que usa toMarker
+  params.set('fields', '_id,NombreCientifico,Taxonomia.Reino,Taxonomia.Especie,Ubicacion.Geolocalizacion');
 
   let data = [];
-
-  if (hasDateRange && hasTax) {
-    // Estrategia: primero fecha para reducir volumen y luego filtrar taxonomía en cliente.
-    try {
-      const fechaData = await apiGet(`/api/avistamientos/fecha/${encodeURIComponent(fechaInicio)}/${encodeURIComponent(fechaFin)}`);
-      data = fechaData.filter(d => matchTaxonomia(d, { reino, filo, clase, orden, familia, genero, especie }));
-    } catch (e) {
-      console.error('Error fetching by fecha+taxonomia:', e);
-      throw e;
-    }
-  } else if (hasDateRange) {
-    try {
-      data = await apiGet(`/api/avistamientos/fecha/${encodeURIComponent(fechaInicio)}/${encodeURIComponent(fechaFin)}`);
-    } catch (e) {
-      console.error('Error fetching by fecha:', e);
-      throw e;
-    }
-  } else if (hasTax) {
-    try {
-      data = await apiGet(buildTaxonomiaPath({ reino, filo, clase, orden, familia, genero, especie }));
-    } catch (e) {
-      console.error('Error fetching by taxonomia:', e);
-      throw e;
-    }
-  } else if (nombreCientifico && nombreCientifico.trim()) {
-    try {
-      data = await apiGet(`/api/avistamientos/nombre_cientifico/${encodeURIComponent(nombreCientifico.trim())}`);
-    } catch (e) {
-      console.error('Error fetching by nombre científico:', e);
-      throw e;
-    }
-  } else if (pais && pais.trim()) {
-    try {
-      data = await apiGet(`/api/avistamientos/pais/${encodeURIComponent(pais.trim())}`);
-    } catch (e) {
-      console.error('Error fetching by país:', e);
-      throw e;
-    }
-  } else if (especie && especie.trim()) {
-    // Use taxonomia endpoint with only especie specified to leverage server logic; others wildcards.
-    try {
-      data = await apiGet(buildTaxonomiaPath({ reino: '', filo: '', clase: '', orden: '', familia: '', genero: '', especie }));
-    } catch (e) {
-      console.error('Error fetching by especie:', e);
-      throw e;
-    }
-  } else {
-    try {
-      data = await apiGet('/api/avistamientos?limit=200');
-    } catch (e) {
-      console.error('Error fetching default avistamientos:', e);
-      throw e;
-    }
+  try {
+    data = await apiGet(`/api/avistamientos/buscar?${params.toString()}`);
+  } catch (e) {
+    console.error('Error fetching avistamientos:', e);
+    throw e;
   }
 
  // Aqui se mapean a marcadores, filtrando entradas con coordenadas inválidas.
@@ -163,4 +106,106 @@ export async function fetchAvistamientosAdvanced(filters) {
   return { raw: data, markers };
 }
 
+// Capa de coordenadas en binario (formato "BGV1" de /api/avistamientos/coordenadas).
+// Acepta los mismos filtros que la búsqueda compuesta, como objeto { reino, pais, bbox, ... }.
+// Devuelve arreglos tipados sin copiar: lat, lng (Float32Array), especie (Uint32Array) y los nombres.
+export async function fetchCoordenadasBinarias(filtros = {}) {
+  const params = new URLSearchParams();
+  Object.entries(filtros).forEach(([key, value]) => {
+    if (value != null && String(value).trim()) params.set(key, String(value).trim());
+  });
+  const url = `${BASE_URL}/api/avistamientos/coordenadas?${params.toString()}`;
+  console.debug('[API] GET', url);
+  const res = await fetch(url);
+  if (!res.ok) throw new Error(`Error ${res.status} fetching coordenadas: ${await res.text()}`);
+  const buffer = await res.arrayBuffer();
+  const vista = new DataView(buffer);
+  const magic = new TextDecoder().decode(new Uint8Array(buffer, 0, 4));
+  if (magic !== 'BGV1') throw new Error('Formato binario de coordenadas desconocido');
+  const n = vista.getUint32(4, true);
+  const bytesDiccionario = vista.getUint32(8, true);
+  let offset = 12;
+  const lat = new Float32Array(buffer, offset, n); offset += n * 4;
+  const lng = new Float32Array(buffer, offset, n); offset += n * 4;
+  const especie = new Uint32Array(buffer, offset, n); offset += n * 4;
+  const texto = new TextDecoder().decode(new Uint8Array(buffer, offset, bytesDiccionario));
+  const nombres = n ? texto.split('\n') : [];
+  return { n, lat, lng, especie, nombres };
+}
+
+// Mapa de densidad precalculado (formato "BGD1" de /api/avistamientos/densidad).
+// filtros: como mucho uno de { reino, filo, clase, orden, familia, pais }, más bbox y zoom.
+// Devuelve { ancho, alto, bbox: [minLng, minLat, maxLng, maxLat], conteos: Uint32Array } (filas de norte a sur).
+// Si la bbox cruza el antimeridiano, minLng > maxLng y las columnas siguen de minLng a 180 y de -180 a maxLng.
+export async function fetchDensidad(filtros = {}) {
+  const params = new URLSearchParams();
+  Object.entries(filtros).forEach(([key, value]) => {
+    if (value != null && String(value).trim()) params.set(key, String(value).trim());
+  });
+  const url = `${BASE_URL}/api/avistamientos/densidad?${params.toString()}`;
+  console.debug('[API] GET', url);
+  const res = await fetch(url);
+  if (!res.ok) throw new Error(`Error ${res.status} fetching densidad: ${await res.text()}`);
+  const buffer = await res.arrayBuffer();
+  const vista = new DataView(buffer);
+  const magic = new TextDecoder().decode(new Uint8Array(buffer, 0, 4));
+  if (magic !== 'BGD1') throw new Error('Formato binario de densidad desconocido');
+  const ancho = vista.getUint32(4, true);
+  const alto = vista.getUint32(8, true);
+  const bbox = [0, 1, 2, 3].map((i) => vista.getFloat64(12 + i * 8, true));
+  return { ancho, alto, bbox, conteos: new Uint32Array(buffer, 44, ancho * alto) };
+}
+
+// URL de la imagen PNG del mapa de densidad (para usarla directamente como textura o capa).
+export function urlDensidadPng(filtros = {}) {
+  const params = new URLSearchParams({ format: 'png' });
+  Object.entries(filtros).forEach(([key, value]) => {
+    if (value != null && String(value).trim()) params.set(key, String(value).trim());
+  });
+  return `${BASE_URL}/api/avistamientos/densidad?${params.toString()}`;
+}
+
+// Autocompletado de taxonomía y país (árbol en memoria del backend).
+// nivel: 'Reino' | 'Filo' | ... | 'Especie' | 'Pais'; sin nivel busca en todos.
+export async function fetchSugerenciasTaxonomia(q, nivel, limite = 10) {
+  const params = new URLSearchParams({ q: q || '', limite: String(limite) });
+  if (nivel) params.set('nivel', nivel);
+  return apiGet(`/api/taxonomia/sugerir?${params.toString()}`);
+}
+
+// Valores del nivel siguiente a la ruta dada ({ reino, filo, ... } en orden), con conteos.
+export async function fetchHijosTaxonomia(ruta = {}) {
+  const params = new URLSearchParams();
+  Object.entries(ruta).forEach(([key, value]) => {
+    if (value && String(value).trim()) params.set(key, String(value).trim());
+  });
+  return apiGet(`/api/taxonomia/hijos?${params.toString()}`);
+}
+
+// Conteos por nivel taxonómico, país y año bajo los filtros dados (mismos filtros que la búsqueda).
+// Devuelve { origen, total, facetas: { Reino: [{ valor, count }], ..., Pais: [...], Anio: [...] } }.
+export async function fetchFacetas(filtros = {}, top = 10) {
+  const params = new URLSearchParams({ top: String(top) });
+  Object.entries(filtros).forEach(([key, value]) => {
+    if (value != null && String(value).trim()) params.set(key, String(value).trim());
+  });
+  return apiGet(`/api/avistamientos/facetas?${params.toString()}`);
+}
+
+// Varias consultas GET en una sola petición (POST /api/lote), p. ej. la carga inicial del dashboard.
+// consultas: [{ nombre, ruta: 'avistamientos/agrupados/pais', params: { ... } }, ...]
+// Devuelve { nombre: { estado, ms, cabeceras, datos | error } }; los errores son por subconsulta.
+export async function fetchLote(consultas) {
+  const url = `${BASE_URL}/api/lote`;
+  console.debug('[API] POST', url, consultas.map((c) => c.nombre));
+  const res = await fetch(url, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ consultas }),
+  });
+  if (!res.ok) throw new Error(`Error ${res.status} en lote: ${await res.text()}`);
+  const { resultados } = await res.json();
+  return resultados;
+}
+
 export { toMarker };